@@ -0,0 +1,202 @@
+### 1. MODULE IMPORTS
+import os
+import sys
+import json
+import time
+import shapely
+import platform
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from pathlib import Path
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.append(str(Path(__file__).parents[1])) # repository root, home of the common package
+from common.cli import shared_parser
+from common.overlap_weights import overlap_matrix
+from common.flood_exposure import flood_exposure
+from common.weighted_statistics import weighted_statistics
+from common.geoparquet import read_geoparquet, write_geoparquet
+from common.areal_interpolation import interpolate, interpolate_tensor
+from common.rent_control import fill_periods, reference_tensor, tensor_to_frame
+from synthetic import COMBINATIONS, HS_COLS, PERIODS, layers
+
+### 2. PATH DEFINITIONS
+code_dir = Path(__file__).parent
+results_dir = code_dir / 'results'
+
+parser = shared_parser()
+parser.add_argument('--scales', type = float, nargs = '+', default = [5, 10, 20], help = 'sides of the synthetic areas, in km (default: 5 10 20)')
+parser.add_argument('--repeat', type = int, default = 3, help = 'runs of every stage, the fastest is kept (default: 3)')
+parser.add_argument('--output', type = Path, help = 'json file of the results (default: results/benchmarks_<date>.json)')
+parser.add_argument('--baseline', type = Path, help = 'earlier json file of results, to compare the throughputs with')
+parser.add_argument('--tolerance', type = float, default = 0.2, help = 'slowdown from the baseline reported as a regression (default: 0.2, 20%% fewer items per second)')
+args = parser.parse_args() # e.g. --scales 10 40 --workers 8 --baseline results/benchmarks_20250101_120000.json
+
+### 3. FUNCTION DEFINITIONS
+def timed(function: Callable, repeat: int) -> Tuple[float, Any]:
+    '''
+    Runs function repeat times, and returns the fastest time and the result.
+    '''
+    best, result = np.inf, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+
+    return best, result
+
+def record(
+    results: List[Dict],
+    km: float,
+    stage: str,
+    seconds: float,
+    items: int,
+    unit: str
+):
+    '''
+    Adds the time of a stage to the results, with its throughput (items per
+    second), and prints it.
+    '''
+    results.append({'scale_km': km, 'stage': stage, 'seconds': seconds, 'items': int(items), 'unit': unit, 'throughput': items / seconds})
+    print(f'{km:>6g} km  {stage:<30} {seconds:9.3f}s {items / seconds:>16,.0f} {unit}/s')
+
+def rent_control_statistics(df_rc: pd.DataFrame, ol_matrix, n_units: int, zones: pd.MultiIndex) -> int:
+    '''
+    The combination loop of paris/rent_control/code/spatial_analysis.py: the
+    weighted statistics of the most recent ref of the zones, for every
+    combination of rooms, epoque, furnished and housing type.
+    '''
+    df_rc = df_rc.loc[df_rc.loc[:, 'period'].isin({periods[-1] for periods in PERIODS.values()})]
+    for rooms, epoque, furnished, housing_type in COMBINATIONS:
+        df_tmp = (
+            df_rc
+            .query(f'rooms == {rooms} and epoque == "{epoque}" and furnished == "{furnished}" and housingType == "{housing_type}"')
+            .set_index(['city', 'idZone'])
+            .loc[:, 'ref']
+        )
+        weighted_statistics(
+            units = ol_matrix.row,
+            values = df_tmp.reindex(zones).to_numpy()[ol_matrix.col],
+            weights = ol_matrix.data,
+            n_units = n_units,
+            delta_reference = 'mean'
+        )
+
+    return len(COMBINATIONS) * n_units
+
+def rent_control_tensor(df_rc: pd.DataFrame, ol_matrix, n_units: int, zones: pd.MultiIndex) -> int:
+    '''
+    The time series of paris/rent_control/code/*_rent_control.py: the averages
+    of every combination and period, with a single sparse matrix product.
+    '''
+    coords = {
+        'period': pd.Index(sorted({period for periods in PERIODS.values() for period in periods})),
+        'rooms': pd.Index([1, 2, 3, 4]),
+        'epoque': pd.Index(['inf1946', '1946-1970', '1971-1990', 'sup1990']),
+        'furnished': pd.Index(['meuble', 'non-meuble']),
+        'housingType': pd.Index(['appartement', 'maison'])
+    }
+    value_cols = ['ref', 'refmaj', 'refmin']
+    df_rc = fill_periods(df_rc.assign(zone = zones.get_indexer(pd.MultiIndex.from_frame(df_rc.loc[:, ['city', 'idZone']]))), PERIODS)
+    tensor = reference_tensor(df_rc, coords | {'zone': pd.RangeIndex(len(zones))}, value_cols)
+    df_ts = tensor_to_frame(interpolate_tensor(ol_matrix, tensor), coords | {'unit': pd.RangeIndex(n_units)}, value_cols) # ts: time series
+
+    return len(df_ts) * len(value_cols)
+
+def git_commit() -> str:
+    '''
+    Returns the commit of the repository, or None outside of a git checkout.
+    '''
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd = code_dir, capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+### 4. BENCHMARKS
+results = []
+for km in args.scales:
+    print(f'Generating the synthetic layers of {km:g} x {km:g} km...')
+    lrs = layers(km) # lrs: layers
+    gdf_imu, gdf_lcz, gdf_zn, df_rc, gdf_cp, gdf_sl = (lrs[name] for name in ('imu', 'lcz', 'zones', 'rent', 'codes_postaux', 'seloger_quartiers'))
+    print(f'{len(gdf_imu)} IMUs, {len(gdf_lcz)} LCZs, {len(gdf_zn)} rent zones, {len(gdf_cp)} Codes Postaux, {len(gdf_sl)} SeLoger Quartiers')
+
+    ## loading
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        geojson_path, parquet_path = Path(tmp_dir) / 'imu.geojson', Path(tmp_dir) / 'imu.parquet'
+        gdf_imu.to_file(geojson_path)
+        write_geoparquet(gdf_imu, parquet_path)
+        seconds, _ = timed(lambda: gpd.read_file(geojson_path), args.repeat)
+        record(results, km, 'load_geojson', seconds, len(gdf_imu), 'features')
+        seconds, _ = timed(lambda: read_geoparquet(parquet_path, HS_COLS), args.repeat)
+        record(results, km, 'load_geoparquet', seconds, len(gdf_imu), 'features')
+
+    ## overlay weights, without the cache on disk
+    seconds, cp_matrix = timed(lambda: overlap_matrix(gdf_cp, gdf_imu, use_cache = False, workers = args.workers, progress = False), args.repeat)
+    record(results, km, 'overlay_weights', seconds, cp_matrix.nnz, 'pairs')
+    seconds, sl_matrix = timed(lambda: overlap_matrix(gdf_sl, gdf_imu, use_cache = False, workers = args.workers, progress = False), args.repeat)
+    record(results, km, 'overlay_weights_overlapping', seconds, sl_matrix.nnz, 'pairs')
+
+    ## weighted averages of all the heat stress variables
+    values = np.nan_to_num(gdf_imu.loc[:, HS_COLS].to_numpy(dtype = np.float64))
+    seconds, _ = timed(lambda: interpolate(sl_matrix, values), args.repeat)
+    record(results, km, 'weighted_averages', seconds, sl_matrix.shape[0] * len(HS_COLS), 'values')
+
+    ## statistics of spatial_analysis.py, on sns_int
+    lcz_matrix = overlap_matrix(gdf_sl, gdf_lcz, use_cache = False, workers = args.workers, progress = False).tocoo()
+    seconds, _ = timed(lambda: weighted_statistics(
+        units = lcz_matrix.row,
+        values = gdf_lcz.loc[:, 'sns_int'].to_numpy()[lcz_matrix.col],
+        weights = lcz_matrix.data,
+        n_units = len(gdf_sl),
+        delta_reference = 'mode'
+    ), args.repeat)
+    record(results, km, 'weighted_statistics', seconds, lcz_matrix.nnz, 'rows')
+
+    ## rent control combinations
+    zones = pd.MultiIndex.from_frame(gdf_zn.loc[:, ['city', 'idZone']])
+    zn_matrix = overlap_matrix(gdf_sl, gdf_zn, use_cache = False, workers = args.workers, progress = False)
+    seconds, items = timed(lambda: rent_control_statistics(df_rc, zn_matrix.tocoo(), len(gdf_sl), zones), args.repeat)
+    record(results, km, 'rent_control_statistics', seconds, items, 'unit_combinations')
+    seconds, items = timed(lambda: rent_control_tensor(df_rc, zn_matrix, len(gdf_sl), zones), args.repeat)
+    record(results, km, 'rent_control_tensor', seconds, items, 'values')
+
+    ## flood exposure, of all the units at once
+    unit_geoms = np.concatenate([gdf_cp.geometry.to_numpy(), gdf_sl.geometry.to_numpy()])
+    seconds, _ = timed(lambda: flood_exposure(unit_geoms, lrs['flood_parts'], lrs['underwater_parts']), args.repeat)
+    record(results, km, 'flood_exposure', seconds, len(unit_geoms), 'units')
+
+### 5. EXPORT
+report = {
+    'created': datetime.now().isoformat(timespec = 'seconds'),
+    'commit': git_commit(),
+    'python': platform.python_version(),
+    'platform': platform.platform(),
+    'cpu_count': os.cpu_count(),
+    'workers': args.workers,
+    'repeat': args.repeat,
+    'versions': {module.__name__: module.__version__ for module in (np, pd, gpd, shapely)},
+    'results': results
+}
+output = args.output or results_dir / f'benchmarks_{datetime.now():%Y%m%d_%H%M%S}.json'
+output.parent.mkdir(parents = True, exist_ok = True)
+output.write_text(json.dumps(report, indent = 2))
+print(f'Results written to {output}')
+
+### 6. COMPARISON WITH THE BASELINE
+# stages with fewer items per second than the baseline (beyond the tolerance)
+# are regressions, and make the script exit with an error
+if args.baseline is not None:
+    df_bl = pd.DataFrame(json.loads(args.baseline.read_text())['results']).set_index(['scale_km', 'stage']) # bl: baseline
+    df_cm = pd.DataFrame(results).set_index(['scale_km', 'stage']).join(df_bl.loc[:, ['throughput']], rsuffix = '_baseline', how = 'inner') # cm: comparison
+    df_cm.loc[:, 'ratio'] = df_cm.loc[:, 'throughput'] / df_cm.loc[:, 'throughput_baseline']
+    print(df_cm.loc[:, ['throughput_baseline', 'throughput', 'ratio']].to_string(float_format = '{:,.2f}'.format))
+
+    regressions = df_cm.loc[df_cm.loc[:, 'ratio'] < 1 - args.tolerance]
+    if len(regressions):
+        print(f'{len(regressions)} stage(s) slower than the baseline:', ', '.join(f'{stage} ({km:g} km)' for km, stage in regressions.index))
+        sys.exit(1)
+    print('No regression.')
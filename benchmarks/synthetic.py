@@ -0,0 +1,179 @@
+### 1. MODULE IMPORTS
+import shapely
+import itertools
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from typing import Dict, Tuple
+
+### 2. DEFINITIONS
+# synthetic layers of a square area of side km, near Paris in Lambert 93, with
+# the density of the real layers of Paris and its inner suburbs: the size of
+# the polygons and the length of their edges (vertices per polygon) are kept,
+# only the area grows with the scale
+CRS = 'EPSG:2154'
+ORIGIN = (640_000.0, 6_850_000.0)
+IMU_SPACING, IMU_SEGMENT = 150, 10 # m: distance between neighbouring IMUs (building blocks), length of their edges
+LCZ_SPACING, LCZ_SEGMENT = 400, 25 # m
+ZONE_SPACING, CITY_SPACING = 2_700, 9_000 # m: rent control zones, nested in cities
+UNIT_SPACING = 2_000 # m: Codes Postaux
+SELOGER_SPACING = 700 # m: SeLoger Quartiers, which overlap each other
+
+HS_COLS = ['svf', 'aspecratio', 'hauteurmoy', 'perméable', 'voirie', 'bati', 'rugosite_t', 'admitance', 'albedo', 'fluchaleur', 'aleaj_note', 'alean_note', 'alea_j_cl', 'sensi_j_cl', 'incap_j_cl', 'alea_n_cl', 'sensi_n_cl', 'incap_n_cl', 'vulnj_note', 'vulnn_note', 'st_areasha', 'st_lengths']
+LCZ_CLASSES = ['1', '2', '3', '4', '5', '6', '8', '9', 'A', 'B', 'D', 'E', 'G']
+SNS_COLS = ['hre', 'are', 'bur', 'ror', 'bsr', 'war', 'ver', 'vhr']
+PERIODS = {
+    'paris': ['2022-07-01', '2023-07-01', '2024-07-01'],
+    'plaine-commune': ['2022-06-01', '2023-06-01', '2024-06-01'],
+    'est-ensemble': ['2022-06-01', '2023-06-01', '2024-06-01']
+}
+COMBINATIONS = list(itertools.product( # rooms, epoque, furnished, housing type
+    [1, 2, 3, 4],
+    ['inf1946', '1946-1970', '1971-1990', 'sup1990'],
+    ['meuble', 'non-meuble'],
+    ['appartement', 'maison']
+))
+
+### 3. FUNCTION DEFINITIONS
+def extent(km: float) -> shapely.Polygon:
+    '''
+    Returns the square of side km, with its lower left corner at ORIGIN.
+    '''
+    x0, y0 = ORIGIN
+
+    return shapely.box(x0, y0, x0 + km * 1_000, y0 + km * 1_000)
+
+def tessellation(
+    km: float,
+    spacing: float,
+    rng: np.random.Generator,
+    segment: float = None
+) -> np.ndarray:
+    '''
+    Returns the Voronoi cells of jittered grid points, spacing metres apart,
+    clipped to the extent: a tiling of polygons of about spacing x spacing,
+    with an edge every segment metres (if given).
+    '''
+    x0, y0 = ORIGIN
+    n = max(round(km * 1_000 / spacing), 2) # points per side, a Voronoi diagram needs two or more
+    step = km * 1_000 / n
+    centres = (np.stack(np.meshgrid(np.arange(n), np.arange(n)), axis = -1).reshape(-1, 2) + 0.5) * step
+    points = centres + rng.uniform(-0.4, 0.4, centres.shape) * step + (x0, y0)
+    cells = shapely.intersection(shapely.get_parts(shapely.voronoi_polygons(shapely.multipoints(points))), extent(km))
+
+    return shapely.segmentize(cells, segment) if segment else cells
+
+def imu_layer(km: float, rng: np.random.Generator) -> gpd.GeoDataFrame:
+    '''
+    Returns IMU-like building blocks, with the numeric columns of the heat
+    stress table (and a few missing values).
+    '''
+    geoms = tessellation(km, IMU_SPACING, rng, IMU_SEGMENT)
+    values = rng.normal(10, 3, (len(geoms), len(HS_COLS)))
+    values[rng.random(values.shape) < 0.01] = np.nan
+
+    return gpd.GeoDataFrame(data = pd.DataFrame(values, columns = HS_COLS), geometry = geoms, crs = CRS)
+
+def lcz_layer(km: float, rng: np.random.Generator) -> gpd.GeoDataFrame:
+    '''
+    Returns LCZ-like patches, with an LCZ class, the numeric columns of the
+    heat sensitivity table and sns_int, the sensitivity on a 0 to 5 scale.
+    '''
+    geoms = tessellation(km, LCZ_SPACING, rng, LCZ_SEGMENT)
+    gdf = gpd.GeoDataFrame(
+        data = {'lcz': rng.choice(LCZ_CLASSES, len(geoms)), **{col: rng.uniform(0, 100, len(geoms)) for col in SNS_COLS}},
+        geometry = geoms,
+        crs = CRS
+    )
+    gdf.loc[:, 'sns_int'] = rng.integers(0, 6, len(gdf))
+
+    return gdf
+
+def rent_zones(km: float, rng: np.random.Generator) -> gpd.GeoDataFrame:
+    '''
+    Returns rent control zones, nested in cities: every zone belongs to the
+    city whose cell contains it, and idZone restarts from 1 in every city,
+    like in the real tables.
+    '''
+    geoms = tessellation(km, ZONE_SPACING, rng)
+    cities = list(PERIODS)
+    centroids = shapely.centroid(geoms)
+    city_cells = ((shapely.get_x(centroids) - ORIGIN[0]) // CITY_SPACING + (shapely.get_y(centroids) - ORIGIN[1]) // CITY_SPACING).astype(int)
+    gdf = gpd.GeoDataFrame(data = {'city': [cities[cell % len(cities)] for cell in city_cells]}, geometry = geoms, crs = CRS)
+    gdf.loc[:, 'idZone'] = gdf.groupby('city').cumcount() + 1
+
+    return gdf
+
+def rent_table(gdf_zones: gpd.GeoDataFrame, rng: np.random.Generator) -> pd.DataFrame:
+    '''
+    Returns the long rent control table of the zones: one row per city,
+    period, combination and zone, with ref, refmaj and refmin.
+    '''
+    df_zn = pd.DataFrame(gdf_zones.loc[:, ['city', 'idZone']]) # zn: zone
+    rows = [
+        (city, period, rooms, epoque, furnished, housing_type)
+        for city, periods in PERIODS.items()
+        for period in periods
+        for rooms, epoque, furnished, housing_type in COMBINATIONS
+    ]
+    df_rc = pd.DataFrame(data = rows, columns = ['city', 'period', 'rooms', 'epoque', 'furnished', 'housingType']).merge(df_zn, on = 'city') # rc: rent control
+    df_rc.loc[:, 'ref'] = rng.uniform(20, 40, len(df_rc))
+    df_rc.loc[:, 'refmaj'] = 1.2 * df_rc.loc[:, 'ref']
+    df_rc.loc[:, 'refmin'] = 0.7 * df_rc.loc[:, 'ref']
+
+    return df_rc
+
+def units_layers(km: float, rng: np.random.Generator) -> Dict[str, gpd.GeoDataFrame]:
+    '''
+    Returns Code Postal-like units, which tile the area, and SeLoger
+    Quartier-like units, discs of about SELOGER_SPACING that overlap each other.
+    '''
+    geoms = tessellation(km, UNIT_SPACING, rng)
+    gdf_cp = gpd.GeoDataFrame( # cp: code postal
+        data = {'code_postal': [f'{75001 + i}' for i in range(len(geoms))]},
+        geometry = geoms,
+        crs = CRS
+    )
+
+    centres = shapely.centroid(tessellation(km, SELOGER_SPACING, rng))
+    gdf_sl = gpd.GeoDataFrame( # sl: seloger
+        data = {'seloger_quartier': [f'Quartier {i}' for i in range(len(centres))]},
+        geometry = shapely.intersection(shapely.buffer(centres, 0.7 * SELOGER_SPACING), extent(km)),
+        crs = CRS
+    )
+
+    return {'codes_postaux': gdf_cp, 'seloger_quartiers': gdf_sl}
+
+def flood_layers(km: float, rng: np.random.Generator) -> Tuple[np.ndarray]:
+    '''
+    Returns the parts of a flood risk layer and of an always underwater layer:
+    a meandering river across the area, 120 m wide, and the flood zone on both
+    of its banks, cut in pieces like the polygons of the flood map.
+    '''
+    x0, y0 = ORIGIN
+    side = km * 1_000
+    xs = np.linspace(x0, x0 + side, 200)
+    ys = y0 + side / 2 + side / 6 * np.sin(np.linspace(0, 4 * np.pi, 200)) + rng.normal(0, 20, 200)
+    river = shapely.buffer(shapely.LineString(np.column_stack([xs, ys])), 60)
+    flood = shapely.difference(shapely.buffer(river, 800), river)
+    pieces = shapely.intersection(flood, tessellation(km, 500, rng))
+
+    return shapely.get_parts(pieces[~shapely.is_empty(pieces)]), shapely.get_parts(np.array([river]))
+
+def layers(km: float, seed: int = 0) -> Dict:
+    '''
+    Returns all the synthetic layers of a square area of side km. The same
+    km and seed always give the same layers.
+    '''
+    rng = np.random.default_rng(seed)
+    gdf_zn = rent_zones(km, rng) # zn: zone
+    flood_parts, underwater_parts = flood_layers(km, rng)
+
+    return {
+        'imu': imu_layer(km, rng),
+        'lcz': lcz_layer(km, rng),
+        'zones': gdf_zn,
+        'rent': rent_table(gdf_zn, rng),
+        'flood_parts': flood_parts,
+        'underwater_parts': underwater_parts
+    } | units_layers(km, rng)
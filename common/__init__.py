@@ -0,0 +1,3 @@
+'''
+Shared code for the scripts of every city and section of the project.
+'''
@@ -0,0 +1,75 @@
+### 1. MODULE IMPORTS
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from scipy import sparse
+from typing import List
+
+from common.overlap_weights import overlap_matrix, normalize_rows
+
+### 2. FUNCTION DEFINITIONS
+def interpolate(
+    matrix: sparse.csr_matrix,
+    values: np.ndarray
+) -> np.ndarray:
+    '''
+    Returns the area-weighted averages of the columns of values (one row per
+    source polygon) for every row of the overlap matrix, with a single sparse
+    matrix product. Rows of the matrix that sum to zero get missing values.
+    '''
+    covered = np.asarray(matrix.sum(axis = 1)).ravel() > 0
+    averages = normalize_rows(matrix) @ values
+    averages[~covered] = np.nan
+
+    return averages
+
+def weighted_averages(
+    gdf_units: gpd.GeoDataFrame,
+    gdf_source: gpd.GeoDataFrame,
+    numeric_cols: List[str],
+    workers: int = 1
+) -> pd.DataFrame:
+    '''
+    Returns, for every geographic unit, the weighted average of the numeric_cols
+    of the source polygons. The weight of a source polygon is the area of its
+    intersection with the unit, normalized so that the weights of each unit add
+    up to one. Missing source values count as zero, like pandas' sum does.
+
+    The result is indexed like gdf_units. Units that do not intersect any source
+    polygon get missing values. With workers > 1 the overlay is run by a pool
+    of processes.
+    '''
+    values = np.nan_to_num(gdf_source.loc[:, numeric_cols].to_numpy(dtype = np.float64))
+
+    return pd.DataFrame(
+        data = interpolate(overlap_matrix(gdf_units, gdf_source, workers = workers), values),
+        index = gdf_units.index,
+        columns = numeric_cols
+    )
+
+def interpolate_tensor(
+    matrix: sparse.csr_matrix,
+    tensor: np.ndarray
+) -> np.ndarray:
+    '''
+    Same as interpolate, for a tensor of values of shape (..., #source polygons,
+    #variables), e.g. one slice per period and category: all slices go through
+    a single sparse matrix product. Returns a tensor of shape (..., #units, 
+    #variables).
+
+    Like in interpolate, a missing value of any source polygon that overlaps
+    a unit makes the average of the unit missing (e.g. a unit straddling a
+    territory that has not published its values yet), instead of averaging
+    the known part only.
+    '''
+    shape = tensor.shape
+    values = np.moveaxis(tensor, -2, 0).reshape(shape[-2], -1) # one column per slice and variable
+    known = ~np.isnan(values)
+
+    totals = matrix @ np.where(known, values, 0.0)
+    weights = matrix @ known.astype(np.float64)
+    unknown = matrix @ (~known).astype(np.float64) # area of the unit over source polygons without value
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        averages = np.where((weights > 0) & (unknown == 0), totals / weights, np.nan)
+
+    return np.moveaxis(averages.reshape((matrix.shape[0],) + shape[:-2] + shape[-1:]), 0, -2)
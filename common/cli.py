@@ -0,0 +1,40 @@
+### 1. MODULE IMPORTS
+import argparse
+
+### 2. FUNCTION DEFINITIONS
+def shared_parser() -> argparse.ArgumentParser:
+    '''
+    Returns the parser of the command line options shared by the aggregation,
+    download and lookup scripts, to which a script can add its own options.
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--workers',
+        type = int,
+        default = 1,
+        help = 'number of processes used for the overlays (default: 1, no parallelism)'
+    )
+    parser.add_argument(
+        '--no-figures',
+        action = 'store_true',
+        help = 'only write the data files: skip the maps and plots, and the import of the plotting libraries'
+    )
+    parser.add_argument(
+        '--trace-memory',
+        action = 'store_true',
+        help = 'also record the lines that allocate the most memory in every stage of the run report (slower)'
+    )
+    parser.add_argument(
+        '--unit-timings',
+        action = 'store_true',
+        help = 'time every unit of the overlays, to list the slowest ones in the run report (slower)'
+    )
+
+    return parser
+
+def parse_args() -> argparse.Namespace:
+    '''
+    Parses the command line options shared by the aggregation, download and lookup scripts.
+    '''
+
+    return shared_parser().parse_args()
@@ -0,0 +1,163 @@
+### 1. MODULE IMPORTS
+import shutil
+import pyarrow as pa
+import geopandas as gpd
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pathlib import Path
+from pyogrio.raw import open_arrow
+from typing import List, Optional, Tuple
+
+from common.geoparquet import write_geoparquet
+from common.crosswalks import read_commune_code_postal, read_iris_commune
+from common.parallel import can_fork, process_pool
+
+### 2. WORKER STATE
+# paths of the IRIS partitions, crosswalks and outputs, set once per worker process by init_worker
+worker_state = None
+
+### 3. FUNCTION DEFINITIONS
+def partition_iris(
+    iris_path: Path,
+    partitions_dir: Path,
+    batch_size: int = 10_000
+) -> Tuple[List[str], str]:
+    '''
+    Splits the national IRIS geotable into one parquet file per department
+    (the first two characters of CODE_IRIS, 2A and 2B included, or three
+    overseas: 971 to 976, like the DEP of the crosswalks), in a single
+    pass over the file, batch_size features at a time: the whole of France is
+    never in memory. Returns the departments found and the crs of the IRIS.
+    '''
+    partitions_dir.mkdir(parents = True, exist_ok = True)
+    writers = {}
+    with open_arrow(iris_path, columns = ['CODE_IRIS'], batch_size = batch_size, use_pyarrow = True) as (meta, reader):
+        for batch in reader:
+            table = pa.Table.from_batches([batch])
+            table = table.rename_columns(['CODE_IRIS', 'geometry']) # the name of the geometry column depends on the driver
+            departments = pc.utf8_slice_codeunits(table.column('CODE_IRIS'), 0, 2)
+            departments = pc.if_else(pc.equal(departments, '97'), pc.utf8_slice_codeunits(table.column('CODE_IRIS'), 0, 3), departments)
+            for department in pc.unique(departments).to_pylist():
+                part = table.filter(pc.equal(departments, department))
+                if department not in writers:
+                    writers[department] = pq.ParquetWriter(partitions_dir / f'{department}.parquet', part.schema)
+                writers[department].write_table(part)
+
+    for writer in writers.values():
+        writer.close()
+
+    return sorted(writers), meta['crs']
+
+def init_worker(state: dict):
+    '''
+    Stores the paths of the inputs and outputs, once per worker process.
+    '''
+    global worker_state
+    worker_state = state
+
+def build_department(department: str) -> int:
+    '''
+    Builds the Commune and Code Postal polygons of one department, from its
+    IRIS partition, and writes them to the department=XX partitions of the
+    output datasets. IRIS are an exact subdivision of Communes (and Communes
+    tile the Codes Postaux), so the polygons are melted with a coverage union,
+    which only has to drop the shared edges. Returns the number of Codes
+    Postaux written.
+    '''
+    iris_dir, crs, iris_commune_path, commune_code_postal_path, output_dir = (
+        worker_state[key] for key in ('iris_dir', 'crs', 'iris_commune_path', 'commune_code_postal_path', 'output_dir')
+    )
+    df_ic = read_iris_commune(iris_commune_path, departments = [department]) # ic: IRIS - Commune
+    df_cc = read_commune_code_postal(commune_code_postal_path, communes = df_ic.loc[:, 'DEPCOM'].unique().tolist()) # cc: Commune - Code Postal
+
+    table = pq.read_table(iris_dir / f'{department}.parquet')
+    gdf_ir = gpd.GeoDataFrame( # ir: IRIS
+        data = {'CODE_IRIS': table.column('CODE_IRIS').to_pandas()},
+        geometry = gpd.GeoSeries.from_wkb(table.column('geometry').to_numpy(zero_copy_only = False), crs = crs)
+    )
+    del table
+
+    gdf_co = ( # co: Commune
+        gdf_ir
+        .merge(df_ic.loc[:, ['CODE_IRIS', 'DEPCOM', 'REG']], how = 'inner', on = 'CODE_IRIS')
+        .dissolve(by = 'DEPCOM', aggfunc = {'REG': 'first'}, method = 'coverage')
+        .reset_index()
+    )
+    gdf_cp = ( # cp: Code Postal
+        gdf_co
+        .merge(df_cc.loc[:, ['DEPCOM', 'CP']], how = 'inner', on = 'DEPCOM')
+        .dissolve(by = 'CP', aggfunc = {'REG': 'first'}, method = 'coverage')
+        .reset_index()
+    )
+
+    for name, gdf in (('communes', gdf_co), ('codes_postaux', gdf_cp)):
+        partition_dir = output_dir / f'{name}_geoshapes' / f'department={department}'
+        partition_dir.mkdir(parents = True, exist_ok = True)
+        write_geoparquet(
+            gdf.rename(columns = {'DEPCOM': 'code_commune', 'CP': 'code_postal', 'REG': 'region'}),
+            partition_dir / 'part-0.parquet'
+        )
+
+    return len(gdf_cp)
+
+def build_codes_postaux(
+    iris_path: Path,
+    iris_commune_path: Path,
+    commune_code_postal_path: Path,
+    output_dir: Path,
+    workers: int = 1
+):
+    '''
+    Builds the Commune and Code Postal polygons of the whole of France, one
+    department at a time, into output_dir/communes_geoshapes and
+    output_dir/codes_postaux_geoshapes, partitioned by department. With
+    workers > 1 the departments are built by a pool of forked processes; each
+    one only holds the IRIS of the department it is working on.
+
+    The crosswalks are the Parquet tables written by common.crosswalks, from
+    which every department only reads its own rows.
+    '''
+    iris_dir = output_dir / 'iris_partitions'
+    print('Splitting the IRIS geotable by department...')
+    departments, crs = partition_iris(iris_path, iris_dir)
+
+    state = {
+        'iris_dir': iris_dir,
+        'crs': crs,
+        'iris_commune_path': iris_commune_path,
+        'commune_code_postal_path': commune_code_postal_path,
+        'output_dir': output_dir
+    }
+    print(f'Building the Codes Postaux of {len(departments)} departments...')
+    if workers > 1 and can_fork():
+        with process_pool(workers, initializer = init_worker, initargs = (state, )) as executor:
+            counts = list(executor.map(build_department, departments))
+    else:
+        init_worker(state)
+        counts = [build_department(department) for department in departments]
+
+    shutil.rmtree(iris_dir)
+    print(f'{sum(counts)} Code Postal polygons written (Codes Postaux across departments are split in one part per department)')
+
+def read_codes_postaux(
+    dataset_dir: Path,
+    region: Optional[str] = None,
+    departments: Optional[List[str]] = None
+) -> gpd.GeoSeries:
+    '''
+    Reads the Code Postal polygons of a region (e.g. '11', Île-de-France) or
+    of some departments from the partitioned dataset written by
+    build_codes_postaux, without reading the rest of France. A Code Postal
+    that spans several departments has one part in each, which are melted
+    back together. Returns the polygons, indexed by code_postal.
+    '''
+    assert dataset_dir.exists(), f'{dataset_dir.name} does not exist, run france/geographic_units/code/codes_postaux_geoshapes.py first!'
+    filters = []
+    if region is not None:
+        filters.append(('region', '==', region))
+    if departments is not None:
+        filters.append(('department', 'in', departments))
+
+    gdf = gpd.read_parquet(dataset_dir, columns = ['code_postal', 'geometry'], filters = filters or None)
+
+    return gdf.dissolve(by = 'code_postal', method = 'coverage').loc[:, 'geometry']
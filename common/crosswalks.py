@@ -0,0 +1,116 @@
+### 1. MODULE IMPORTS
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from typing import List, Optional
+
+### 2. SCHEMAS
+# every code is a string (leading zeros, Corsica's 2A and 2B). Parquet already
+# dictionary encodes the repetitive columns on disk; an arrow dictionary type
+# would prevent pyarrow from skipping row groups with their statistics
+IRIS_COMMUNE_SCHEMA = pa.schema([
+    ('REG', pa.string()),
+    ('DEP', pa.string()),
+    ('DEPCOM', pa.string()),
+    ('CODE_IRIS', pa.string())
+])
+COMMUNE_CODE_POSTAL_SCHEMA = pa.schema([
+    ('DEP', pa.string()),
+    ('DEPCOM', pa.string()),
+    ('CP', pa.string())
+])
+
+### 3. FUNCTION DEFINITIONS
+def write_table(
+    df: pd.DataFrame,
+    schema: pa.Schema,
+    path: Path
+):
+    '''
+    Writes a crosswalk as Parquet, sorted by its columns (from left to right),
+    with one row group per department. Every row group keeps the min and max of
+    its columns, so a filter on region, department or commune only reads the
+    row groups (departments) that can match. The file is written to a
+    temporary path first, so readers never see a half-written file.
+    '''
+    df = df.loc[:, schema.names].sort_values(schema.names).reset_index(drop = True)
+    tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    with pq.ParquetWriter(tmp_path, schema) as writer:
+        for _, df_dep in df.groupby('DEP', sort = False): # in the sorted order
+            writer.write_table(pa.Table.from_pandas(df_dep, schema = schema, preserve_index = False))
+    os.replace(tmp_path, path)
+
+def write_iris_commune(xlsx_path: Path, path: Path):
+    '''
+    Parses the INSEE IRIS - Commune crosswalk (the Emboitements_IRIS sheet)
+    once, for the whole of France, into a typed Parquet table.
+    '''
+    df_ic = pd.read_excel( # ic: IRIS - Commune
+        xlsx_path,
+        sheet_name = 'Emboitements_IRIS',
+        header = 5, # table starts on the 6th row
+        usecols = IRIS_COMMUNE_SCHEMA.names,
+        dtype = str
+    )
+    write_table(df_ic, IRIS_COMMUNE_SCHEMA, path)
+
+def write_commune_code_postal(csv_path: Path, path: Path):
+    '''
+    Parses the La Poste Commune - Code Postal crosswalk once into a typed
+    Parquet table, with its manual corrections, and the department of every
+    Commune (3 characters overseas, 2 otherwise).
+    '''
+    df_cc = ( # cc: Commune - Code Postal
+        pd
+        .read_csv(
+            csv_path,
+            usecols = ['code_commune_insee', 'code_postal'],
+            dtype = str
+        )
+        .drop_duplicates()
+        .reset_index(drop = True)
+        .rename(columns = {'code_commune_insee': 'DEPCOM', 'code_postal': 'CP'})
+    )
+    df_cc.loc[df_cc.loc[:, 'CP'] == '93380', 'DEPCOM'] = '93059' # There is one error on Pierrefite-sur-Seine
+    df_cc = df_cc.drop_duplicates()
+    overseas = df_cc.loc[:, 'DEPCOM'].str.startswith('97')
+    df_cc.loc[:, 'DEP'] = df_cc.loc[:, 'DEPCOM'].str[:2].where(~overseas, df_cc.loc[:, 'DEPCOM'].str[:3])
+    write_table(df_cc, COMMUNE_CODE_POSTAL_SCHEMA, path)
+
+def filters(**columns: Optional[List[str]]) -> Optional[List]:
+    '''
+    Returns the pyarrow filters that keep the rows whose columns take one of
+    the given values (None: any value).
+    '''
+    result = [(column, 'in', values) for column, values in columns.items() if values is not None]
+
+    return result or None
+
+def read_iris_commune(
+    path: Path,
+    regions: Optional[List[str]] = None,
+    departments: Optional[List[str]] = None
+) -> pd.DataFrame:
+    '''
+    Reads the IRIS - Commune crosswalk, only the rows of some regions and/or
+    departments. The filter is pushed down to the Parquet reader, so the row
+    groups of the rest of France are skipped.
+    '''
+    assert path.exists(), f'{path.name} does not exist, run france/geographic_units/code/crosswalks.py first!'
+
+    return pd.read_parquet(path, filters = filters(REG = regions, DEP = departments))
+
+def read_commune_code_postal(
+    path: Path,
+    departments: Optional[List[str]] = None,
+    communes: Optional[List[str]] = None
+) -> pd.DataFrame:
+    '''
+    Reads the Commune - Code Postal crosswalk, only the rows of some
+    departments and/or communes, with the filter pushed down to the Parquet reader.
+    '''
+    assert path.exists(), f'{path.name} does not exist, run france/geographic_units/code/crosswalks.py first!'
+
+    return pd.read_parquet(path, filters = filters(DEP = departments, DEPCOM = communes))
@@ -0,0 +1,134 @@
+### 1. MODULE IMPORTS
+import os
+import json
+import shutil
+import hashlib
+import requests
+from pathlib import Path
+from typing import Dict, Optional
+from datetime import datetime, timezone
+
+from common.fetch import HEADERS
+
+### 2. PATH DEFINITIONS
+cache_dir = Path(__file__).parents[1] / '.cache' / 'downloads'
+objects_dir = cache_dir / 'objects' # the downloaded files, named by the sha256 of their content
+sources_dir = cache_dir / 'sources' # one json per URL: content hash, ETag, Last-Modified...
+
+### 3. FUNCTION DEFINITIONS
+def source_path(url: str) -> Path:
+    '''
+    Returns the path of the metadata file of url.
+    '''
+    return sources_dir / f'{hashlib.sha256(url.encode()).hexdigest()[:32]}.json'
+
+def read_source(url: str) -> Optional[Dict]:
+    '''
+    Returns the metadata of the last download of url, if its content is still in the cache.
+    '''
+    path = source_path(url)
+    if not path.exists():
+        return None
+
+    source = json.loads(path.read_text())
+    if not (objects_dir / source['sha256']).exists():
+        return None
+
+    return source
+
+def write_atomic(path: Path, text: str) -> None:
+    '''
+    Writes text to path through a temporary file, so the file is never half written.
+    '''
+    path.parent.mkdir(parents = True, exist_ok = True)
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    tmp_path.write_text(text)
+    os.replace(tmp_path, path)
+
+def place(object_path: Path, destination: Path) -> None:
+    '''
+    Makes destination a copy of the cached file: a hard link when possible
+    (no extra disk space), a real copy otherwise. Nothing is done if
+    destination already is that file.
+    '''
+    if destination.exists() and destination.samefile(object_path):
+        return
+
+    destination.parent.mkdir(parents = True, exist_ok = True)
+    tmp_destination = destination.with_name(f'.{destination.name}.{os.getpid()}.tmp')
+    try:
+        os.link(object_path, tmp_destination)
+    except OSError: # e.g. another file system
+        shutil.copyfile(object_path, tmp_destination)
+    os.replace(tmp_destination, destination)
+
+def download(
+    url: str,
+    destination: Optional[Path] = None,
+    revalidate: bool = True,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: float = 600.0
+) -> Path:
+    '''
+    Downloads url through the cache, and returns the path of the file:
+    destination if given (which gets a copy of the file), or the path of the
+    file in the cache otherwise.
+
+    Files are stored by the sha256 of their content, next to the metadata of
+    their source (URL, ETag, Last-Modified, time of download). If url was
+    downloaded before, the request is made conditional on the content having
+    changed since, so the server answers with an empty 304 response and nothing
+    is downloaded again. With revalidate = False, no request is made at all if
+    url is in the cache. If the server cannot be reached, the cached version is
+    used, with a warning.
+    '''
+    source = read_source(url)
+    if source is not None and not revalidate:
+        object_path = objects_dir / source['sha256']
+        if destination is not None:
+            place(object_path, destination)
+        return destination or object_path
+
+    request_headers = HEADERS | (headers or {})
+    if source is not None:
+        if source.get('etag'):
+            request_headers['If-None-Match'] = source['etag']
+        if source.get('last_modified'):
+            request_headers['If-Modified-Since'] = source['last_modified']
+
+    objects_dir.mkdir(parents = True, exist_ok = True)
+    tmp_path = objects_dir / f'.{os.getpid()}.tmp'
+    try:
+        with requests.get(url, headers = request_headers, timeout = timeout, stream = True) as response:
+            if response.status_code == 304 and source is not None:
+                print('Unchanged since the last download:', url)
+            else:
+                response.raise_for_status()
+                sha256 = hashlib.sha256()
+                with open(tmp_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size = 1 << 20):
+                        sha256.update(chunk)
+                        f.write(chunk)
+                os.replace(tmp_path, objects_dir / sha256.hexdigest()) # content addressed: same content, same file
+
+                source = {
+                    'url': url,
+                    'sha256': sha256.hexdigest(),
+                    'size': (objects_dir / sha256.hexdigest()).stat().st_size,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'content_type': response.headers.get('Content-Type'),
+                    'downloaded_at': datetime.now(timezone.utc).isoformat(timespec = 'seconds')
+                }
+                write_atomic(source_path(url), json.dumps(source, indent = 4))
+    except requests.RequestException as error:
+        tmp_path.unlink(missing_ok = True)
+        if source is None:
+            raise
+        print(f'Could not revalidate {url} ({error}), using the cached version from {source["downloaded_at"]}')
+
+    object_path = objects_dir / source['sha256']
+    if destination is not None:
+        place(object_path, destination)
+
+    return destination or object_path
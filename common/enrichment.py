@@ -0,0 +1,157 @@
+### 1. MODULE IMPORTS
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from collections import defaultdict, deque
+from concurrent.futures import Executor
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from common.lookup import Layer, attach, locate
+from common.parallel import can_fork, process_pool
+
+### 2. WORKER STATE
+# unit layers, set once per worker process by init_worker
+worker_layers = None
+
+### 3. FUNCTION DEFINITIONS
+def init_worker(layers: List[Layer]):
+    '''
+    Stores the unit layers (with their STRtrees), once per worker process.
+    With fork, the layers are inherited from the parent, not pickled.
+    '''
+    global worker_layers
+    worker_layers = layers
+
+def read_chunks(
+    path: Path,
+    chunk_size: int,
+    coordinate_cols: List[str] = []
+) -> Iterator[pd.DataFrame]:
+    '''
+    Reads a csv or Parquet file chunk_size rows at a time. The columns of a
+    csv other than coordinate_cols are read as text, as they are: their type
+    would otherwise be guessed chunk by chunk (a column of text that is empty
+    in the first chunk is read as numbers), and could change between chunks.
+    '''
+    if path.suffix == '.parquet':
+        for batch in pq.ParquetFile(path).iter_batches(batch_size = chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize = chunk_size, dtype = defaultdict(lambda: str, {col: float for col in coordinate_cols}))
+
+def locate_chunk(coordinates: np.ndarray) -> List[np.ndarray]:
+    '''
+    Locates the (lon, lat) rows of a chunk in every layer (see
+    common.lookup.locate).
+    '''
+
+    return locate(worker_layers, coordinates[:, 0], coordinates[:, 1])
+
+def located_chunks(
+    chunks: Iterable[pd.DataFrame],
+    coordinate_cols: List[str],
+    executor: Optional[Executor] = None,
+    window: int = 1
+) -> Iterator[Tuple[pd.DataFrame, List[np.ndarray]]]:
+    '''
+    Yields every chunk, in order, with the rows of its units in every layer.
+    With an executor, only the coordinates are sent to the workers, and only
+    the unit rows come back (not the wide table of results), with at most
+    window chunks in flight: executor.map would read (and hold) the whole
+    input before the first result comes back.
+    '''
+    pending = deque()
+    for df in chunks:
+        coordinates = df.loc[:, coordinate_cols].to_numpy(dtype = float)
+        if executor is None:
+            yield df, locate_chunk(coordinates)
+            continue
+        pending.append((df, executor.submit(locate_chunk, coordinates)))
+        if len(pending) >= window:
+            df, future = pending.popleft()
+            yield df, future.result()
+    while pending:
+        df, future = pending.popleft()
+        yield df, future.result()
+
+def chunk_schema(df: pd.DataFrame) -> pa.Schema:
+    '''
+    Returns the Parquet schema of the chunks, from the first one, with the
+    types that can change from one chunk to the next promoted: integers to
+    floats (the metrics of the points outside a layer are missing) and
+    columns without any value to text.
+    '''
+    schema = pa.Schema.from_pandas(df, preserve_index = False)
+    for i, field in enumerate(schema):
+        if pa.types.is_integer(field.type):
+            schema = schema.set(i, field.with_type(pa.float64()))
+        elif pa.types.is_null(field.type):
+            schema = schema.set(i, field.with_type(pa.large_string()))
+
+    return schema
+
+def write_chunks(chunks: Iterable[pd.DataFrame], path: Path) -> int:
+    '''
+    Writes the chunks one after the other into a csv or Parquet file (with
+    the schema of the first chunk, see chunk_schema), so only one chunk is
+    held at a time. The file is written to a temporary path first, so readers
+    never see a half-written file, and the temporary file is removed if the
+    writing fails. Returns the number of rows.
+    '''
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    n_rows, writer = 0, None
+    try:
+        with open(tmp_path, 'wb') as f:
+            try:
+                for df in chunks:
+                    if path.suffix == '.parquet':
+                        writer = writer or pq.ParquetWriter(f, chunk_schema(df))
+                        writer.write_table(pa.Table.from_pandas(df, schema = writer.schema, preserve_index = False))
+                    else:
+                        df.to_csv(f, header = n_rows == 0, index = False)
+                    n_rows += len(df)
+            finally: # before the file is closed
+                if writer:
+                    writer.close()
+    except BaseException:
+        tmp_path.unlink(missing_ok = True)
+        raise
+    os.replace(tmp_path, path)
+
+    return n_rows
+
+def enrich(
+    input_path: Path,
+    output_path: Path,
+    layers: List[Layer],
+    lon_col: str = 'lon',
+    lat_col: str = 'lat',
+    chunk_size: int = 100_000,
+    workers: int = 1
+) -> int:
+    '''
+    Enriches a csv or Parquet file of points (e.g. housing ads) with the units
+    of every layer that contain them, and all their results, streaming: the
+    file is read chunk_size rows at a time, every chunk is located with a
+    vectorized lookup, and written to output_path before the next ones are
+    read, so the memory does not depend on the size of the file (but does on
+    chunk_size, the results add hundreds of columns). With workers > 1 the
+    chunks are located by a pool of forked processes, with at most two chunks
+    per worker in flight, and the results are attached by the main process.
+    Returns the number of rows written.
+    '''
+    chunks = read_chunks(input_path, chunk_size, [lon_col, lat_col])
+    enriched = lambda located: (
+        pd.concat([df.reset_index(drop = True), attach(layers, rows)], axis = 1)
+        for df, rows in located
+    )
+    if workers > 1 and can_fork():
+        with process_pool(workers, initializer = init_worker, initargs = (layers, )) as executor:
+            return write_chunks(enriched(located_chunks(chunks, [lon_col, lat_col], executor, 2 * workers)), output_path)
+
+    init_worker(layers)
+
+    return write_chunks(enriched(located_chunks(chunks, [lon_col, lat_col])), output_path)
@@ -0,0 +1,165 @@
+### 1. MODULE IMPORTS
+import json
+import shutil
+import hashlib
+import requests
+import pandas as pd
+import geopandas as gpd
+from pathlib import Path
+from typing import Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+
+from common.fetch import fetch, fetch_all
+
+### 2. PATH DEFINITIONS
+cache_dir = Path(__file__).parents[1] / '.cache' / 'feature_server'
+
+### 3. FUNCTION DEFINITIONS
+def query_url(layer_url: str, params: Dict) -> str:
+    '''
+    Returns the URL of a query to an ArcGIS FeatureServer layer.
+    '''
+    return requests.Request('GET', f'{layer_url}/query', params = {'f': 'json'} | params).prepare().url
+
+def get_json(url: str, layer_dir: Path) -> Dict:
+    '''
+    Returns the json response to url, which is kept on disk, under a name
+    derived from url, so that the request is not made again when an
+    interrupted crawl is resumed. ArcGIS reports errors with a 200 response,
+    so those are removed from disk and raised.
+    '''
+    path = fetch(url, layer_dir / f'{hashlib.sha256(url.encode()).hexdigest()[:32]}.json')
+    response = json.loads(path.read_text())
+    if 'error' in response:
+        path.unlink()
+        raise RuntimeError(f'{url}: {response["error"]}')
+
+    return response
+
+def envelope(bbox: Tuple[float], wkid: int) -> Dict:
+    '''
+    Returns the query parameters to select the features that intersect bbox.
+    '''
+    xmin, ymin, xmax, ymax = bbox
+
+    return {
+        'geometry': json.dumps({'xmin': xmin, 'ymin': ymin, 'xmax': xmax, 'ymax': ymax, 'spatialReference': {'wkid': wkid}}),
+        'geometryType': 'esriGeometryEnvelope',
+        'spatialRel': 'esriSpatialRelIntersects',
+        'inSR': wkid
+    }
+
+def split(bbox: Tuple[float], n_divide: int = 2) -> List[Tuple[float]]:
+    '''
+    Splits bbox into n_divide x n_divide tiles.
+    '''
+    xmin, ymin, xmax, ymax = bbox
+    xstep = (xmax - xmin) / n_divide
+    ystep = (ymax - ymin) / n_divide
+
+    return [
+        (xmin + xi * xstep, ymin + yi * ystep, xmin + (xi + 1) * xstep, ymin + (yi + 1) * ystep)
+        for xi in range(n_divide)
+        for yi in range(n_divide)
+    ]
+
+def plan_tiles(
+    layer_url: str,
+    layer_dir: Path,
+    bbox: Tuple[float],
+    where: str,
+    wkid: int,
+    max_records: int,
+    workers: int,
+    max_depth: int = 16
+) -> List[Tuple[float]]:
+    '''
+    Returns tiles that cover bbox with at most max_records features each,
+    asking the server for the number of features in a tile (returnCountOnly,
+    which is cheap: no geometries) and splitting the tiles with too many. Tiles
+    are counted a whole level at a time, concurrently, and empty ones dropped.
+    '''
+    leaves, tiles = [], [bbox]
+    with ThreadPoolExecutor(max_workers = workers) as executor:
+        for depth in range(max_depth + 1):
+            if not tiles:
+                return leaves
+            urls = [query_url(layer_url, envelope(tile, wkid) | {'where': where, 'returnCountOnly': 'true'}) for tile in tiles]
+            counts = [response['count'] for response in executor.map(get_json, urls, [layer_dir] * len(urls))]
+            leaves += [tile for tile, count in zip(tiles, counts) if 0 < count <= max_records]
+            tiles = [child for tile, count in zip(tiles, counts) if count > max_records for child in split(tile)]
+
+    raise RuntimeError(f'{layer_url}: tiles {2 ** max_depth} times smaller than the area still have more than {max_records} features')
+
+def fetch_features(
+    layer_url: str,
+    bbox: Tuple[float],
+    where: str = '1=1',
+    wkid: int = 2154,
+    workers: int = 8
+) -> gpd.GeoDataFrame:
+    '''
+    Downloads all the features of an ArcGIS FeatureServer layer that intersect
+    bbox (and fulfil where), in the crs of wkid.
+
+    The server only returns up to maxRecordCount features per request, so the
+    requests are planned before anything is downloaded: if the layer supports
+    pagination, the features are counted and fetched by pages (resultOffset);
+    otherwise the area is split in tiles of at most maxRecordCount features,
+    by counting them. The pages (or tiles) are then fetched concurrently.
+
+    Every response is kept in .cache/feature_server until the crawl is
+    complete, so an interrupted crawl resumes where it stopped. Features that
+    come in more than one tile (those crossing the edges) are only kept once,
+    by their object id, which is returned as objectid whatever the layer
+    calls it (OBJECTID, FID...).
+    '''
+    layer_dir = cache_dir / hashlib.sha256(f'{layer_url}|{bbox}|{where}|{wkid}'.encode()).hexdigest()[:32]
+    info = get_json(requests.Request('GET', layer_url, params = {'f': 'json'}).prepare().url, layer_dir)
+    max_records = info.get('maxRecordCount', 1000)
+    oid_field = info.get('objectIdField', 'objectid')
+    params = {'where': where, 'outFields': '*', 'returnGeometry': 'true', 'outSR': wkid}
+
+    paginate = info.get('advancedQueryCapabilities', {}).get('supportsPagination', False)
+    if paginate:
+        n_features = get_json(query_url(layer_url, envelope(bbox, wkid) | {'where': where, 'returnCountOnly': 'true'}), layer_dir)['count']
+        urls = [
+            query_url(layer_url, envelope(bbox, wkid) | params | {'orderByFields': oid_field, 'resultOffset': offset, 'resultRecordCount': max_records})
+            for offset in range(0, n_features, max_records)
+        ]
+    else:
+        tiles = plan_tiles(layer_url, layer_dir, bbox, where, wkid, max_records, workers)
+        urls = [query_url(layer_url, envelope(tile, wkid) | params) for tile in tiles]
+
+    print(f'Fetching {len(urls)} pages of at most {max_records} features from', layer_url)
+    paths = fetch_all(
+        [(url, layer_dir / f'{hashlib.sha256(url.encode()).hexdigest()[:32]}.json') for url in urls],
+        workers = workers,
+        per_host = workers
+    )
+
+    gdfs, seen = [], set()
+    for url, path in zip(urls, paths):
+        response = json.loads(path.read_text())
+        if 'error' in response:
+            path.unlink()
+            raise RuntimeError(f'{url}: {response["error"]}')
+        if response.get('exceededTransferLimit', False) and not paginate: # with pages, it means that there are more pages
+            path.unlink()
+            raise RuntimeError(f'{url}: more than {max_records} features, the server limit is lower than announced')
+        if not response.get('features'):
+            continue
+
+        gdf = gpd.read_file(path) # esri json
+        gdf = gdf.loc[~gdf.loc[:, oid_field].isin(seen)].drop_duplicates(oid_field) # deduplicate as the tiles come in
+        seen.update(gdf.loc[:, oid_field])
+        gdfs.append(gdf)
+
+    if gdfs:
+        gdf = pd.concat(gdfs, ignore_index = True).set_crs(f'EPSG:{wkid}', allow_override = True)
+    else:
+        gdf = gpd.GeoDataFrame(columns = [oid_field, 'geometry'], geometry = 'geometry', crs = f'EPSG:{wkid}')
+    gdf = gdf.rename(columns = {oid_field: 'objectid'})
+    shutil.rmtree(layer_dir) # complete: the next crawl starts from scratch
+
+    return gdf
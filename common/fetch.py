@@ -0,0 +1,110 @@
+### 1. MODULE IMPORTS
+import os
+import time
+import random
+import requests
+import threading
+from tqdm import tqdm
+from pathlib import Path
+from typing import List, Tuple
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+### 2. CONSTANTS
+RETRY_STATUS = {429, 500, 502, 503, 504} # worth another try: rate limits and server hiccups
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+}
+
+### 3. THREAD STATE
+# every thread keeps its own session, so connections are reused from one file to
+# the next; the semaphores limit the requests in flight against each host
+thread_state = threading.local()
+host_slots = {}
+host_slots_lock = threading.Lock()
+
+### 4. FUNCTION DEFINITIONS
+def session(per_host: int) -> requests.Session:
+    '''
+    Returns the session of the calling thread, creating it on first use.
+    '''
+    if not hasattr(thread_state, 'session'):
+        thread_state.session = requests.Session()
+        thread_state.session.headers.update(HEADERS)
+        for prefix in ('http://', 'https://'):
+            thread_state.session.mount(prefix, HTTPAdapter(pool_connections = per_host, pool_maxsize = per_host))
+
+    return thread_state.session
+
+def host_slot(url: str, per_host: int) -> threading.BoundedSemaphore:
+    '''
+    Returns the semaphore that limits the concurrent requests to the host of url.
+    '''
+    host = urlsplit(url).netloc
+    with host_slots_lock:
+        if host not in host_slots:
+            host_slots[host] = threading.BoundedSemaphore(per_host)
+
+        return host_slots[host]
+
+def fetch(
+    url: str,
+    destination: Path,
+    per_host: int = 8,
+    retries: int = 5,
+    backoff: float = 1.0,
+    timeout: float = 60.0
+) -> Path:
+    '''
+    Downloads url to destination. Failed requests (connection errors, timeouts,
+    429 and 5xx responses) are retried with exponential backoff, and the last
+    error is raised if every attempt fails. The file is written to a temporary
+    file and renamed once complete, so an interrupted run never leaves a
+    truncated file behind. Files already on disk are not downloaded again.
+    '''
+    if destination.exists():
+        return destination
+
+    destination.parent.mkdir(parents = True, exist_ok = True)
+    tmp_destination = destination.with_name(f'.{destination.name}.{threading.get_ident()}.tmp')
+
+    for attempt in range(retries + 1):
+        try:
+            with host_slot(url, per_host):
+                response = session(per_host).get(url, timeout = timeout)
+                if response.status_code in RETRY_STATUS:
+                    raise requests.HTTPError(f'{response.status_code} Error for url: {url}', response = response)
+                response.raise_for_status()
+                tmp_destination.write_bytes(response.content)
+
+            os.replace(tmp_destination, destination) # atomic: the file is either complete or absent
+            return destination
+
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as error:
+            tmp_destination.unlink(missing_ok = True)
+            status = error.response.status_code if error.response is not None else None
+            if attempt == retries or (status is not None and status not in RETRY_STATUS):
+                raise
+
+            time.sleep(backoff * 2 ** attempt * (1 + random.random())) # exponential backoff, with jitter
+
+def fetch_all(
+    jobs: List[Tuple[str, Path]],
+    workers: int = 16,
+    per_host: int = 8,
+    **kwargs
+) -> List[Path]:
+    '''
+    Downloads every (url, destination) pair of jobs on a pool of workers
+    threads, with at most per_host requests at a time against the same host
+    (kwargs go to fetch). Returns the destinations in the order of jobs. If
+    some download fails, the error is raised once all the others are done, so
+    a re-run only has to fetch the missing files.
+    '''
+    with ThreadPoolExecutor(max_workers = workers) as executor:
+        futures = [executor.submit(fetch, url, destination, per_host, **kwargs) for url, destination in jobs]
+        for future in tqdm(as_completed(futures), total = len(futures), desc = 'Fetching'):
+            future.exception() # wait for every download before raising
+
+    return [future.result() for future in futures]
@@ -0,0 +1,74 @@
+### 1. MODULE IMPORTS
+import shapely
+import numpy as np
+from pathlib import Path
+from typing import Tuple
+
+from common.overlay import candidate_pairs
+from common.projection import read_projected
+
+### 2. FUNCTION DEFINITIONS
+def read_parts(path: Path, crs: str) -> np.ndarray:
+    '''
+    Returns the polygons of a geotable as an array of single parts, in crs,
+    without dissolving them: a large dissolved multipolygon would be compared
+    with every unit, while single parts can be indexed. The reprojected
+    geotable is cached (see common.projection.read_projected).
+    '''
+
+    return shapely.get_parts(read_projected(path, crs).geometry.to_numpy())
+
+def clipped_union(unit_geoms: np.ndarray, parts: np.ndarray) -> np.ndarray:
+    '''
+    Returns, for every unit, the union of the parts that intersect it, clipped
+    to the unit; or None if no part intersects it. The parts are put in an
+    STRtree, so every unit is only clipped against the parts nearby, and the
+    unions are of a handful of small clipped pieces.
+    '''
+    unit_idx, part_idx = candidate_pairs(unit_geoms, shapely.STRtree(parts))
+    order = np.argsort(unit_idx, kind = 'stable')
+    unit_idx, part_idx = unit_idx[order], part_idx[order]
+    pieces = shapely.intersection(unit_geoms[unit_idx], parts[part_idx])
+
+    unions = np.full(len(unit_geoms), None, dtype = object)
+    units, starts = np.unique(unit_idx, return_index = True)
+    unions[units] = [shapely.union_all(group) for group in np.split(pieces, starts[1:])] if len(units) else []
+
+    return unions
+
+def flood_areas(
+    unit_geoms: np.ndarray,
+    flood_parts: np.ndarray,
+    underwater_parts: np.ndarray
+) -> Tuple[np.ndarray]:
+    '''
+    Returns the area of every unit, minus the areas always underwater, that is
+    at flood risk, |(P \\ A) ∩ R|, and the area of the unit minus the areas
+    always underwater, |P \\ A|. The areas always underwater are removed once
+    per unit, and only around the units that have some; the flood areas are
+    then clipped against these dry units.
+    '''
+    underwater = clipped_union(unit_geoms, underwater_parts)
+    dry_geoms = unit_geoms.copy()
+    wet = ~shapely.is_missing(underwater)
+    dry_geoms[wet] = shapely.difference(unit_geoms[wet], underwater[wet])
+
+    flooded = clipped_union(dry_geoms, flood_parts)
+    flooded_area = np.where(shapely.is_missing(flooded), 0.0, shapely.area(flooded))
+
+    return flooded_area, shapely.area(dry_geoms)
+
+def flood_exposure(
+    unit_geoms: np.ndarray,
+    flood_parts: np.ndarray,
+    underwater_parts: np.ndarray
+) -> np.ndarray:
+    '''
+    Returns the proportion of every unit, minus the areas always underwater,
+    that is at flood risk:
+        |(P \\ A) ∩ R| / |P \\ A|
+    Units of several layers can be passed together, in a single array.
+    '''
+    flooded_area, dry_area = flood_areas(unit_geoms, flood_parts, underwater_parts)
+
+    return flooded_area / dry_area
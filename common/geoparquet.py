@@ -0,0 +1,39 @@
+### 1. MODULE IMPORTS
+import os
+import geopandas as gpd
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+### 2. FUNCTION DEFINITIONS
+def write_geoparquet(
+    gdf: gpd.GeoDataFrame,
+    path: Path,
+    crs: Optional[str] = None
+):
+    '''
+    Writes a geotable as GeoParquet, with 2D geometries, optionally projected
+    to crs, and with the bbox covering columns that let readers skip the row 
+    groups outside a bounding box. The file is written to a temporary path 
+    first, so readers never see a half-written file.
+    '''
+    gdf = gdf.set_geometry(gdf.force_2d()) # flatten geometries to 2D
+    if crs is not None:
+        gdf = gdf.to_crs(crs)
+
+    tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    gdf.to_parquet(tmp_path, write_covering_bbox = True)
+    os.replace(tmp_path, path)
+
+def read_geoparquet(
+    path: Path,
+    columns: List[str],
+    bbox: Optional[Tuple[float]] = None
+) -> gpd.GeoDataFrame:
+    '''
+    Reads only the given columns (plus the geometry) of a GeoParquet file, 
+    through pyarrow. If bbox = (xmin, ymin, xmax, ymax) is given, only the 
+    rows that intersect it are read.
+    '''
+    assert path.exists(), f'{path.name} does not exist, run the corresponding *_geoparquet.py script first!'
+
+    return gpd.read_parquet(path, columns = columns + ['geometry'], bbox = bbox)
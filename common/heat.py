@@ -0,0 +1,76 @@
+### 1. DEFINITIONS
+HS_COLS = [ # num. variables in the heatstress table
+    'svf',
+    'aspecratio',
+    'hauteurmoy',
+    'perméable',
+    'voirie',
+    'bati',
+    'rugosite_t',
+    'admitance',
+    'albedo',
+    'fluchaleur',
+    'aleaj_note',
+    'alean_note',
+    'alea_j_cl',
+    'sensi_j_cl',
+    'incap_j_cl',
+    'alea_n_cl',
+    'sensi_n_cl',
+    'incap_n_cl',
+    'vulnj_note',
+    'vulnn_note',
+    'st_areasha',
+    'st_lengths'
+]
+SNS_COLS = [ # num. variables in the LCZ table, and shares of every sensitivity category
+    'hre',
+    'are',
+    'bur',
+    'ror',
+    'bsr',
+    'war',
+    'ver',
+    'vhr',
+    'Faible Sensibilité',
+    'Forte Sensibilité',
+    'Sensibilité Faible à Nulle',
+    'Sensibilité Moyenne',
+    'Sensibilité Variable',
+    'Très Forte Sensibilité'
+]
+
+### 2. FUNCTION DEFINITIONS
+def map_lcz_to_sensibilite(lcz: str) -> str:
+    '''
+    Translates from the LCZ type to the Sensitivity category.
+    '''
+    if lcz in ('1', '2'):
+        return 'Très Forte Sensibilité'
+    elif lcz == '3':
+        return 'Forte Sensibilité'
+    elif lcz in ('4', '5'):
+        return 'Sensibilité Moyenne'
+    elif lcz in ('6', '9'):
+        return 'Faible Sensibilité'
+    elif lcz in ('7', '8', '10', 'E'):
+        return 'Sensibilité Variable'
+    else: # letters except E
+        return 'Sensibilité Faible à Nulle'
+
+def map_sensibilte_to_int(sns: str) -> int:
+    '''
+    Transforms from Sensibility category to a numeric scale.
+    '''
+    if sns == 'Très Forte Sensibilité':
+        return 5
+    elif sns == 'Forte Sensibilité':
+        return 4
+    elif sns == 'Sensibilité Moyenne':
+        return 3
+    elif sns == 'Faible Sensibilité':
+        return 2
+    elif sns == 'Sensibilité Variable':
+        return 1
+    else: # 'Sensibilité Faible à Nulle'
+        return 0
@@ -0,0 +1,189 @@
+### 1. MODULE IMPORTS
+import os
+import sys
+import json
+import time
+import atexit
+import platform
+import resource
+import tracemalloc
+from pathlib import Path
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from common.download_cache import write_atomic
+
+### 2. DEFINITIONS
+repo_dir = Path(__file__).parents[1]
+MB = 2 ** 20
+RUSAGE_SCALE = 1 if sys.platform == 'darwin' else 1024 # ru_maxrss is in bytes on macOS, in kB elsewhere
+current_report = None # the RunReport of the running script, if it has one
+
+### 3. FUNCTION DEFINITIONS
+def reset_peak_rss() -> bool:
+    '''
+    Resets the peak resident set size of the process to its current size, so
+    that the peak of every stage is measured on its own. Only possible on
+    Linux: returns False elsewhere.
+    '''
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+def peak_rss() -> int:
+    '''
+    Returns the peak resident set size of the process, in bytes: since the
+    last reset_peak_rss on Linux, since the start of the process elsewhere.
+    '''
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RUSAGE_SCALE
+
+def children_peak_rss() -> int:
+    '''
+    Returns the peak resident set size of the largest finished child process
+    (the workers of the overlays), in bytes; 0 if there was none.
+    '''
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * RUSAGE_SCALE
+
+def unit_timings() -> bool:
+    '''
+    Returns True if the script was run with --unit-timings: the overlays then
+    time every unit, to list the slowest ones (see common.overlay).
+    '''
+
+    return current_report is not None and current_report.unit_timings
+
+def record(key: str, value: Any):
+    '''
+    Adds value to the list key of the metrics of the current stage of the run
+    report, e.g. the counters of every overlay. Does nothing if the script has
+    no run report, or outside of a stage, so shared code can always call it.
+    '''
+    if current_report is not None and current_report.current is not None:
+        current_report.current['metrics'].setdefault(key, []).append(value)
+
+### 4. CLASS DEFINITIONS
+class RunReport:
+    '''
+    Records, for every stage of a script (load, reproject, overlay, aggregate,
+    export, figures...), its wall time, CPU time (of the script and of its
+    finished worker processes), peak resident memory and, with trace_memory,
+    the peak of the memory allocated by Python and the lines that allocated
+    the most. A stage lasts from its call to stage until the next call (or
+    finish), so a script marks its phases without being indented. Shared code
+    adds its own metrics to the current stage with record, e.g. the counters
+    of every overlay, with its slowest units if unit_timings.
+
+    The report is written as json to output_dir / <script>_run_report.json by
+    finish, or when the script stops early (status 'incomplete'), so the
+    report of a failed run shows the stage it stopped in.
+    '''
+    def __init__(
+        self,
+        script: str,
+        output_dir: Path,
+        trace_memory: bool = False,
+        unit_timings: bool = False,
+        top: int = 10
+    ):
+        self.script = Path(script).resolve()
+        self.path = Path(output_dir) / f'{self.script.stem}_run_report.json'
+        self.trace_memory = trace_memory
+        self.unit_timings = unit_timings
+        self.top = top
+        self.started = datetime.now()
+        self.stages = []
+        self.current: Optional[Dict] = None
+        self.finished = False
+        global current_report
+        current_report = self
+        if trace_memory: # slows down allocations, so only on request
+            tracemalloc.start()
+        atexit.register(self.finish, status = 'incomplete') # does nothing if finish already ran
+
+    def stage(self, name: str):
+        '''
+        Ends the current stage, if any, and starts a new one.
+        '''
+        self.end_stage()
+        reset_peak_rss()
+        snapshot = None
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            snapshot = tracemalloc.take_snapshot()
+        self.current = {'name': name, 'wall': time.perf_counter(), 'times': os.times(), 'snapshot': snapshot, 'metrics': {}}
+
+    def end_stage(self):
+        '''
+        Records the current stage, if any, and prints a one-line summary.
+        '''
+        if self.current is None:
+            return
+
+        wall = time.perf_counter() - self.current['wall']
+        start, end = self.current['times'], os.times()
+        record = {
+            'stage': self.current['name'],
+            'wall_seconds': round(wall, 3),
+            'cpu_seconds': round((end.user + end.system) - (start.user + start.system), 3),
+            'children_cpu_seconds': round((end.children_user + end.children_system) - (start.children_user + start.children_system), 3),
+            'peak_rss_mb': round(peak_rss() / MB, 1),
+            'children_peak_rss_mb': round(children_peak_rss() / MB, 1)
+        }
+        if self.trace_memory:
+            record['traced_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / MB, 1)
+            snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+            stats = [stat for stat in snapshot.compare_to(self.current['snapshot'], 'lineno') if stat.size_diff > 0]
+            record['top_allocators'] = [ # lines holding the most new memory at the end of the stage
+                {'line': str(stat.traceback), 'size_diff_mb': round(stat.size_diff / MB, 3), 'count_diff': stat.count_diff}
+                for stat in sorted(stats, key = lambda stat: stat.size_diff, reverse = True)[:self.top]
+            ]
+        record |= self.current['metrics']
+
+        self.stages.append(record)
+        self.current = None
+        print(f'[{record["stage"]}] {wall:.1f}s, {record["cpu_seconds"] + record["children_cpu_seconds"]:.1f}s CPU, peak {record["peak_rss_mb"]:.0f} MB')
+
+    def finish(self, status: str = 'completed'):
+        '''
+        Ends the current stage and writes the report.
+        '''
+        if self.finished:
+            return
+
+        self.end_stage()
+        self.finished = True
+        try:
+            script = str(self.script.relative_to(repo_dir))
+        except ValueError:
+            script = str(self.script)
+
+        report = {
+            'script': script,
+            'argv': sys.argv[1:],
+            'status': status,
+            'started': self.started.isoformat(timespec = 'seconds'),
+            'finished': datetime.now().isoformat(timespec = 'seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'trace_memory': self.trace_memory,
+            'unit_timings': self.unit_timings,
+            'wall_seconds': round(sum(record['wall_seconds'] for record in self.stages), 3),
+            'cpu_seconds': round(sum(record['cpu_seconds'] + record['children_cpu_seconds'] for record in self.stages), 3),
+            'peak_rss_mb': max((record['peak_rss_mb'] for record in self.stages), default = round(peak_rss() / MB, 1)),
+            'stages': self.stages
+        }
+        write_atomic(self.path, json.dumps(report, indent = 1))
+        if self.trace_memory:
+            tracemalloc.stop()
@@ -0,0 +1,195 @@
+### 1. MODULE IMPORTS
+import json
+import shapely
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from typing import Dict, List, NamedTuple, Optional
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from common.geoparquet import write_geoparquet
+
+### 2. DEFINITIONS
+class Metrics(NamedTuple):
+    '''
+    A csv of results, with one row per unit (or per unit and pivot_cols, like
+    the rent control combinations, which are spread into one column each).
+    The metric columns are renamed to prefix_column.
+    '''
+    path: Path
+    prefix: str
+    pivot_cols: List[str] = []
+
+class Layer(NamedTuple):
+    '''
+    A unit layer loaded for lookups: one row per unit (keys and metrics), and
+    the STRtree of the unit polygons, in EPSG:4326.
+    '''
+    name: str
+    table: pd.DataFrame
+    tree: shapely.STRtree
+
+### 3. FUNCTION DEFINITIONS
+def read_metrics(metrics: Metrics, keys: List[str]) -> pd.DataFrame:
+    '''
+    Reads a csv of results, indexed by the unit keys, with one column per
+    metric (and per combination of pivot_cols).
+    '''
+    assert metrics.path.exists(), f'{metrics.path.name} does not exist, run the corresponding script first!'
+    df = pd.read_csv(metrics.path, dtype = {key: str for key in keys})
+    missing = [col for col in keys + metrics.pivot_cols if col not in df.columns]
+    assert not missing, f'{metrics.path.name} has no {", ".join(missing)} column, it was written by an older version of its script: rerun the script that writes it (in {metrics.path.parents[1].name}/code) first!'
+    df = df.set_index(keys + metrics.pivot_cols)
+    if metrics.pivot_cols:
+        df = df.unstack(metrics.pivot_cols)
+        df.columns = ['_'.join(str(level) for level in column) for column in df.columns]
+
+    return df.add_prefix(f'{metrics.prefix}_')
+
+def write_lookup_table(
+    units_path: Path,
+    keys: List[str],
+    metrics: List[Metrics],
+    path: Path
+):
+    '''
+    Joins the polygons of a unit layer with all its metrics, and writes them
+    as a GeoParquet file in EPSG:4326 (the crs of latitudes and longitudes),
+    ready to be loaded by load_layers.
+    '''
+    gdf = gpd.read_file(units_path).to_crs('EPSG:4326').astype({key: str for key in keys})
+    cols = list(keys)
+    for m in metrics:
+        df = read_metrics(m, keys)
+        gdf = gdf.merge(df, how = 'left', left_on = keys, right_index = True)
+        cols += list(df.columns)
+
+    path.parent.mkdir(parents = True, exist_ok = True)
+    write_geoparquet(gdf.loc[:, cols + ['geometry']], path)
+
+def load_layers(paths: Dict[str, Path]) -> List[Layer]:
+    '''
+    Loads the lookup tables written by write_lookup_table, and builds the
+    STRtree of every layer, once: every lookup after that only queries them.
+    '''
+    layers = []
+    for name, path in paths.items():
+        assert path.exists(), f'{path.name} does not exist, run the lookup_tables.py script first!'
+        gdf = gpd.read_parquet(path)
+        layers.append(Layer(name, pd.DataFrame(gdf.drop(columns = 'geometry')).reset_index(drop = True), shapely.STRtree(gdf.geometry.to_numpy())))
+
+    return layers
+
+def locate_points(tree: shapely.STRtree, points: np.ndarray) -> np.ndarray:
+    '''
+    Returns the position, in tree, of the polygon that contains every point,
+    -1 for the points outside all of them. All the points are located at once:
+    the STRtree is queried with the whole batch, and the exact point-in-polygon
+    tests run inside GEOS. A point on a boundary between polygons gets the
+    first one.
+    '''
+    point_idx, geom_idx = tree.query(points, predicate = 'intersects')
+    found, first = np.unique(point_idx, return_index = True)
+    rows = np.full(len(points), -1)
+    rows[found] = geom_idx[first]
+
+    return rows
+
+def locate(
+    layers: List[Layer],
+    lons: np.ndarray,
+    lats: np.ndarray
+) -> List[np.ndarray]:
+    '''
+    Returns, for every layer, the row of the unit that contains every point
+    (lon, lat), -1 for the points outside the layer (see locate_points).
+    '''
+    points = shapely.points(np.asarray(lons, dtype = float), np.asarray(lats, dtype = float))
+
+    return [locate_points(layer.tree, points) for layer in layers]
+
+def attach(layers: List[Layer], rows: List[np.ndarray]) -> pd.DataFrame:
+    '''
+    Returns the keys and metrics of the units found by locate, as one row per
+    point, with the columns of every layer prefixed by its name, and missing
+    values for the points outside a layer.
+    '''
+    dfs = [
+        layer.table.reindex(layer_rows).reset_index(drop = True).add_prefix(f'{layer.name}_') # -1: missing values
+        for layer, layer_rows in zip(layers, rows)
+    ]
+
+    return pd.concat(dfs, axis = 1)
+
+def lookup(
+    layers: List[Layer],
+    lons: np.ndarray,
+    lats: np.ndarray
+) -> pd.DataFrame:
+    '''
+    Returns, for every point (lon, lat), the keys and metrics of the unit that
+    contains it in every layer (see locate and attach).
+    '''
+
+    return attach(layers, locate(layers, lons, lats))
+
+def serve(
+    layers: List[Layer],
+    host: str = '127.0.0.1',
+    port: int = 8080
+):
+    '''
+    Serves lookup over HTTP, until interrupted. Points are given either in
+    the query string, GET /lookup?lon=2.35,2.29&lat=48.85,48.86, or as a json
+    body, POST /lookup {"lon": [...], "lat": [...]} (or {"lon": 2.35, "lat":
+    48.85} for a single point). The answer is a json list with one object per
+    point, with null for missing values; a malformed request gets a 400.
+    '''
+    class Handler(BaseHTTPRequestHandler):
+        def reply(self, status: int, body: str):
+            data = body.encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def answer(self, lons: Optional[List], lats: Optional[List]):
+            if lons is None or lats is None or len(lons) != len(lats):
+                return self.reply(400, json.dumps({'error': 'lon and lat must be given, with as many values each'}))
+            try:
+                self.reply(200, lookup(layers, lons, lats).to_json(orient = 'records'))
+            except (TypeError, ValueError) as e: # values that are not numbers, or null
+                self.reply(400, json.dumps({'error': str(e)}))
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != '/lookup':
+                return self.reply(404, json.dumps({'error': 'not found'}))
+            query = parse_qs(url.query)
+            split = lambda key: [value for values in query[key] for value in values.split(',')] if key in query else None
+            self.answer(split('lon'), split('lat'))
+
+        def do_POST(self):
+            if urlparse(self.path).path != '/lookup':
+                return self.reply(404, json.dumps({'error': 'not found'}))
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            except json.JSONDecodeError as e:
+                return self.reply(400, json.dumps({'error': str(e)}))
+            if not isinstance(body, dict):
+                return self.reply(400, json.dumps({'error': 'the body must be a json object, {"lon": [...], "lat": [...]}'}))
+            as_list = lambda value: [value] if value is not None and not isinstance(value, list) else value # a single point
+            self.answer(as_list(body.get('lon')), as_list(body.get('lat')))
+
+        def log_message(self, *args):
+            pass # one line per request would slow down the server
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f'Serving lookups on http://{host}:{port}/lookup')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
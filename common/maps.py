@@ -0,0 +1,195 @@
+### 1. MODULE IMPORTS
+import json
+import shapely
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from pathlib import Path
+from string import Template
+from typing import Dict, List, Optional
+
+from common.download_cache import write_atomic
+from common.parallel import can_fork, process_pool
+
+### 2. DEFINITIONS
+EARTH_CIRCUMFERENCE = 40_075_016.686 # m, at the equator, as in the web mercator tiles
+TILE_SIZE = 256 # pixels
+RAMPS = { # colour stops of the colormaps, interpolated linearly in the browser
+    'viridis': ['#440154', '#472d7b', '#3b528b', '#2c728e', '#21918c', '#28ae80', '#5ec962', '#addc30', '#fde725'],
+    'cool': ['#00ffff', '#ff00ff']
+}
+NO_DATA_COLOR = '#bbbbbb'
+
+# every page only holds the values of its variable: the geometries are read from
+# the shared <name>_geometries.js file next to it, with a plain script tag, so the
+# maps also open from the file system, without a server
+PAGE = Template('''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>$title</title>
+<link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css">
+<script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+<script src="$payload_file"></script>
+<style>
+html, body, #map {height: 100%; margin: 0;}
+.legend {background: white; padding: 6px 8px; font: 12px sans-serif; border-radius: 4px;}
+.legend .bar {width: 160px; height: 10px; margin: 4px 0;}
+</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+var column = $column, values = $values, ramp = $ramp, vmin = $vmin, vmax = $vmax;
+function rgb(hex) {
+    return [1, 3, 5].map(function (i) { return parseInt(hex.slice(i, i + 2), 16); });
+}
+function color(value) {
+    if (value === null || value === undefined) return '$no_data_color';
+    var t = vmax > vmin ? (value - vmin) / (vmax - vmin) : 0;
+    var x = Math.min(Math.max(t, 0), 1) * (ramp.length - 1), i = Math.min(Math.floor(x), ramp.length - 2);
+    if (ramp.length == 1) return ramp[0];
+    var a = rgb(ramp[i]), b = rgb(ramp[i + 1]), f = x - i;
+    return 'rgb(' + a.map(function (c, k) { return Math.round(c + f * (b[k] - c)); }).join(',') + ')';
+}
+var map = L.map('map', {maxZoom: $max_zoom});
+L.tileLayer('https://tile.openstreetmap.org/{z}/{x}/{y}.png', {
+    maxZoom: $max_zoom,
+    attribution: '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
+}).addTo(map);
+var layer = L.geoJSON(geometries[$payload_name], {
+    style: function (feature) {
+        return {color: '#333333', weight: 1, fillColor: column === null ? '#3388ff' : color(values[feature.id]), fillOpacity: 0.6};
+    },
+    onEachFeature: function (feature, polygon) {
+        var value = column === null ? null : values[feature.id];
+        polygon.bindTooltip(feature.properties.label + (column === null ? '' : '<br>' + column + ': ' + (value === null ? 'no data' : value)));
+    }
+}).addTo(map);
+map.fitBounds(layer.getBounds());
+if (column !== null) {
+    var legend = L.control({position: 'bottomright'});
+    legend.onAdd = function () {
+        var div = L.DomUtil.create('div', 'legend');
+        div.innerHTML = '<b>' + column + '</b><div class="bar" style="background: linear-gradient(to right, ' + ramp.join(', ') + ')"></div>' + vmin + ' &ndash; ' + vmax;
+        return div;
+    };
+    legend.addTo(map);
+}
+</script>
+</body>
+</html>
+''')
+
+### 3. FUNCTION DEFINITIONS
+def pixel_size(zoom: int, latitude: float) -> float:
+    '''
+    Returns the side of a screen pixel on the ground, in metres, at a zoom
+    level of the web map tiles and a latitude.
+    '''
+    return EARTH_CIRCUMFERENCE * np.cos(np.radians(latitude)) / (TILE_SIZE * 2 ** zoom)
+
+def simplified_geometries(
+    gdf: gpd.GeoDataFrame,
+    max_zoom: int,
+    precision: int = 5,
+    crs: str = 'EPSG:2154'
+) -> np.ndarray:
+    '''
+    Returns the geometries of a geotable in EPSG:4326, as drawn on a web map:
+    simplified (in metres, in crs) with a tolerance of one screen pixel at
+    max_zoom, the closest zoom the map allows, and with coordinates rounded to
+    precision decimals (5 decimals of a degree are about a metre).
+
+    Units that tile the area (a valid coverage, like the Codes Postaux) are
+    simplified together, so neighbours keep sharing the same edges, without
+    gaps or slivers between them; other layers (like the overlapping SeLoger
+    Quartiers) are simplified one polygon at a time, keeping every polygon
+    valid.
+    '''
+    xmin, ymin, xmax, ymax = gpd.GeoSeries([shapely.box(*gdf.total_bounds)], crs = gdf.crs).to_crs('EPSG:4326').total_bounds
+    tolerance = pixel_size(max_zoom, (ymin + ymax) / 2)
+    geoms = gdf.geometry.to_crs(crs).to_numpy()
+    if shapely.coverage_is_valid(geoms):
+        geoms = shapely.coverage_simplify(geoms, tolerance)
+    else:
+        geoms = shapely.simplify(geoms, tolerance, preserve_topology = True)
+
+    geoms = gpd.GeoSeries(geoms, crs = crs).to_crs('EPSG:4326').to_numpy()
+
+    return shapely.set_coordinates(geoms.copy(), np.round(shapely.get_coordinates(geoms), precision))
+
+def geometry_payload(
+    gdf: gpd.GeoDataFrame,
+    name: str,
+    max_zoom: int
+) -> str:
+    '''
+    Returns the script that adds the simplified geometries of a geotable to
+    the geometries object of the page, as a GeoJSON feature collection. The
+    features only have their position (id) and the label of their index: the
+    values of every map are kept in the map itself.
+    '''
+    labels = [', '.join(map(str, label)) if isinstance(label, tuple) else str(label) for label in gdf.index.to_flat_index()]
+    features = ','.join(
+        f'{{"type":"Feature","id":{i},"properties":{{"label":{json.dumps(label)}}},"geometry":{geometry}}}'
+        for i, (label, geometry) in enumerate(zip(labels, shapely.to_geojson(simplified_geometries(gdf, max_zoom))))
+    )
+
+    return f'window.geometries = window.geometries || {{}};\ngeometries[{json.dumps(name)}] = {{"type":"FeatureCollection","features":[{features}]}};\n'
+
+def export_maps(
+    gdf_units: gpd.GeoDataFrame,
+    maps: Dict[str, Optional[pd.Series]],
+    figures_dir: Path,
+    name: str,
+    max_zoom: int = 15,
+    cmap: str = 'viridis'
+):
+    '''
+    Writes an interactive map of the units for every entry of maps, to
+    figures_dir / <key>.html: the outline of the units if the entry is None,
+    the units coloured by the values of the series (aligned on the index of
+    gdf_units) otherwise.
+
+    The geometries are simplified once (see simplified_geometries) and written
+    once, to figures_dir / <name>_geometries.js, which all the maps of the
+    units share: every map only adds its values, a few kB. Keep the .js file
+    next to the maps when moving them.
+    '''
+    payload_file = f'{name}_geometries.js'
+    write_atomic(figures_dir / payload_file, geometry_payload(gdf_units, name, max_zoom))
+
+    for key, values in maps.items():
+        column, data, vmin, vmax = None, [], 0, 0
+        if values is not None:
+            values = values.reindex(gdf_units.index).astype(float)
+            column, vmin, vmax = str(values.name), round(values.min(), 4), round(values.max(), 4)
+            data = [None if pd.isna(value) else round(value, 4) for value in values]
+        page = PAGE.substitute(
+            title = key.replace('_', ' ').capitalize(),
+            payload_file = payload_file,
+            payload_name = json.dumps(name),
+            column = json.dumps(column),
+            values = json.dumps(data),
+            ramp = json.dumps(RAMPS[cmap]),
+            vmin = json.dumps(None if pd.isna(vmin) else vmin),
+            vmax = json.dumps(None if pd.isna(vmax) else vmax),
+            max_zoom = max_zoom,
+            no_data_color = NO_DATA_COLOR
+        )
+        write_atomic(figures_dir / f'{key}.html', page)
+
+def export_levels(levels: List[Dict], workers: int = 1):
+    '''
+    Calls export_maps for every unit level, with the keyword arguments in
+    levels. The levels do not share anything, so with workers > 1 they are
+    simplified and written at the same time, by a pool of forked processes.
+    '''
+    if workers > 1 and len(levels) > 1 and can_fork():
+        with process_pool(min(workers, len(levels))) as pool:
+            for future in [pool.submit(export_maps, **level) for level in levels]:
+                future.result() # raises the errors of the workers
+    else:
+        for level in levels:
+            export_maps(**level)
@@ -0,0 +1,81 @@
+### 1. MODULE IMPORTS
+import os
+import shapely
+import hashlib
+import numpy as np
+import geopandas as gpd
+from scipy import sparse
+from pathlib import Path
+
+from common.overlay import overlay_areas
+from common.projection import common_crs
+from common.instrumentation import record
+
+### 2. DEFINITIONS
+cache_dir = Path(__file__).parents[1] / '.cache' / 'overlap_weights'
+
+### 3. FUNCTION DEFINITIONS
+def geometry_hash(gdf: gpd.GeoDataFrame) -> str:
+    '''
+    Returns a content hash of the geometries of a geotable (and of its 
+    coordinate system). Two geotables with the same polygons in the same 
+    order have the same hash, whatever their other columns are.
+    '''
+    h = hashlib.sha256(str(gdf.crs).encode())
+    h.update(np.int64(len(gdf)).tobytes())
+    for wkb in shapely.to_wkb(gdf.geometry.to_numpy()):
+        h.update(wkb)
+
+    return h.hexdigest()
+
+def overlap_matrix(
+    gdf_units: gpd.GeoDataFrame,
+    gdf_source: gpd.GeoDataFrame,
+    use_cache: bool = True,
+    workers: int = 1,
+    progress: bool = True
+) -> sparse.csr_matrix:
+    '''
+    Returns the (#units x #source polygons) sparse matrix with the area of the
+    intersection between every unit and every source polygon. Rows and columns
+    follow the order of gdf_units and gdf_source.
+
+    The matrix is stored on disk, keyed by the content hashes of both layers,
+    so it is only calculated once per pair of geometry versions: a new list of
+    variables, or new values on the same geometries, skip the geometry work.
+    With workers > 1 the overlay is run by a pool of processes; progress shows
+    its progress bar. Layers in
+    different coordinate systems are overlaid in the projected crs of the
+    larger one (see common.projection.common_crs), so the areas are in m².
+    '''
+    gdf_units, gdf_source = common_crs(gdf_units, gdf_source)
+    key = hashlib.sha256(f'{geometry_hash(gdf_units)}-{geometry_hash(gdf_source)}'.encode()).hexdigest()
+    path = cache_dir / f'{key[:32]}.npz'
+    if use_cache and path.exists():
+        record('overlays', {'units': len(gdf_units), 'sources': len(gdf_source), 'cached': True}) # no counters, the geometry work was skipped
+        return sparse.load_npz(path).tocsr()
+
+    df_ov = overlay_areas(gdf_units, gdf_source, workers = workers, progress = progress) # ov: overlay
+    matrix = sparse.csr_matrix(
+        (df_ov.loc[:, 'area'], (df_ov.loc[:, 'unit'], df_ov.loc[:, 'source'])),
+        shape = (len(gdf_units), len(gdf_source))
+    )
+
+    if use_cache: # write to a temporary file first, so a crash never leaves a half-written matrix
+        path.parent.mkdir(parents = True, exist_ok = True)
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp.npz')
+        sparse.save_npz(tmp_path, matrix)
+        os.replace(tmp_path, path)
+
+    return matrix
+
+def normalize_rows(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+    '''
+    Divides every row of the matrix by its sum, so that the weights of every 
+    unit add up to one. Rows that sum to zero (units with no overlap) are left 
+    as zeros.
+    '''
+    row_sums = np.asarray(matrix.sum(axis = 1)).ravel()
+    scale = np.divide(1.0, row_sums, out = np.zeros_like(row_sums), where = row_sums > 0)
+
+    return sparse.diags(scale) @ matrix
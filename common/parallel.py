@@ -0,0 +1,46 @@
+### 1. MODULE IMPORTS
+import numpy as np
+import geopandas as gpd
+import multiprocessing
+from typing import Callable, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+
+### 2. FUNCTION DEFINITIONS
+def can_fork() -> bool:
+    '''
+    Checks if worker processes can be forked. The scripts have no main guard,
+    so with the spawn start method every worker would re-run the whole script.
+    '''
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+def process_pool(
+    workers: int,
+    initializer: Optional[Callable] = None,
+    initargs: tuple = ()
+) -> ProcessPoolExecutor:
+    '''
+    Returns a pool of forked worker processes. Large read-only inputs should be
+    passed through initializer/initargs: with fork they are inherited by the
+    workers, instead of being pickled with every task.
+    '''
+    return ProcessPoolExecutor(
+        max_workers = workers,
+        mp_context = multiprocessing.get_context('fork'),
+        initializer = initializer,
+        initargs = initargs
+    )
+
+def spatial_chunks(
+    geoms: gpd.GeoSeries,
+    n_chunks: int
+) -> List[np.ndarray]:
+    '''
+    Splits the positions of geoms into (at most) n_chunks groups of about the 
+    same size, made of geometries that are close to each other: they are sorted
+    along a Hilbert curve, and the curve is cut in consecutive pieces. Nearby 
+    units touch the same source polygons, so every worker only reads a compact 
+    part of the source layer.
+    '''
+    order = np.argsort(geoms.hilbert_distance().to_numpy(), kind = 'stable')
+    
+    return [chunk for chunk in np.array_split(order, n_chunks) if len(chunk)]
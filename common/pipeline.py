@@ -0,0 +1,254 @@
+### 1. MODULE IMPORTS
+# only the standard library: a run with nothing to do must not pay for importing geopandas
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import subprocess
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+### 2. PATH DEFINITIONS
+root_dir = Path(__file__).parents[1]
+state_path = root_dir / '.cache' / 'pipeline_state.json'
+
+### 3. STAGE DEFINITION
+class Stage(NamedTuple):
+    '''
+    A script of the repository, with the files (or directories) it reads and
+    writes, relative to the root of the repository. The script itself, and the
+    modules of the common package it imports, are inputs of the stage too. An
+    exclusive stage runs a pool of processes of its own: it runs alone, with
+    --workers set to the number of jobs.
+    '''
+    name: str
+    script: str
+    inputs: List[str] = []
+    outputs: List[str] = []
+    args: List[str] = []
+    exclusive: bool = False
+
+### 4. FUNCTION DEFINITIONS
+def common_modules(script: Path) -> Set[Path]:
+    '''
+    Returns the modules of the common package imported by script, directly or
+    through other modules of the package.
+    '''
+    modules, pending = set(), [script]
+    while pending:
+        for name in re.findall(r'^from common\.(\w+) import', pending.pop().read_text(), flags = re.MULTILINE):
+            module = root_dir / 'common' / f'{name}.py'
+            if module not in modules:
+                modules.add(module)
+                pending.append(module)
+
+    return modules
+
+def stage_inputs(stage: Stage) -> List[Path]:
+    '''
+    Returns every input of stage: declared inputs, the script and its common modules.
+    '''
+    script = root_dir / stage.script
+
+    return sorted({root_dir / path for path in stage.inputs} | {script} | common_modules(script))
+
+def files(path: Path) -> List[Path]:
+    '''
+    Returns path if it is a file, or all the files under path if it is a directory.
+    '''
+    if path.is_dir():
+        return sorted(p for p in path.rglob('*') if p.is_file())
+
+    return [path]
+
+def sha256(path: Path) -> str:
+    '''
+    Returns the sha256 of the content of a file.
+    '''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+def fingerprint(paths: List[Path], known: Dict[str, List]) -> Optional[Dict[str, List]]:
+    '''
+    Returns {file: [size, mtime, sha256]} for every file in paths, or None if
+    some path does not exist. Files are only hashed if their size or
+    modification time differ from the ones in known, so a check where nothing
+    changed only costs one stat per file.
+    '''
+    result = {}
+    for path in paths:
+        if not path.exists():
+            return None
+
+        for file in files(path):
+            key = str(file.relative_to(root_dir))
+            stat = file.stat()
+            if key in known and known[key][:2] == [stat.st_size, stat.st_mtime_ns]:
+                result[key] = known[key]
+            else:
+                result[key] = [stat.st_size, stat.st_mtime_ns, sha256(file)]
+
+    return result
+
+def same_content(a: Optional[Dict[str, List]], b: Optional[Dict[str, List]]) -> bool:
+    '''
+    Checks if two fingerprints have the same files, with the same hashes.
+    '''
+    if a is None or b is None:
+        return False
+
+    return {key: value[2] for key, value in a.items()} == {key: value[2] for key, value in b.items()}
+
+def upstream(stages: List[Stage]) -> Dict[str, Set[str]]:
+    '''
+    Returns, for every stage, the names of the stages that write its inputs.
+    An input depends on an output if they are the same path, or if one is
+    inside the other (an output directory).
+    '''
+    def overlaps(a: str, b: str) -> bool:
+        return a == b or a.startswith(b.rstrip('/') + '/') or b.startswith(a.rstrip('/') + '/')
+
+    return {
+        stage.name: {other.name for other in stages if other.name != stage.name and any(overlaps(i, o) for i in stage.inputs for o in other.outputs)}
+        for stage in stages
+    }
+
+def load_state() -> Dict:
+    '''
+    Returns the fingerprints of the last successful run of every stage.
+    '''
+    if not state_path.exists():
+        return {}
+
+    return json.loads(state_path.read_text())
+
+def save_state(state: Dict) -> None:
+    '''
+    Writes the state file through a temporary file, so it is never half written.
+    '''
+    state_path.parent.mkdir(parents = True, exist_ok = True)
+    tmp_path = state_path.with_name(f'.{state_path.name}.{os.getpid()}.tmp')
+    tmp_path.write_text(json.dumps(state, indent = 1))
+    os.replace(tmp_path, state_path)
+
+def run(
+    stages: List[Stage],
+    targets: Optional[List[str]] = None,
+    force: Optional[List[str]] = None,
+    jobs: int = 1,
+    dry_run: bool = False
+) -> bool:
+    '''
+    Runs the stages whose inputs changed since their last successful run (by
+    content hash), or whose outputs are missing or were modified, as well as the
+    stages in force. A stage starts when all the stages it depends on are done,
+    and up to jobs stages run at the same time, each in its own Python process,
+    so independent branches run concurrently on separate cores. Exclusive
+    stages wait for the running stages to finish, and nothing starts next to
+    them, so the machine is never given more than jobs processes. If targets
+    are given, only those stages and the stages they depend on are considered.
+
+    When a stage fails, the stages that depend on it are skipped, while the
+    other branches carry on. Returns True if every stage succeeded.
+    '''
+    names = [stage.name for stage in stages]
+    assert len(set(names)) == len(names), 'Stage names must be unique'
+    deps = upstream(stages)
+
+    selected = set(targets or names)
+    assert selected <= set(names), f'Unknown stages: {sorted(selected - set(names))}'
+    pending = list(selected)
+    while pending: # add everything upstream of the targets
+        for dep in deps[pending.pop()]:
+            if dep not in selected:
+                selected.add(dep)
+                pending.append(dep)
+
+    by_name = {stage.name: stage for stage in stages}
+    state = load_state()
+    fingerprints = {} # inputs of the stages that are running, as they were when they started
+    done, failed, skipped = set(), set(), set()
+    waiting = [name for name in names if name in selected]
+
+    def is_stale(stage: Stage) -> bool:
+        record = state.get(stage.name, {})
+        inputs = fingerprint(stage_inputs(stage), record.get('inputs', {}))
+        outputs = fingerprint([root_dir / path for path in stage.outputs], record.get('outputs', {}))
+        fingerprints[stage.name] = inputs
+        if inputs is not None and outputs is not None and same_content(inputs, record.get('inputs')) and same_content(outputs, record.get('outputs')):
+            state[stage.name] = {'inputs': inputs, 'outputs': outputs} # new modification times, same content: no need to hash again next time
+            return stage.name in (force or [])
+
+        return True
+
+    def execute(stage: Stage) -> int:
+        print(f'[{stage.name}] running {stage.script}', flush = True)
+        start = time.perf_counter()
+        args = stage.args + (['--workers', str(jobs)] if stage.exclusive else [])
+        process = subprocess.run([sys.executable, root_dir / stage.script] + args, cwd = root_dir)
+        print(f'[{stage.name}] {"done" if process.returncode == 0 else "FAILED"} in {time.perf_counter() - start:.1f}s', flush = True)
+
+        return process.returncode
+
+    with ThreadPoolExecutor(max_workers = jobs) as executor:
+        running, would_run = {}, set()
+        while waiting or running:
+            blocked = any(by_name[name].exclusive for name in running.values()) # nothing starts next to an exclusive stage
+            for name in list(waiting):
+                if deps[name] & (failed | skipped):
+                    print(f'[{name}] skipped: an upstream stage failed')
+                    skipped.add(name)
+                    waiting.remove(name)
+                elif not (deps[name] & selected) - done and len(running) < jobs and not blocked:
+                    stage = by_name[name]
+                    if stage.exclusive and running and not dry_run:
+                        blocked = True # wait for the running stages, and start nothing else meanwhile
+                        continue
+                    waiting.remove(name)
+                    if dry_run:
+                        if deps[name] & would_run or is_stale(stage):
+                            print(f'[{name}] would run {stage.script}')
+                            would_run.add(name)
+                        done.add(name)
+                    elif is_stale(stage):
+                        running[executor.submit(execute, stage)] = name
+                        blocked = blocked or stage.exclusive
+                    else:
+                        done.add(name)
+
+            if not running:
+                assert not waiting or any(not (deps[name] & selected) - done for name in waiting), f'Circular dependencies between {waiting}'
+                continue
+
+            finished, _ = wait(running, return_when = FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                stage = by_name[name]
+                if future.result() == 0:
+                    outputs = fingerprint([root_dir / path for path in stage.outputs], {})
+                    if outputs is None:
+                        print(f'[{name}] FAILED: some declared outputs were not written')
+                        failed.add(name)
+                    else:
+                        state[name] = {'inputs': fingerprints[name], 'outputs': outputs}
+                        done.add(name)
+                else:
+                    failed.add(name)
+                save_state(state) # after every stage, so an interrupted run keeps what was done
+
+    if not dry_run:
+        save_state(state)
+
+    if failed:
+        print('Failed:', ', '.join(sorted(failed)))
+    if skipped:
+        print('Skipped:', ', '.join(sorted(skipped)))
+
+    return not (failed or skipped)
@@ -0,0 +1,59 @@
+### 1. MODULE IMPORTS
+import shapely
+import hashlib
+import geopandas as gpd
+from pathlib import Path
+from typing import Tuple
+
+from common.geoparquet import write_geoparquet
+
+### 2. DEFINITIONS
+cache_dir = Path(__file__).parents[1] / '.cache' / 'projected'
+METRIC_CRS = 'EPSG:2154' # Lambert 93, the projected crs of the French layers: areas in m²
+
+### 3. FUNCTION DEFINITIONS
+def read_projected(path: Path, crs: str = METRIC_CRS) -> gpd.GeoDataFrame:
+    '''
+    Reads a geotable file (e.g. the GeoJSON of a unit level) in crs. The
+    reprojected geotable is stored on disk as GeoParquet, keyed by the content
+    of the file and by crs, so every version of a layer is only parsed and
+    reprojected once; the next runs read the GeoParquet file, which is much
+    faster than parsing GeoJSON.
+    '''
+    h = hashlib.sha256(str(crs).encode())
+    h.update(Path(path).read_bytes())
+    cache_path = cache_dir / f'{Path(path).stem}_{str(crs).replace(":", "").lower()}_{h.hexdigest()[:16]}.parquet'
+    if not cache_path.exists():
+        cache_path.parent.mkdir(parents = True, exist_ok = True)
+        write_geoparquet(gpd.read_file(path), cache_path, crs = crs)
+
+    # always read back from the cache, so the first run and the next ones see the
+    # very same geometries (and the overlap matrices keep their cache keys)
+    return gpd.read_parquet(cache_path)
+
+def vertex_count(gdf: gpd.GeoDataFrame) -> int:
+    '''
+    Returns the number of vertices of the geometries of a geotable, the cost
+    of reprojecting it.
+    '''
+
+    return int(shapely.get_num_coordinates(gdf.geometry.to_numpy()).sum())
+
+def common_crs(
+    gdf_a: gpd.GeoDataFrame,
+    gdf_b: gpd.GeoDataFrame
+) -> Tuple[gpd.GeoDataFrame, gpd.GeoDataFrame]:
+    '''
+    Returns both geotables in the same projected crs, so the areas of their
+    intersections are in m². Only the smaller layer (in vertices) is
+    reprojected, to the crs of the larger one; if the larger one is not
+    projected (e.g. in degrees, EPSG:4326), both go to METRIC_CRS.
+    '''
+    if gdf_a.crs == gdf_b.crs and gdf_a.crs.is_projected:
+        return gdf_a, gdf_b
+
+    large, small = (gdf_a, gdf_b) if vertex_count(gdf_a) >= vertex_count(gdf_b) else (gdf_b, gdf_a)
+    crs = large.crs if large.crs.is_projected else METRIC_CRS
+    gdf_a, gdf_b = [gdf if gdf.crs == crs else gdf.to_crs(crs) for gdf in (gdf_a, gdf_b)]
+
+    return gdf_a, gdf_b
@@ -0,0 +1,136 @@
+### 1. MODULE IMPORTS
+import os
+import shapely
+import hashlib
+import numpy as np
+import geopandas as gpd
+from scipy import sparse
+from pathlib import Path
+from typing import NamedTuple, Tuple
+
+from common.overlap_weights import geometry_hash
+
+### 2. DEFINITIONS
+cache_dir = Path(__file__).parents[1] / '.cache' / 'rasters'
+
+class RasterSpec(NamedTuple):
+    '''
+    A grid of square pixels of side resolution (in the units of the crs,
+    metres in Lambert 93), with its top left corner at (xmin, ymax).
+    '''
+    xmin: float
+    ymax: float
+    resolution: float
+    width: int
+    height: int
+
+### 3. FUNCTION DEFINITIONS
+def raster_spec(bounds: Tuple[float], resolution: float) -> RasterSpec:
+    '''
+    Returns the grid of pixels of side resolution that covers bounds = (xmin,
+    ymin, xmax, ymax), aligned on multiples of the resolution.
+    '''
+    xmin, ymin, xmax, ymax = bounds
+    xmin, ymin = np.floor(xmin / resolution) * resolution, np.floor(ymin / resolution) * resolution
+    xmax, ymax = np.ceil(xmax / resolution) * resolution, np.ceil(ymax / resolution) * resolution
+
+    return RasterSpec(float(xmin), float(ymax), resolution, int(round((xmax - xmin) / resolution)), int(round((ymax - ymin) / resolution)))
+
+def pixel_windows(geoms: np.ndarray, spec: RasterSpec) -> np.ndarray:
+    '''
+    Returns the (#polygons x 4) array with the first and past-the-end
+    columns and rows of the pixels whose centre is inside the bounding box of
+    every polygon.
+    '''
+    res = spec.resolution
+    bounds = shapely.bounds(geoms)
+    col_starts = np.clip(np.ceil((bounds[:, 0] - spec.xmin) / res - 0.5), 0, spec.width)
+    col_ends = np.clip(np.floor((bounds[:, 2] - spec.xmin) / res - 0.5) + 1, 0, spec.width)
+    row_starts = np.clip(np.ceil((spec.ymax - bounds[:, 3]) / res - 0.5), 0, spec.height)
+    row_ends = np.clip(np.floor((spec.ymax - bounds[:, 1]) / res - 0.5) + 1, 0, spec.height)
+
+    return np.column_stack([col_starts, col_ends, row_starts, row_ends]).astype(np.int64)
+
+def inside_pixels(geom: shapely.Geometry, spec: RasterSpec, cs: int, ce: int, rs: int, re: int) -> np.ndarray:
+    '''
+    Returns the boolean mask of the pixels of the window (rows rs to re,
+    columns cs to ce) whose centre is in the polygon, with a vectorized
+    point-in-polygon test.
+    '''
+    xs = spec.xmin + (np.arange(cs, ce) + 0.5) * spec.resolution
+    ys = spec.ymax - (np.arange(rs, re) + 0.5) * spec.resolution
+    shapely.prepare(geom)
+
+    return shapely.intersects_xy(geom, xs[np.newaxis, :], ys[:, np.newaxis])
+
+def rasterize(geoms: np.ndarray, spec: RasterSpec, path: Path):
+    '''
+    Writes the (height x width) int32 raster with, in every pixel, the
+    position of the polygon that contains its centre (-1 if none) as a .npy
+    file, which can be memory-mapped. Every polygon is only tested against
+    the pixel centres inside its bounding box, and written straight to the
+    file: the raster never has to fit in memory. A pixel holds one polygon
+    (the last one that contains it), so only layers without overlaps, like
+    the IMUs and the LCZs, should be rasterized.
+    '''
+    tmp_path = path.with_suffix(f'.{os.getpid()}.tmp.npy')
+    raster = np.lib.format.open_memmap(tmp_path, mode = 'w+', dtype = np.int32, shape = (spec.height, spec.width))
+    raster[:] = -1
+    for i, (geom, (cs, ce, rs, re)) in enumerate(zip(geoms, pixel_windows(geoms, spec))):
+        if cs >= ce or rs >= re: # no pixel centre in the bounding box
+            continue
+        raster[rs:re, cs:ce][inside_pixels(geom, spec, cs, ce, rs, re)] = i
+    raster.flush()
+    del raster
+    os.replace(tmp_path, path)
+
+def cached_raster(
+    gdf: gpd.GeoDataFrame,
+    spec: RasterSpec,
+    use_cache: bool = True
+) -> np.ndarray:
+    '''
+    Returns the raster of the polygons of a geotable (see rasterize), memory-
+    mapped, read only. It is stored on disk, keyed by the content hash of the
+    geometries and by the grid, so every layer is only rasterized once per
+    version of its geometries and resolution.
+    '''
+    key = hashlib.sha256(f'{geometry_hash(gdf)}-{tuple(spec)}'.encode()).hexdigest()
+    path = cache_dir / f'{key[:32]}.npy'
+    if not (use_cache and path.exists()):
+        path.parent.mkdir(parents = True, exist_ok = True)
+        rasterize(gdf.geometry.to_numpy(), spec, path)
+
+    return np.load(path, mmap_mode = 'r')
+
+def pixel_overlap_matrix(
+    unit_geoms: np.ndarray,
+    source_raster: np.ndarray,
+    n_sources: int,
+    spec: RasterSpec
+) -> sparse.csr_matrix:
+    '''
+    Returns the (#units x #source polygons) sparse matrix with the area of the
+    pixels that fall in every unit and every source polygon: the raster
+    counterpart of common.overlap_weights.overlap_matrix, which can go through
+    the same interpolate and weighted_statistics kernels. The units are not
+    rasterized: every unit tests the pixel centres inside its bounding box
+    and reads their source polygons, so units may overlap (like the SeLoger
+    Quartiers) and every unit keeps all of its pixels.
+    '''
+    rows, cols, counts = [], [], []
+    for i, (geom, (cs, ce, rs, re)) in enumerate(zip(unit_geoms, pixel_windows(unit_geoms, spec))):
+        if cs >= ce or rs >= re: # no pixel centre in the bounding box
+            continue
+        sources = np.asarray(source_raster[rs:re, cs:ce])[inside_pixels(geom, spec, cs, ce, rs, re)]
+        sources, n_pixels = np.unique(sources[sources >= 0], return_counts = True)
+        rows.append(np.full(len(sources), i))
+        cols.append(sources)
+        counts.append(n_pixels)
+    if not rows:
+        return sparse.csr_matrix((len(unit_geoms), n_sources))
+
+    return sparse.csr_matrix(
+        (np.concatenate(counts) * float(spec.resolution) ** 2, (np.concatenate(rows), np.concatenate(cols))),
+        shape = (len(unit_geoms), n_sources)
+    )
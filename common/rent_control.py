@@ -0,0 +1,78 @@
+### 1. MODULE IMPORTS
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+
+### 2. FUNCTION DEFINITIONS
+def fill_periods(
+    df: pd.DataFrame,
+    periods: Dict[str, List[str]]
+) -> pd.DataFrame:
+    '''
+    Returns the rent control table with one set of rows per city for every 
+    period of any city: a city keeps the values of its last publication until
+    it publishes new ones. Periods before the first publication of a city are
+    left out for that city.
+    '''
+    all_periods = sorted({period for city_periods in periods.values() for period in city_periods})
+    df_pr = pd.DataFrame( # pr: periods
+        data = [
+            (city, period, max(p for p in city_periods if p <= period))
+            for city, city_periods in periods.items()
+            for period in all_periods 
+            if min(city_periods) <= period
+        ],
+        columns = ['city', 'period', 'published_period']
+    )
+
+    return (
+        df_pr
+        .merge(df.rename(columns = {'period': 'published_period'}), how = 'inner', on = ['city', 'published_period'])
+        .drop(columns = 'published_period')
+    )
+
+def reference_tensor(
+    df: pd.DataFrame,
+    coords: Dict[str, pd.Index],
+    value_cols: List[str]
+) -> np.ndarray:
+    '''
+    Returns the value_cols of the long table df as a dense tensor, with one 
+    axis per column in coords (in that order, labelled by its index) and a last
+    axis for the value_cols. Combinations without a row are missing values,
+    rows with labels outside of coords are left out.
+    '''
+    positions = np.stack([coord.get_indexer(df.loc[:, col]) for col, coord in coords.items()])
+    known = (positions >= 0).all(axis = 0)
+
+    tensor = np.full([len(coord) for coord in coords.values()] + [len(value_cols)], np.nan)
+    tensor[tuple(positions[:, known])] = df.loc[known, value_cols].to_numpy(dtype = np.float64)
+
+    return tensor
+
+def tensor_to_frame(
+    tensor: np.ndarray,
+    coords: Dict[str, pd.Index],
+    value_cols: List[str]
+) -> pd.DataFrame:
+    '''
+    Inverse of reference_tensor: returns a long table with one column per 
+    coordinate (or per level, for MultiIndex coordinates) and the value_cols,
+    with the rows in the order of the tensor (last coordinate changing fastest).
+    '''
+    positions = np.unravel_index(np.arange(tensor[..., 0].size), tensor.shape[:-1])
+
+    columns = {}
+    for (col, coord), position in zip(coords.items(), positions):
+        labels = coord.take(position)
+        if isinstance(labels, pd.MultiIndex):
+            for level in labels.names:
+                columns[level] = labels.get_level_values(level)
+        else:
+            columns[col] = labels
+
+    values = tensor.reshape(-1, len(value_cols))
+    for i, col in enumerate(value_cols):
+        columns[col] = values[:, i]
+
+    return pd.DataFrame(data = columns)
@@ -0,0 +1,170 @@
+### 1. MODULE IMPORTS
+import os
+import shapely
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from pathlib import Path
+from typing import List, Tuple
+
+from common.lookup import locate_points
+from common.overlap_weights import overlap_matrix
+
+### 2. FUNCTION DEFINITIONS
+def grid_cells(
+    bounds: Tuple[float],
+    cell_size: float,
+    crs: str = 'EPSG:2154'
+) -> gpd.GeoDataFrame:
+    '''
+    Returns the square cells of side cell_size (in metres) that cover bounds =
+    (xmin, ymin, xmax, ymax), with their row and col. The grid starts at the
+    origin of the crs, so grids of the same cell size always line up, and
+    every cell of a grid factor times coarser is a whole block of factor x
+    factor cells (see coarsen).
+    '''
+    xmin, ymin, xmax, ymax = bounds
+    rows = np.arange(np.floor(ymin / cell_size), np.ceil(ymax / cell_size), dtype = np.int64)
+    cols = np.arange(np.floor(xmin / cell_size), np.ceil(xmax / cell_size), dtype = np.int64)
+    row, col = (a.ravel() for a in np.meshgrid(rows, cols, indexing = 'ij'))
+
+    return gpd.GeoDataFrame(
+        data = {'row': row, 'col': col},
+        geometry = shapely.box(col * cell_size, row * cell_size, (col + 1) * cell_size, (row + 1) * cell_size),
+        crs = crs
+    )
+
+def cell_frame(
+    gdf_cells: gpd.GeoDataFrame,
+    prefix: str,
+    value_cols: List[str],
+    sums: np.ndarray,
+    areas: np.ndarray
+) -> pd.DataFrame:
+    '''
+    Returns the (#cells x #value_cols) sums and areas as the columns
+    {prefix}_{col}_sum and {prefix}_{col}_area, indexed by (row, col), only
+    for the cells covered by the layer. The values are stored in single
+    precision: it is plenty for areas of a few hundred square metres, and
+    halves the size of the grid.
+    '''
+    data = {}
+    for i, col in enumerate(value_cols):
+        data[f'{prefix}_{col}_sum'] = sums[:, i]
+        data[f'{prefix}_{col}_area'] = areas[:, i]
+    covered = (areas > 0).any(axis = 1)
+    df = pd.DataFrame(data = data, index = pd.MultiIndex.from_arrays([gdf_cells.loc[:, 'row'], gdf_cells.loc[:, 'col']]))
+
+    return df.loc[covered].astype(np.float32)
+
+def layer_sums(
+    gdf_cells: gpd.GeoDataFrame,
+    gdf_source: gpd.GeoDataFrame,
+    prefix: str,
+    value_cols: List[str],
+    workers: int = 1
+) -> pd.DataFrame:
+    '''
+    Overlays a source layer onto the grid cells, once, and returns, for every
+    cell it covers, the area-weighted sum of every value_col (value x area of
+    the intersection) and the area over which the value is known (see
+    cell_frame). Missing values are left out of both, like in
+    interpolate_tensor. The overlap matrix is cached like any other (see
+    common.overlap_weights).
+    '''
+    matrix = overlap_matrix(gdf_cells, gdf_source, workers = workers)
+    values = gdf_source.loc[:, value_cols].to_numpy(dtype = np.float64)
+    known = ~np.isnan(values)
+
+    return cell_frame(gdf_cells, prefix, value_cols, matrix @ np.where(known, values, 0.0), matrix @ known.astype(np.float64))
+
+def merge_layers(
+    dfs: List[pd.DataFrame],
+    cell_size: float,
+    crs: str = 'EPSG:2154'
+) -> pd.DataFrame:
+    '''
+    Puts the cell frames of all the layers side by side, with one row per cell
+    covered by any layer (zero sums and areas where a layer is absent), and
+    keeps the cell size and crs in the attrs of the grid.
+    '''
+    df_grid = pd.concat(dfs, axis = 1).fillna(0).sort_index().rename_axis(['row', 'col']).reset_index()
+    df_grid.attrs = {'cell_size': cell_size, 'crs': crs}
+
+    return df_grid
+
+def write_grid(df_grid: pd.DataFrame, path: Path):
+    '''
+    Writes the grid as Parquet, with its attrs (cell size and crs). The file
+    is written to a temporary path first, so readers never see a half-written
+    file.
+    '''
+    path.parent.mkdir(parents = True, exist_ok = True)
+    tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    df_grid.to_parquet(tmp_path, index = False)
+    os.replace(tmp_path, path)
+
+def read_grid(path: Path) -> pd.DataFrame:
+    '''
+    Reads the grid written by write_grid, with its sums and areas in double
+    precision, so that adding up many cells does not lose precision.
+    '''
+    assert path.exists(), f'{path.name} does not exist, run paris/risk_grid/code/risk_grid.py first!'
+    df_grid = pd.read_parquet(path)
+    attrs = df_grid.attrs
+    df_grid = pd.concat([df_grid.loc[:, ['row', 'col']], df_grid.drop(columns = ['row', 'col']).astype(np.float64)], axis = 1)
+    df_grid.attrs = attrs
+
+    return df_grid
+
+def coarsen(df_grid: pd.DataFrame, factor: int) -> pd.DataFrame:
+    '''
+    Returns the grid with cells factor times larger: the sums and areas of the
+    factor x factor blocks of cells are added up, which is exact.
+    '''
+    df_coarse = (
+        df_grid
+        .assign(row = df_grid.loc[:, 'row'] // factor, col = df_grid.loc[:, 'col'] // factor)
+        .groupby(['row', 'col'], as_index = False)
+        .sum()
+    )
+    df_coarse.attrs = df_grid.attrs | {'cell_size': df_grid.attrs['cell_size'] * factor}
+
+    return df_coarse
+
+def aggregate(df_grid: pd.DataFrame, gdf_zones: gpd.GeoDataFrame) -> pd.DataFrame:
+    '''
+    Returns the sums and areas of every zone (any polygons, e.g. IRIS or sales
+    territories), indexed like gdf_zones: every cell is given to the zone that
+    contains its centre, and the sums and areas of its cells are added up. No
+    geometry is intersected, so it takes a fraction of a second.
+
+    Only the cells that cross the boundary of a zone are given to the wrong
+    zone (in part), so the error grows with the cell size relative to the
+    zone: see the README for the accuracy at every resolution. Zones with no
+    cell centre inside (smaller than a cell) get missing values.
+    '''
+    cell_size = df_grid.attrs['cell_size']
+    zone_geoms = gdf_zones.to_crs(df_grid.attrs['crs']).geometry.to_numpy()
+    xs = (df_grid.loc[:, 'col'].to_numpy() + 0.5) * cell_size
+    ys = (df_grid.loc[:, 'row'].to_numpy() + 0.5) * cell_size
+    zones = locate_points(shapely.STRtree(zone_geoms), shapely.points(xs, ys))
+
+    inside = zones >= 0
+    df_sums = df_grid.loc[inside].drop(columns = ['row', 'col']).groupby(zones[inside]).sum()
+
+    return df_sums.reindex(range(len(gdf_zones))).set_axis(gdf_zones.index)
+
+def averages(df_sums: pd.DataFrame) -> pd.DataFrame:
+    '''
+    Returns the area-weighted average of every metric, {prefix}_{col}_sum
+    divided by {prefix}_{col}_area, as the column {prefix}_{col}; missing
+    where the metric is not known anywhere in the zone.
+    '''
+    metrics = [col[:-len('_sum')] for col in df_sums.columns if col.endswith('_sum')]
+    sums = df_sums.loc[:, [f'{metric}_sum' for metric in metrics]].to_numpy()
+    areas = df_sums.loc[:, [f'{metric}_area' for metric in metrics]].to_numpy()
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        values = np.where(areas > 0, sums / areas, np.nan)
+
+    return pd.DataFrame(data = values, index = df_sums.index, columns = metrics)
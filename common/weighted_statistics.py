@@ -0,0 +1,101 @@
+### 1. MODULE IMPORTS
+import numpy as np
+import pandas as pd
+from typing import Tuple
+
+### 2. CONSTANTS
+CUTOFFS = (0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+
+### 3. FUNCTION DEFINITIONS
+def first_at_or_above(
+    cumsum: np.ndarray,
+    cutoff: float,
+    starts: np.ndarray,
+    ends: np.ndarray
+) -> np.ndarray:
+    '''
+    Returns, for every segment [start, end), the position of the first row 
+    whose cumulative weight is at least cutoff (or the last row of the segment,
+    if none is).
+    '''
+    positions = np.where(cumsum >= cutoff, np.arange(len(cumsum)), len(cumsum))
+
+    return np.minimum(np.minimum.reduceat(positions, starts), ends - 1)
+
+def weighted_statistics(
+    units: np.ndarray,
+    values: np.ndarray,
+    weights: np.ndarray,
+    n_units: int,
+    delta_reference: str = 'mode',
+    cutoffs: Tuple[float] = CUTOFFS
+) -> pd.DataFrame:
+    '''
+    Returns the statistics of the weighted distribution of values for every
+    unit, given a long table of (unit, value, weight) rows, where units are 
+    integer positions from 0 to n_units - 1. Only rows with positive weight are
+    used, and the weights of each unit are normalized to add up to one.
+
+    The statistics are: the weighted mean, median and mode; the weighted 
+    standard deviation (as in https://www.itl.nist.gov/div898/software/dataplot/refman2/ch2/weightsd.pdf);
+    and the mean, median, mode and cutoff quantiles of delta, which is the 
+    value minus the mode (or the mean) of the unit, as set by delta_reference.
+    Quantiles are taken as the first value whose cumulative weight, rounded to
+    5 decimals, reaches the cutoff. Ties in the mode go to the lowest value.
+
+    Everything is calculated for all units at once: rows are sorted by (unit,
+    value) with a single lexsort, and every statistic is a segment reduction.
+    Units without rows get missing values.
+    '''
+    assert delta_reference in ('mode', 'mean'), 'delta_reference must be mode or mean'
+
+    keep = weights > 0
+    order = np.lexsort((values[keep], units[keep]))
+    units = units[keep][order]
+    values = values[keep][order].astype(np.float64)
+    weights = weights[keep][order].astype(np.float64)
+
+    # segments: consecutive rows of the same unit
+    present, starts = np.unique(units, return_index = True)
+    ends = np.append(starts[1:], len(units))
+    counts = ends - starts
+
+    weights = weights / np.repeat(np.add.reduceat(weights, starts), counts)
+    cumsum = pd.Series(weights).groupby(units).cumsum().round(5).to_numpy()
+
+    df_st = pd.DataFrame(index = present) # st: statistics
+    mean = np.add.reduceat(weights * values, starts)
+    median_position = first_at_or_above(cumsum, 0.5, starts, ends)
+    df_st.loc[:, 'mean'] = mean
+    df_st.loc[:, 'median'] = values[median_position]
+
+    # mode: sum the weights of equal values (consecutive rows, since they are
+    # sorted), then take the first group with the maximum weight of each unit
+    new_group = np.ones(len(units), dtype = bool)
+    new_group[1:] = (units[1:] != units[:-1]) | (values[1:] != values[:-1])
+    group_starts = np.flatnonzero(new_group)
+    group_weights = np.add.reduceat(weights, group_starts)
+    unit_group_starts = np.searchsorted(group_starts, starts)
+    groups_per_unit = np.diff(np.append(unit_group_starts, len(group_starts)))
+    is_max = group_weights == np.repeat(np.maximum.reduceat(group_weights, unit_group_starts), groups_per_unit)
+    mode_group = np.minimum.reduceat(np.where(is_max, np.arange(len(group_starts)), len(group_starts)), unit_group_starts)
+    mode = values[group_starts[mode_group]]
+    df_st.loc[:, 'mode'] = mode
+
+    # weighted standard deviation
+    numerator = np.add.reduceat(weights * (values - np.repeat(mean, counts)) ** 2, starts)
+    denominator = (counts - 1) * np.add.reduceat(weights, starts) / counts
+    with np.errstate(divide = 'ignore', invalid = 'ignore'): # single-row units have no deviation: missing value
+        df_st.loc[:, 'std'] = np.where(denominator > 0, numerator / denominator, np.nan) ** 0.5
+
+    # same statistics, on the difference with respect to the reference
+    reference = mode if delta_reference == 'mode' else mean
+    delta = values - np.repeat(reference, counts)
+    df_st.loc[:, 'mean_delta'] = np.add.reduceat(weights * delta, starts)
+    df_st.loc[:, 'median_delta'] = delta[median_position]
+    df_st.loc[:, 'mode_delta'] = mode - reference
+
+    for cutoff in cutoffs:
+        df_st.loc[:, f'{cutoff}_delta'] = delta[first_at_or_above(cumsum, cutoff, starts, ends)]
+
+    return df_st.reindex(range(n_units))
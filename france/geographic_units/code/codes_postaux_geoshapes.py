@@ -0,0 +1,42 @@
+### 1. MODULE IMPORTS
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import parse_args
+from common.instrumentation import RunReport
+from common.download_cache import download
+from common.codes_postaux import build_codes_postaux
+
+### 2. PATH DEFINITIONS
+code_dir = Path(__file__).parent
+data_dir = code_dir.parent / 'data'
+
+args = parse_args() # e.g. --workers 8 to build 8 departments at a time
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory) # stage timings and memory, written to data/codes_postaux_geoshapes_run_report.json
+
+### 3. DONWLOADS
+run.stage('download')
+## IRIS geoshapes
+# 7z url from https://geoservices.ign.fr/irisge
+iris_7z_url = 'https://data.geopf.fr/telechargement/download/IRIS-GE/IRIS-GE_3-0__SHP_LAMB93_FXX_2024-01-01/IRIS-GE_3-0__SHP_LAMB93_FXX_2024-01-01.7z'
+print('Retrieving the IRIS 7z file...')
+try:
+    download(iris_7z_url)
+except:
+    print('Failed with 403 error. Why would géoservices do that? Anyways, I will download the files by hand and save them in iris_geoshapes.zip ...')
+
+### 4. GEOSHAPE CREATION
+run.stage('build')
+# one partition per department: communes_geoshapes/department=XX/ and
+# codes_postaux_geoshapes/department=XX/, read with common.codes_postaux.read_codes_postaux
+# the crosswalks are parsed by crosswalks.py, every department reads its own rows
+build_codes_postaux(
+    data_dir / 'iris_geoshapes.zip',
+    data_dir / 'iris_commune_crosswalk.parquet',
+    data_dir / 'commune_code_postal_crosswalk.parquet',
+    data_dir,
+    workers = args.workers
+)
+
+run.finish()
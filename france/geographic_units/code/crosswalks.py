@@ -0,0 +1,48 @@
+### 1. MODULE IMPORTS
+import sys
+import zipfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import parse_args
+from common.instrumentation import RunReport
+from common.download_cache import download
+from common.crosswalks import write_commune_code_postal, write_iris_commune
+
+### 2. PATH DEFINITIONS
+code_dir = Path(__file__).parent
+data_dir = code_dir.parent / 'data'
+
+args = parse_args()
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory) # stage timings and memory, written to data/crosswalks_run_report.json
+
+### 3. DONWLOADS
+run.stage('download')
+## IRIS - Commune crosswalk
+# zip url from https://www.insee.fr/fr/information/7708995#
+iris_zip_url = 'https://www.insee.fr/fr/statistiques/fichier/7708995/reference_IRIS_geo2024.zip'
+print('Retrieving the IRIS - Commune Crosswalk ZIP file...')
+iris_zip_path = download(iris_zip_url) # kept in the cache, so that it is only downloaded again if it changes
+print('Extracting IRIS - Commune Crosswalk xlsx file...')
+with zipfile.ZipFile(iris_zip_path, 'r') as zip_object:
+    zip_object.extractall(path = data_dir)
+(data_dir / 'reference_IRIS_geo2024.xlsx').rename(data_dir / 'iris_commune_crosswalk.xlsx')
+
+## Code Postal - Commune crosswalk
+# csv url from https://datanova.laposte.fr/datasets/laposte-hexasmal
+code_postal_csv_url = 'https://datanova.laposte.fr/data-fair/api/v1/datasets/laposte-hexasmal/metadata-attachments/base-officielle-codes-postaux.csv'
+code_postal_csv_destination = data_dir / 'commune_code_postal_crosswalk.csv'
+print('Retrieving the Commune - Code Postal csv file...')
+download(code_postal_csv_url, code_postal_csv_destination)
+
+### 4. PARSING AND EXPORT
+run.stage('export')
+# the xlsx and csv are parsed only here, once: the other scripts read the typed
+# Parquet tables, and only the rows of the regions or departments they need
+# (see common/crosswalks.py)
+print('Parsing IRIS - Commune crosswalk...')
+write_iris_commune(data_dir / 'iris_commune_crosswalk.xlsx', data_dir / 'iris_commune_crosswalk.parquet')
+print('Parsing Commune - Code Postal crosswalk...')
+write_commune_code_postal(data_dir / 'commune_code_postal_crosswalk.csv', data_dir / 'commune_code_postal_crosswalk.parquet')
+
+run.finish()
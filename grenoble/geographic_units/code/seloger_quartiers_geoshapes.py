@@ -1,16 +1,25 @@
 ### 1. MODULE IMPORTS
 import ast
+import sys
 import shapely
 import pandas as pd
 import geopandas as gpd
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import parse_args
+from common.instrumentation import RunReport
+
 ### 2. DIRECTORY DEFINITIONS
 code_dir = Path(__file__).parent
 data_dir = code_dir.parent / 'data'
 figures_dir = code_dir.parent / 'figures'
 
+args = parse_args()
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory) # stage timings and memory, written to data/seloger_quartiers_geoshapes_run_report.json
+
 ### 3. DATA PREPARATION
+run.stage('load')
 with open(data_dir / 'response_list.txt', 'r') as f:
     response_list_string = f.read()
     
@@ -34,6 +43,7 @@ gdf_rl = (
 )
 
 ### 4. MERGING
+run.stage('merge')
 gdf = (
     gdf_rl
     .join(gdf_lq, rsuffix = '_lq')
@@ -46,6 +56,11 @@ gdf = (
 )
 
 ### 5. EXPORT
+run.stage('export')
 gdf.to_file(data_dir / 'seloger_quartiers_geoshapes.geojson')
-gdf.explore().save(figures_dir / 'seloger_quartiers.html')
-gdf_lq.explore().save(figures_dir / 'seloger_quartiers_low_quality.html')
+if not args.no_figures: # with --no-figures, only the data files are written
+    run.stage('figures')
+    gdf.explore().save(figures_dir / 'seloger_quartiers.html')
+    gdf_lq.explore().save(figures_dir / 'seloger_quartiers_low_quality.html')
+
+run.finish()
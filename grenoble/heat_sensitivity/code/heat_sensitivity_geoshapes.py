@@ -1,7 +1,10 @@
 ### 1. MODULE IMPORTS
-import urllib.request
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.download_cache import download
+
 ### 2. PATH DEFINITIONS
 code_dir = Path(__file__).parent
 data_dir = code_dir.parent / 'data'
@@ -12,4 +15,4 @@ data_dir = code_dir.parent / 'data'
 heat_sensitivity_zip_url = 'https://www.data.gouv.fr/fr/datasets/r/6c90c9e1-d6fc-4cb8-853a-27cb229039b7'
 heat_sensitivity_zip_destination = data_dir / 'heat_sensitivity_geoshapes.zip'
 print('Retrieving the Heat Sensitivity ZIP file...')
-urllib.request.urlretrieve(heat_sensitivity_zip_url, heat_sensitivity_zip_destination)
+download(heat_sensitivity_zip_url, heat_sensitivity_zip_destination) # nothing is downloaded if it did not change since the last run
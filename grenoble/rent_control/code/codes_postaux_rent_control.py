@@ -1,8 +1,18 @@
 ### 1. IMPORTS
+import sys
 import pandas as pd
 import geopandas as gpd
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import parse_args
+from common.instrumentation import RunReport
+from common.maps import export_maps
+from common.overlap_weights import overlap_matrix
+from common.projection import read_projected
+from common.areal_interpolation import interpolate_tensor
+from common.rent_control import reference_tensor, tensor_to_frame
+
 ### 2. PATH & OTHER DEFINITIONS
 code_dir = Path(__file__).parent
 data_dir = code_dir.parent / 'data'
@@ -21,7 +31,11 @@ float_cols = [
     'refmin'
 ]
 
+args = parse_args() # e.g. --workers 32 to run the overlays on 32 processes
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory, unit_timings = args.unit_timings) # stage timings and memory, written to data/codes_postaux_rent_control_run_report.json
+
 ### 3. LOAD
+run.stage('load')
 gdf_zn = ( # zn: zone
     gpd
     .read_file(data_dir / 'rent_control_geoshapes.geojson')
@@ -33,52 +47,53 @@ gdf_zn_unique = (
     .loc[:, 'geometry']
 )
 gdf_cp = ( # cp: code postal
-    gpd
-    .read_file(geoshapes_dir / 'codes_postaux_geoshapes.geojson')
+    read_projected(geoshapes_dir / 'codes_postaux_geoshapes.geojson') # Lambert 93, reprojected once, then read from .cache/projected
     .set_index('code_postal')
-    .to_crs(gdf_zn.crs)
 )
 
 ### 4. TRANSLATION OF RENT CONTROL BY ZONE TO BY CODE POSTAL
-overlaps = [] # each column corresponds to a Code Postal, each row corresponds to the % of Code Postal in each rent control zone 
-for cp in gdf_cp.index:
-    cp_shape = gdf_cp.loc[cp, 'geometry']
-    overlap = (
-        gdf_zn_unique
-        .apply(lambda zn_shape: zn_shape.intersection(cp_shape).area / cp_shape.area)
-        .rename(cp)
-    )
-    overlaps.append(overlap)
-    
-df_ol = pd.concat(overlaps, axis = 1) # ol: overlap
-df_ol = (df_ol / df_ol.sum()).T # is a (#Code Postal x #Zones) matrix
+run.stage('overlay')
+# area of the intersection of every Code Postal with every zone. It is stored on disk,
+# keyed by the content of both geotables, so it is only calculated once. The few zones
+# are reprojected to the crs of the units (see common.projection.common_crs), so the areas are in m²
+ol_matrix = overlap_matrix(gdf_cp, gdf_zn_unique, workers = args.workers) # ol: overlap. Is a sparse (#Code Postal x #Zones) matrix
 
-dfs_rc = []
-for rooms in gdf_zn.loc[:, 'rooms'].unique():
-    for epoque in gdf_zn.loc[:, 'epoque'].unique():
-        for furnished in gdf_zn.loc[:, 'furnished'].unique():
-            mask = (
-                (gdf_zn.loc[:, 'rooms'] == rooms) 
-                & (gdf_zn.loc[:, 'epoque'] == epoque) 
-                & (gdf_zn.loc[:, 'furnished'] == furnished) 
-            )
-            df_rc = df_ol @ gdf_zn.loc[mask, :].loc[:, float_cols]
-            df_rc.loc[:, cat_cols] = [rooms, epoque, furnished]
-            df_rc = df_rc.dropna().rename_axis(gdf_cp.index.names)
-            
-            dfs_rc.append(df_rc)
+run.stage('aggregate')
+# hold the rent control values of all zones as a dense tensor, indexed by (rooms, epoque, 
+# furnished, zone). The weighted averages of every Code Postal, for every combination, then
+# come out of a single sparse matrix product
+coords = {col: pd.Index(gdf_zn.loc[:, col].unique()) for col in cat_cols}
+rc_tensor = reference_tensor(
+    df = gdf_zn.reset_index(),
+    coords = coords | {'zone': gdf_zn_unique.index},
+    value_cols = float_cols
+)
+df_rc = (
+    tensor_to_frame(
+        tensor = interpolate_tensor(ol_matrix, rc_tensor),
+        coords = coords | {'code_postal': gdf_cp.index},
+        value_cols = float_cols
+    )
+    .set_index(gdf_cp.index.names)
+    .dropna()
+)
         
 ### 5. CONCATENATE AND EXPORT
+run.stage('export')
 (
-    pd
-    .concat(dfs_rc) # concatenate all rooms, epoques combinations
+    df_rc
     .loc[:, cat_cols + float_cols]
     .to_csv(data_dir / 'codes_postaux_rent_control.csv')
 )
 
-(
-    gdf_cp
-    .join(dfs_rc[0], how = 'inner')
-    .explore(float_cols[0])
-    .save(figures_dir / 'codes_postaux_rent_control.html')
-)
+if not args.no_figures: # with --no-figures, only the data files are written
+    run.stage('figures')
+    export_maps(
+        gdf_cp,
+        {'codes_postaux_rent_control': df_rc.loc[(df_rc.loc[:, cat_cols] == [coord[0] for coord in coords.values()]).all(axis = 1), float_cols[0]]}, # first combination only
+        figures_dir,
+        'codes_postaux',
+        max_zoom = 14
+    )
+
+run.finish()
@@ -1,27 +1,35 @@
 ### 1. MODULE IMPORTS
+import sys
 import tabula
-import requests
 import pandas as pd
-import urllib.request
 import geopandas as gpd
 from pathlib import Path
 from zipfile import ZipFile
 
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.download_cache import download
+from common.cli import parse_args
+from common.instrumentation import RunReport
+
 ### 2. PATH DEFINITIONS
 code_dir = Path(__file__).parent
 data_dir = code_dir.parent / 'data'
 
+args = parse_args()
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory) # stage timings and memory, written to data/rent_control_geoshapes_run_report.json
+
 ### 3. GEOSHAPES - DOWNLOAD AND EXTRACT
+run.stage('download')
 zip_url = 'https://www.observatoires-des-loyers.org/datagouv/2023/Base_OP_2023_L3800.zip'
-zip_destination = data_dir / 'rent_zones.zip'
-urllib.request.urlretrieve(zip_url, zip_destination)
+zip_path = download(zip_url) # kept in the cache, so that it is only downloaded again if it changes
 
-with ZipFile(zip_destination) as zipfile:
+with ZipFile(zip_path) as zipfile:
     zipfile.extract('L3800_zone_elem_2023.kml', path = data_dir)
     zipfile.extract('table_zones_2023_L3800_1.xls', path = data_dir)
 zipfile.close()
    
 ### 4. GEOSHAPES - LOAD DATA
+run.stage('load')
 gdf_zn = gpd.read_file(data_dir / 'L3800_zone_elem_2023.kml')
 df_zn = pd.read_excel(data_dir / 'table_zones_2023_L3800_1.xls', header = 2)
 
@@ -29,6 +37,7 @@ for path in data_dir.iterdir():
     path.unlink() # delete everything created so far
 
 ### 5. GEOSHAPES - MERGE AND EXPORT
+run.stage('dissolve')
 zone_dict = {
     'L3800.1.01': 'Zone 1',
     'L3800.1.02': 'Zone 2',
@@ -49,19 +58,14 @@ gdf_ds = ( # ds: dissolved
 )
 
 ### 6. RENT CONTROL - DOWNLOAD AND LOAD
+run.stage('parse_pdf')
 pdf_url = 'https://www.isere.gouv.fr/contenu/telechargement/76673/598917/file/3_Tableau_loyers%20de%20r%C3%A9f%C3%A9rence_ANIL.pdf'
-pdf_destination = data_dir / 'rent_control_table.pdf'
-headers = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-}
-response = requests.get(pdf_url, headers = headers)
-with open(pdf_destination, 'wb') as f:
-        f.write(response.content)
+pdf_path = download(pdf_url) # with a browser User-Agent, otherwise the request is rejected
 
-df1_rc, df2_rc = tabula.read_pdf(pdf_destination, stream = True, pages = 'all')
-pdf_destination.unlink() # delete it after it's been read
+df1_rc, df2_rc = tabula.read_pdf(pdf_path, stream = True, pages = 'all')
 
 ### 7. RENT CONTROL - CORRECTIONS
+run.stage('corrections')
 colnames = [
     'zone',
     'rooms',
@@ -111,6 +115,7 @@ df_rc = (
 )
 
 ### 8. MERGE EVERYTHING AND EXPORT
+run.stage('export')
 (
     gpd
     .GeoDataFrame(
@@ -125,3 +130,5 @@ df_rc = (
     .set_index('zone')
     .to_file(data_dir / 'rent_control_geoshapes.geojson')
 )
+
+run.finish()
@@ -1,8 +1,18 @@
 ### 1. IMPORTS
+import sys
 import pandas as pd
 import geopandas as gpd
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import parse_args
+from common.instrumentation import RunReport
+from common.maps import export_maps
+from common.overlap_weights import overlap_matrix
+from common.projection import read_projected
+from common.areal_interpolation import interpolate_tensor
+from common.rent_control import reference_tensor, tensor_to_frame
+
 ### 2. PATH & OTHER DEFINITIONS
 code_dir = Path(__file__).parent
 data_dir = code_dir.parent / 'data'
@@ -21,7 +31,11 @@ float_cols = [
     'refmin'
 ]
 
+args = parse_args() # e.g. --workers 32 to run the overlays on 32 processes
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory, unit_timings = args.unit_timings) # stage timings and memory, written to data/seloger_quartiers_rent_control_run_report.json
+
 ### 3. LOAD
+run.stage('load')
 gdf_zn = ( # zn: zone
     gpd
     .read_file(data_dir / 'rent_control_geoshapes.geojson')
@@ -33,52 +47,52 @@ gdf_zn_unique = (
     .loc[:, 'geometry']
 )
 gdf_sl = ( # sl: seloger quartier
-    gpd
-    .read_file(geoshapes_dir / 'seloger_quartiers_geoshapes.geojson')
+    read_projected(geoshapes_dir / 'seloger_quartiers_geoshapes.geojson') # Lambert 93, reprojected once, then read from .cache/projected
     .set_index(['seloger_quartier', 'code_postal'])
-    .to_crs(gdf_zn.crs)
 )
 
 ### 4. TRANSLATION OF RENT CONTROL BY ZONE TO BY SELOGER QUARTIER
-overlaps = [] # each column corresponds to a SeLoger Quartier, each row corresponds to the % of SeLoger Quartier in each rent control zone 
-for sl in gdf_sl.index:
-    sl_shape = gdf_sl.loc[sl, 'geometry']
-    overlap = (
-        gdf_zn_unique
-        .apply(lambda zn_shape: zn_shape.intersection(sl_shape).area / sl_shape.area)
-        .rename(sl)
-    )
-    overlaps.append(overlap)
-    
-df_ol = pd.concat(overlaps, axis = 1) # ol: overlap
-df_ol = (df_ol / df_ol.sum()).T # is a (#SeLoger Quartier x #Zones) matrix
+run.stage('overlay')
+# area of the intersection of every SeLoger Quartier with every zone. It is stored on disk,
+# keyed by the content of both geotables, so it is only calculated once. The few zones
+# are reprojected to the crs of the units (see common.projection.common_crs), so the areas are in m²
+ol_matrix = overlap_matrix(gdf_sl, gdf_zn_unique, workers = args.workers) # ol: overlap. Is a sparse (#SeLoger Quartier x #Zones) matrix
 
-dfs_rc = []
-for rooms in gdf_zn.loc[:, 'rooms'].unique():
-    for epoque in gdf_zn.loc[:, 'epoque'].unique():
-        for furnished in gdf_zn.loc[:, 'furnished'].unique():
-            mask = (
-                (gdf_zn.loc[:, 'rooms'] == rooms) 
-                & (gdf_zn.loc[:, 'epoque'] == epoque) 
-                & (gdf_zn.loc[:, 'furnished'] == furnished) 
-            )
-            df_rc = df_ol @ gdf_zn.loc[mask, :].loc[:, float_cols]
-            df_rc.loc[:, cat_cols] = [rooms, epoque, furnished]
-            df_rc = df_rc.dropna().rename_axis(gdf_sl.index.names)
-            
-            dfs_rc.append(df_rc)
+run.stage('aggregate')
+# hold the rent control values of all zones as a dense tensor, indexed by (rooms, epoque, 
+# furnished, zone). The weighted averages of every SeLoger Quartier, for every combination, then
+# come out of a single sparse matrix product
+coords = {col: pd.Index(gdf_zn.loc[:, col].unique()) for col in cat_cols}
+rc_tensor = reference_tensor(
+    df = gdf_zn.reset_index(),
+    coords = coords | {'zone': gdf_zn_unique.index},
+    value_cols = float_cols
+)
+df_rc = (
+    tensor_to_frame(
+        tensor = interpolate_tensor(ol_matrix, rc_tensor),
+        coords = coords | {'seloger_quartier': gdf_sl.index},
+        value_cols = float_cols
+    )
+    .set_index(gdf_sl.index.names)
+    .dropna()
+)
         
 ### 5. CONCATENATE AND EXPORT
+run.stage('export')
 (
-    pd
-    .concat(dfs_rc) # concatenate all rooms, epoques combinations
+    df_rc
     .loc[:, cat_cols + float_cols]
     .to_csv(data_dir / 'seloger_quartiers_rent_control.csv')
 )
 
-(
-    gdf_sl
-    .join(dfs_rc[0], how = 'inner')
-    .explore(float_cols[0])
-    .save(figures_dir / 'seloger_quartiers_rent_control.html')
-)
+if not args.no_figures: # with --no-figures, only the data files are written
+    run.stage('figures')
+    export_maps(
+        gdf_sl,
+        {'seloger_quartiers_rent_control': df_rc.loc[(df_rc.loc[:, cat_cols] == [coord[0] for coord in coords.values()]).all(axis = 1), float_cols[0]]}, # first combination only
+        figures_dir,
+        'seloger_quartiers'
+    )
+
+run.finish()
@@ -0,0 +1,65 @@
+### 1. MODULE IMPORTS
+import sys
+import pandas as pd
+import geopandas as gpd
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import parse_args
+from common.maps import export_levels
+from common.instrumentation import RunReport
+
+### 2. PATH DEFINITIONS
+code_dir = Path(__file__).parent
+data_dir = code_dir.parent / 'data'
+grenoble_dir = code_dir.parents[1]
+geoshapes_dir = grenoble_dir / 'geographic_units' / 'data'
+
+args = parse_args() # e.g. --workers 4 to write the maps of several levels at the same time
+data_dir.mkdir(exist_ok = True)
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory) # stage timings and memory, written to data/result_maps_run_report.json
+
+### 3. PARAMETERS
+# the interactive maps of the aggregation scripts, rebuilt from their saved results
+# (see paris/result_maps/code/result_maps.py)
+levels = { # level: (geoshapes, keys, name of a unit in the map files, max zoom of the maps)
+    'codes_postaux': ('codes_postaux_geoshapes.geojson', ['code_postal'], 'code_postal', 14),
+    'seloger_quartiers': ('seloger_quartiers_geoshapes.geojson', ['seloger_quartier', 'code_postal'], 'seloger_quartier', 15)
+}
+rc_cat_cols = ['rooms', 'epoque', 'furnished']
+results = [ # (topic, level, {map: column, None for the outline only})
+    *[('heat_sensitivity', level, {'map_per_{unit}': None, 'tfs_map_per_{unit}': 'Très Forte Sensibilité', 'bur_map_per_{unit}': 'bur'}) for level in levels],
+    *[('rent_control', level, {f'{level}_rent_control': 'ref'}) for level in levels]
+]
+
+### 4. DATA LOADING
+run.stage('load')
+gdfs, jobs = {}, [] # geotables of the levels, read once
+for topic, level, maps in results:
+    geoshapes, keys, unit, max_zoom = levels[level]
+    path = grenoble_dir / topic / 'data' / f'{level}_{topic}.csv'
+    if not (path.exists() and (geoshapes_dir / geoshapes).exists()):
+        print(f'No {path.name} yet, skipping its maps')
+        continue
+    if level not in gdfs:
+        gdfs[level] = gpd.read_file(geoshapes_dir / geoshapes).set_index(keys)
+
+    df = pd.read_csv(path, dtype = {key: str for key in keys})
+    assert set(keys) <= set(df.columns), f'{path.name} has no {", ".join(keys)} column, it was written by an older version of its script: rerun the script of {topic}/code that writes it first!'
+    if topic == 'rent_control': # first combination only, the one of the first row
+        df = df.loc[(df.loc[:, rc_cat_cols] == df.loc[:, rc_cat_cols].iloc[0]).all(axis = 1)]
+    df = df.set_index(keys)
+    jobs.append({
+        'gdf_units': gdfs[level],
+        'maps': {name.format(unit = unit): None if col is None else df.loc[:, col] for name, col in maps.items()},
+        'figures_dir': grenoble_dir / topic / 'figures',
+        'name': level,
+        'max_zoom': max_zoom
+    })
+
+### 5. MAPS
+run.stage('figures')
+print(f'Exporting the maps of {len(jobs)} results...')
+export_levels(jobs, workers = args.workers)
+
+run.finish()
@@ -1,72 +1,58 @@
 ### 1. MODULE IMPORTS
+import sys
 import pandas as pd
 import geopandas as gpd
 from pathlib import Path
-from pyogrio.errors import DataSourceError
+
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import shared_parser
+from common.instrumentation import RunReport
+from common.feature_server import fetch_features
 
 ### 2. DEFINITIONS
 code_dir = Path(__file__).parent
 data_dir = code_dir.parent / 'data'
 figures_dir = code_dir.parent / 'figures'
 
+parser = shared_parser()
+parser.add_argument('--base-url', default = None, help = 'download from this mirror (or local server) instead of the official FeatureServer')
+args = parser.parse_args() # e.g. --base-url http://localhost:8000 to download from a local copy of the FeatureServer
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory) # stage timings and memory, written to data/always_underwater_geoshapes_run_report.json
+
 ### 3. PARAMETERS
 map_xmin = 590660.3999999985
 map_ymin = 6782748.9307
 map_xmax = 718969.9790000021
 map_ymax = 6896220.694400001
-n_divide = 2
+base_url = args.base_url or 'https://geoweb.iau-idf.fr/server/rest/services/RISQUES/Cartoviz_zip/FeatureServer'
 layers = [# see https://geoweb.iau-idf.fr/server/rest/services/RISQUES/Cartoviz_zip/FeatureServer
-    1, 
-    7, 
-    13, 
+    1,
+    7,
+    13,
     18
 ]
 
 ### 4. DATA FETCHING
-# Problem: If you call the API with an area that has too many records, you get a DataSourceError.
-# Solution: Call API for the whole area, if it fails, split area into 4 squares, and evaluate each
-# of the 4. If it fails, split again, etc, etc.
+run.stage('download')
+# Problem: If you call the API with an area that has too many records, the answer is cut at the
+# server limit. Solution: plan the requests first (by pages, or by tiles with few enough records,
+# counting them), then fetch them all concurrently. See common/feature_server.py
 for layer in layers:
-    gdfs = []
-    tiles = [(map_xmin, map_ymin, map_xmax, map_ymax)]
-    covered_area = 0
-    total_area = (map_xmax - map_xmin) * (map_ymax - map_ymin)
-    while tiles: # while there are tiles to evaluate
-        xmin, ymin, xmax, ymax = tiles.pop() # take the last one to be added
-        
-        url = f'https://geoweb.iau-idf.fr/server/rest/services/RISQUES/Cartoviz_zip/FeatureServer/{layer}/query?f=json&returnGeometry=true&spatialRel=esriSpatialRelIntersects&geometry={{"xmin":{xmin},"ymin":{ymin},"xmax":{xmax},"ymax":{ymax},"spatialReference":{{"wkid":102110,"latestWkid":2154}}}}&geometryType=esriGeometryEnvelope&inSR=102110&outFields=*&outSR=102110&resultType=tile'
-        
-        try: 
-            gdf = gpd.read_file(url)
-            if not gdf.empty:
-                gdf = gdf.query('niv == 99') # only areas that are always under water
-                
-            gdfs.append(gdf)
-            covered_area += (xmax - xmin) * (ymax - ymin)
-            print(f'Percentage of layer {layer:02d} covered area so far: {100 * covered_area / total_area:.2f}%')
-        except DataSourceError: # if it failed because too many records
-            xstep = (xmax - xmin) / n_divide
-            ystep = (ymax - ymin) / n_divide
-            for xi in range(n_divide):
-                for yi in range(n_divide):
-                    tiles.append( # split into 4 and add to the queue
-                        (
-                            xmin + xi * xstep, 
-                            ymin + yi * ystep,
-                            xmin + (xi + 1) * xstep,
-                            ymin + (yi + 1) * ystep
-                         )
-                    )
-        except Exception as e:
-            print('Unexpected exception:', e)
-            
-    gdf = pd.concat(gdfs).dissolve(by = 'objectid') # concatenate all of them
-    del gdfs
+    gdf = fetch_features(
+        f'{base_url}/{layer}',
+        (map_xmin, map_ymin, map_xmax, map_ymax),
+        where = 'niv = 99', # only areas that are always under water
+        wkid = 2154, # Lambert 93, 102110 in the old ESRI codes
+        workers = 8
+    )
+    gdf = gdf.dissolve(by = 'objectid') # the object id, whatever the layer calls it (see common/feature_server.py)
 
-    gdf.explore().save(figures_dir / 'always_underwater_geoshapes' / f'layer_{layer:02d}.html')
+    if not args.no_figures:
+        gdf.explore().save(figures_dir / 'always_underwater_geoshapes' / f'layer_{layer:02d}.html')
     gdf.to_file(data_dir / 'always_underwater_geoshapes' / f'layer_{layer:02d}.geojson')
     del gdf
-    
+
+run.stage('merge')
 gdf = (
     pd.concat(
         [gpd.read_file(data_dir / 'always_underwater_geoshapes' / f'layer_{layer:02d}.geojson') for layer in layers]
@@ -75,5 +61,10 @@ gdf = (
 )
 
 ### 5. EXPORT
-gdf.explore().save(figures_dir / 'always_underwater_geoshapes' / 'all_layers.html')
+run.stage('export')
 gdf.to_file(data_dir / 'always_underwater_geoshapes' / 'all_layers.geojson')
+if not args.no_figures: # with --no-figures, only the data files are written
+    run.stage('figures')
+    gdf.explore().save(figures_dir / 'always_underwater_geoshapes' / 'all_layers.html')
+
+run.finish()
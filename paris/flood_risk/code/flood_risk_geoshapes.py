@@ -1,90 +1,95 @@
 ### 1. MODULE IMPORTS
+import sys
 import shapely
+import numpy as np
 import svgpathtools
-import urllib.request
 import geopandas as gpd
-from typing import Tuple
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.download_cache import download
+from common.cli import parse_args
+from common.instrumentation import RunReport
+
 ### 2. DEFINITIONS
 code_dir = Path(__file__).parent
 data_dir = code_dir.parent / 'data'
 figures_dir = code_dir.parent / 'figures'
 
+args = parse_args()
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory) # stage timings and memory, written to data/flood_risk_geoshapes_run_report.json
+
 ## The downloaded svg & URL can be generated here
 # https://geoweb.iau-idf.fr/server/rest/services/RISQUES/cartoviz_zini_simplifiees/MapServer -> export map
 # https://geoweb.iau-idf.fr/server/rest/services/RISQUES/cartoviz_zini_simplifiees/MapServer/export?bbox=589967.8495417576%2C6782748.9307%2C719662.529458243%2C6896220.694400001&bboxSR=&layers=&layerDefs=&size=&imageSR=&historicMoment=&format=svg&transparent=true&dpi=&time=&timeRelation=esriTimeRelationOverlaps&layerTimeOptions=&dynamicLayers=&gdbVersion=&mapScale=&rotation=&datumTransformations=&layerParameterValues=&mapRangeValues=&layerRangeValues=&clipping=&spatialFilter=&f=html
 
 ### 3. DOWNLOAD, IMPORT AND TRANSLATION
+run.stage('download')
 svg_url = 'https://geoweb.iau-idf.fr/server/rest/directories/arcgisoutput/RISQUES/cartoviz_zini_simplifiees_MapServer/_ags_map14e5ad0ccf8543ae90ad27806daaeecc.svg'
-svg_destination = data_dir / 'flood_risk_area.svg'
-urllib.request.urlretrieve(svg_url, svg_destination)
-paths, attributes = svgpathtools.svg2paths(svg_destination)
+svg_path = download(svg_url) # kept in the cache, so that it is only downloaded again if it changes
+run.stage('load')
+paths, attributes = svgpathtools.svg2paths(svg_path)
 
-svg_xs = [line.start.real for segment in paths for line in segment] + [line.end.real for segment in paths for line in segment]
-svg_ys = [line.start.imag for segment in paths for line in segment] + [line.end.imag for segment in paths for line in segment]
-svg_xmax, svg_xmin = max(svg_xs), min(svg_xs)
-svg_ymax, svg_ymin = max(svg_ys), min(svg_ys)
+fill_to_label = {
+    '#B2526B': 'Impact fort',
+    '#D49FAD': 'Impact modéré',
+    '#B2B2B2': 'Impact non mesuré'
+}
+
+# one entry per line segment of every path, as complex numbers (x + iy)
+segment_starts = np.array([line.start for path in paths for line in path], dtype = complex)
+segment_ends = np.array([line.end for path in paths for line in path], dtype = complex)
+segment_paths = np.repeat(np.arange(len(paths)), [len(path) for path in paths])
+
+svg_min = np.array([min(segment_starts.real.min(), segment_ends.real.min()), min(segment_starts.imag.min(), segment_ends.imag.min())])
+svg_max = np.array([max(segment_starts.real.max(), segment_ends.real.max()), max(segment_starts.imag.max(), segment_ends.imag.max())])
 
 map_xmin = 590660.3999999985
 map_ymin = 6782748.9307
 map_xmax = 718969.9790000021
 map_ymax = 6896220.694400001
 
-width_scale_factor = (map_xmax - map_xmin) / (svg_xmax - svg_xmin)
-height_scale_factor = (map_ymax - map_ymin) / (svg_ymax - svg_ymin)
+map_min = np.array([map_xmin, map_ymin])
+scale_factor = (np.array([map_xmax, map_ymax]) - map_min) / (svg_max - svg_min) # width and height
 
 ### 4. FUNCTION DEFINITIONS
-def almost_equal(t1: Tuple[float], t2: Tuple[float]) -> bool:
-    '''
-    Checks if two coordinate pairs are almost equal.
-    '''
-    
-    return abs(t1[0] - t2[0]) + abs(t1[1] - t2[1]) < 1e-8
-    
-def translate(point: complex) -> Tuple[float]:
+def translate(points: np.ndarray) -> np.ndarray:
     '''
-    Takes a coordinate point expressed as a complex number, and 
-    translates it from the SVG reference system to EPSG:2154.
+    Takes an array of coordinate points expressed as complex numbers, and
+    translates it from the SVG reference system to EPSG:2154, as an (n, 2) array.
     '''
-    
-    x = map_xmin + (point.real - svg_xmin) * width_scale_factor
-    y = map_ymin + (point.imag - svg_ymin) * height_scale_factor
-    
-    return (x, y)
 
-def polygonize(path: svgpathtools.Path) -> shapely.geometry.Polygon:
-    '''
-    Convert the svgpathtools svgpathtools.Path of a polygon to a 
-    shapely polygon.
-    '''
-    
-    points = [translate(line.start) for line in path]
-    if not almost_equal(points[0], points[-1]):
-        end_point = translate(path[-1].end)
-        points.append(end_point)
-        
-    return shapely.geometry.Polygon(points)        
-
-def path_to_shapely(path: svgpathtools.Path) -> shapely.geometry.MultiPolygon:
+    return map_min + (np.column_stack([points.real, points.imag]) - svg_min) * scale_factor
+
+def polygonize(starts: np.ndarray, ends: np.ndarray, path_ids: np.ndarray) -> np.ndarray:
     '''
-    Convert an svgpathtools svgpathtools.Path to a shapely geometry.
+    Converts the line segments (start and end points) of svg paths into one
+    shapely polygon per continuous subpath, all at once: a subpath is made of
+    the starts of its segments, plus the end of its last one if it does not
+    come back to the first start.
     '''
-    
-    polygons = [polygonize(subpath) for subpath in path.continuous_subpaths()]               
-    return shapely.union_all(geometries = polygons)
+    # a subpath begins with every path, and wherever a segment does not start where the previous one ended
+    first = np.ones(len(starts), dtype = bool)
+    first[1:] = (path_ids[1:] != path_ids[:-1]) | (starts[1:] != ends[:-1])
+    subpath_starts = np.flatnonzero(first)
+    subpath_ends = np.append(subpath_starts[1:], len(starts)) - 1 # index of the last segment
+    gaps = starts[subpath_starts] - starts[subpath_ends]
+    open_ends = np.abs(gaps.real) + np.abs(gaps.imag) >= 1e-8 # the first and last starts are not (almost) equal
 
-### 5. FILE CREATION
-fill_to_label = {
-    '#B2526B': 'Impact fort',
-    '#D49FAD': 'Impact modéré',
-    '#B2B2B2': 'Impact non mesuré'
-}
+    points = np.insert(starts, subpath_ends[open_ends] + 1, ends[subpath_ends[open_ends]])
+    ring_ids = np.insert(np.cumsum(first) - 1, subpath_ends[open_ends] + 1, np.flatnonzero(open_ends))
+    rings = shapely.linearrings(translate(points), indices = ring_ids) # closed if needed
 
-filtered_paths = [path for path, attribute in zip(paths, attributes) if fill_to_label[attribute['fill']] == 'Impact fort']
-filtered_attributes = [attribute for attribute in attributes if fill_to_label[attribute['fill']] == 'Impact fort']
-geometries = [shapely.union_all([path_to_shapely(path) for path in filtered_paths])]
+    return shapely.polygons(rings)
+
+### 5. FILE CREATION
+run.stage('polygonize')
+is_high_impact = np.array([fill_to_label[attribute['fill']] == 'Impact fort' for attribute in attributes], dtype = bool)
+keep = is_high_impact[segment_paths]
+polygons = polygonize(segment_starts[keep], segment_ends[keep], segment_paths[keep])
+geometries = [shapely.union_all(polygons)] # a single union of every polygon of every path
 
+run.stage('reproject')
 gdf = (
     gpd
     .GeoDataFrame(data = {'index': list(range(len(geometries))), 'geometry': geometries}, crs = 'EPSG:2154')
@@ -92,8 +97,10 @@ gdf = (
 )
 
 ### 6. EXPORT
+run.stage('export')
 gdf.to_file(data_dir / 'flood_risk_geoshapes.geojson')
-gdf.explore().save(figures_dir / 'flood_risk_areas.html')
+if not args.no_figures: # with --no-figures, only the data files are written
+    run.stage('figures')
+    gdf.explore().save(figures_dir / 'flood_risk_areas.html')
 
-### 7. DELETE INTERMEDIARY FILES
-svg_destination.unlink()
+run.finish()
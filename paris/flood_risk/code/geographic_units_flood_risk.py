@@ -0,0 +1,67 @@
+### 1. MODULE IMPORTS
+import sys
+import numpy as np
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import parse_args
+from common.instrumentation import RunReport
+from common.maps import export_levels
+from common.flood_exposure import flood_exposure, read_parts
+from common.projection import METRIC_CRS, read_projected
+
+### 2. DEFINITIONS
+code_dir = Path(__file__).parent
+data_dir = code_dir.parent / 'data'
+figures_dir = code_dir.parent / 'figures'
+geoshapes_dir = code_dir.parent.parent / 'geographic_units' / 'data'
+
+units = { # name of the unit layer: columns to export
+    'codes_postaux': ['code_postal'],
+    'conseils_de_quartier': ['conseil_de_quartier'],
+    'seloger_quartiers': ['seloger_quartier', 'code_postal']
+}
+
+args = parse_args()
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory) # stage timings and memory, written to data/geographic_units_flood_risk_run_report.json
+
+### 3. DATA IMPORTS
+run.stage('load')
+# all the layers in Lambert 93, so the areas are in m²; they are only reprojected
+# once per version of their files (see common.projection.read_projected)
+fr_parts = read_parts(data_dir / 'flood_risk_geoshapes.geojson', METRIC_CRS) # fr: flood risk
+au_parts = read_parts(data_dir / 'always_underwater_geoshapes' / 'all_layers.geojson', METRIC_CRS) # au: always underwater
+gdfs = {name: read_projected(geoshapes_dir / f'{name}_geoshapes.geojson', METRIC_CRS) for name in units}
+
+### 4. CALCULATIONS
+run.stage('overlay')
+# the three unit layers go through in a single pass, so the flood and always
+# underwater parts are read and indexed only once
+unit_geoms = np.concatenate([gdf.geometry.to_numpy() for gdf in gdfs.values()])
+prop_at_flood_risk = flood_exposure(unit_geoms, fr_parts, au_parts)
+splits = np.cumsum([len(gdf) for gdf in gdfs.values()])[:-1]
+for gdf, props in zip(gdfs.values(), np.split(prop_at_flood_risk, splits)):
+    gdf.loc[:, 'prop_at_flood_risk'] = props
+
+### 5. EXPORT
+run.stage('export')
+for name, gdf in gdfs.items():
+    gdf.loc[:, units[name] + ['prop_at_flood_risk']].to_csv(data_dir / f'{name}_flood_risk.csv', index = False)
+
+if not args.no_figures: # with --no-figures, only the data files are written
+    run.stage('figures')
+    # one map per level, each with its own simplified geometries, written in parallel with --workers
+    export_levels(
+        [
+            {
+                'gdf_units': gdf.set_index(units[name]),
+                'maps': {f'{name}_flood_risk': gdf.set_index(units[name]).loc[:, 'prop_at_flood_risk']},
+                'figures_dir': figures_dir,
+                'name': name
+            }
+            for name, gdf in gdfs.items()
+        ],
+        workers = args.workers
+    )
+
+run.finish()
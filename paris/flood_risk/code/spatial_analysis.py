@@ -1,22 +1,32 @@
 ### 1. MODULE IMPORTS
+import sys
+import pandas as pd
 import geopandas as gpd
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import parse_args
+from common.instrumentation import RunReport
+
 ### 2. DEFINITIONS
 code_dir = Path(__file__).parent
 data_dir = code_dir.parent / 'data'
 figures_dir = code_dir.parent / 'figures'
 geoshapes_dir = code_dir.parent.parent / 'geographic_units' / 'data'
 
+args = parse_args()
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory) # stage timings and memory, written to data/spatial_analysis_run_report.json
+
 ### 3. DATA IMPORTS
-fr_shape = gpd.read_file(data_dir / 'flood_risk_geoshapes.geojson').dissolve().loc[0, 'geometry'] # fr: flood risk
-au_shape = gpd.read_file(data_dir / 'always_underwater_geoshapes' / 'all_layers.geojson').to_crs('EPSG:4326').dissolve().loc[0, 'geometry'] # au: always underwater
+run.stage('load')
 gdf_cq = gpd.read_file(geoshapes_dir / 'conseils_de_quartier_geoshapes.geojson') # cq: conseil de quartier
+df_fr = pd.read_csv(data_dir / 'conseils_de_quartier_flood_risk.csv', dtype = {'conseil_de_quartier': str}) # fr: flood risk, calculated by geographic_units_flood_risk.py
 
 ### 4. CALCULATIONS
-gdf_cq.loc[:, 'prop_at_flood_risk'] = gdf_cq.loc[:, 'geometry'].apply(
-    lambda cq_shape: cq_shape.difference(au_shape).intersection(fr_shape).area / cq_shape.difference(au_shape).area
-)
+run.stage('aggregate')
+# the proportions are not calculated again: the csv has the same rows, in the same order
+assert (df_fr.loc[:, 'conseil_de_quartier'].astype(str).to_numpy() == gdf_cq.loc[:, 'conseil_de_quartier'].astype(str).to_numpy()).all()
+gdf_cq.loc[:, 'prop_at_flood_risk'] = df_fr.loc[:, 'prop_at_flood_risk'].to_numpy()
 
 del gdf_cq['geometry']
 
@@ -33,4 +43,7 @@ for c in (0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0):
     gdf_cq.loc[:, f'{c}_delta'] = ((1 - gdf_cq.loc[:, 'prop_at_flood_risk']) <= c) - gdf_cq.loc[:, 'mode']
 
 ### 5. EXPORT
+run.stage('export')
 gdf_cq.to_csv(data_dir / 'flood_risk_statistics.csv', index = False)
+
+run.finish()
@@ -1,90 +1,30 @@
 ### 1. MODULE IMPORTS
-import zipfile
-import pandas as pd
-import urllib.request
-import geopandas as gpd
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import parse_args
+from common.instrumentation import RunReport
+from common.codes_postaux import read_codes_postaux
+
 ### 2. PATH DEFINITIONS
 code_dir = Path(__file__).parent
 data_dir = code_dir.parent / 'data'
+france_dir = code_dir.parents[2] / 'france' / 'geographic_units' / 'data'
 
-### 3. DONWLOADS
-## IRIS - Commune crosswalk
-# zip url from https://www.insee.fr/fr/information/7708995#
-iris_zip_url = 'https://www.insee.fr/fr/statistiques/fichier/7708995/reference_IRIS_geo2024.zip'
-iris_zip_destination = data_dir / 'reference_IRIS_geo2024.zip'
-print('Retrieving the IRIS - Commune Crosswalk ZIP file...')
-urllib.request.urlretrieve(iris_zip_url, iris_zip_destination)
-print('Extracting IRIS - Commune Crosswalk xlsx file...')
-with zipfile.ZipFile(iris_zip_destination, 'r') as zip_object:
-    zip_object.extractall(path = data_dir)
-iris_zip_destination.with_suffix('.xlsx').rename(data_dir / 'iris_commune_crosswalk.xlsx')
-print('Deleting the IRIS - Commune Crosswalk ZIP file...')
-iris_zip_destination.unlink()
-
-## Code Postal - Commune crosswalk
-# csv url from https://datanova.laposte.fr/datasets/laposte-hexasmal
-code_postal_csv_url = 'https://datanova.laposte.fr/data-fair/api/v1/datasets/laposte-hexasmal/metadata-attachments/base-officielle-codes-postaux.csv'
-code_postal_csv_destination = data_dir / 'commune_code_postal_crosswalk.csv'
-print('Retrieving the Commune - Code Postal csv file...')
-urllib.request.urlretrieve(code_postal_csv_url, code_postal_csv_destination)
-
-## IRIS geoshapes
-# 7z url from https://geoservices.ign.fr/irisge
-iris_7z_url = 'https://data.geopf.fr/telechargement/download/IRIS-GE/IRIS-GE_3-0__SHP_LAMB93_FXX_2024-01-01/IRIS-GE_3-0__SHP_LAMB93_FXX_2024-01-01.7z'
-iris_7z_destination = data_dir / 'IRIS-GE_3-0__SHP_LAMB93_FXX_2024-01-012.7z'
-print('Retrieving the IRIS 7z file...')
-try:
-    urllib.request.urlretrieve(iris_7z_url, iris_7z_destination) 
-except:
-    print('Failed with 403 error. Why would géoservices do that? Anyways, I will download the files by hand and save them in iris_geoshapes.zip ...')
-    
-### 4. GEOSHAPE CREATION
-print('\n\nLoading IRIS geotable...')
-gdf_ir = ( # ir: IRIS
-    gpd
-    .read_file(data_dir / 'iris_geoshapes.zip')
-    .loc[:, ['CODE_IRIS', 'geometry']]
-    .set_index('CODE_IRIS')
-)
+args = parse_args()
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory) # stage timings and memory, written to data/codes_postaux_geoshapes_run_report.json
 
-print('Loading IRIS - Commune crosswalk...')
-df_ic = ( # ic: IRIS - Commune
-    pd
-    .read_excel(
-        data_dir / 'iris_commune_crosswalk.xlsx',
-        sheet_name = 'Emboitements_IRIS',
-        header = 5, # table starts on the 6th row
-    )
-    .query('REG == 11') # only region 11 (Île-de-France)
-    .loc[:, ['CODE_IRIS', 'DEPCOM']]
-    .set_index('CODE_IRIS')
-)
+### 3. GEOSHAPE CREATION
+# the Codes Postaux of the whole of France are built, department by department,
+# by france/geographic_units/code/codes_postaux_geoshapes.py: only the
+# departments of region 11 (Île-de-France) are read here
+run.stage('load')
+print('Loading the Codes Postaux of Île-de-France...')
+gs_cp = read_codes_postaux(france_dir / 'codes_postaux_geoshapes', region = '11') # cp: code postal
 
-print('Loading Commune - Code Postal crosswalk...')
-df_cc = ( # cc: Commune - Code Postal
-    pd
-    .read_csv(
-        data_dir / 'commune_code_postal_crosswalk.csv', 
-        usecols = ['code_commune_insee', 'code_postal'],
-        dtype = str
-    )
-    .drop_duplicates()
-    .reset_index(drop = True)
-    .rename(columns = {'code_commune_insee': 'DEPCOM', 'code_postal': 'CP'})
-)
-df_cc.loc[df_cc.loc[:, 'CP'] == '93380', 'DEPCOM'] = '93059' # There is one error on Pierrefite-sur-Seine
+### 4. EXPORT
+run.stage('export')
+gs_cp.to_file(data_dir / 'codes_postaux_geoshapes.geojson')
 
-### 5. JOIN AND EXPORT
-print('Joining tables...')
-(
-    gdf_ir
-    .join(df_ic, how = 'inner', sort = True)
-    .merge(df_cc, how = 'left', on = 'DEPCOM')
-    .dropna(subset = 'CP')
-    .dissolve(by = 'CP')
-    .loc[:, 'geometry']
-    .rename_axis('code_postal')
-    .to_file(data_dir / 'codes_postaux_geoshapes.geojson')
-)
+run.finish()
@@ -1,18 +1,25 @@
 ### 1. MODULE IMPORTS
 import ast
+import sys
 import shapely
 import pandas as pd
 import geopandas as gpd
 from pathlib import Path
-import contextily as ctx
-from matplotlib import pyplot as plt
+
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import parse_args
+from common.instrumentation import RunReport
 
 ### 2. DIRECTORY DEFINITIONS
 code_dir = Path(__file__).parent
 data_dir = code_dir.parent / 'data'
 figures_dir = code_dir.parent / 'figures'
 
+args = parse_args()
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory) # stage timings and memory, written to data/seloger_quartiers_geoshapes_run_report.json
+
 ### 3. DATA PREPARATION
+run.stage('load')
 with open(data_dir / 'response_list.txt', 'r') as f:
     response_list_string = f.read()
     
@@ -43,6 +50,7 @@ gdf_rl = (
 )
 
 ### 4. INCONSISTENCY SOLVING
+run.stage('repair')
 ## Solves: Île de la Cité is split in two
 polygon_ic = gdf_rl.loc[gdf_rl.index == 'Île de la Cité'].dissolve().loc[0, 'geometry']
 gdf_rl = gdf_rl.loc[gdf_rl.index != 'Île de la Cité']
@@ -67,6 +75,7 @@ gdf_rl.loc['Seine et Berges'] = gdf_rl_sb
 gdf_rl = gdf_rl.loc[gdf_rl.loc[:, 'geometry'].apply(lambda x: type(x) != shapely.GeometryCollection)]
 
 ### 5. MERGING
+run.stage('merge')
 gdf_rl = gdf_rl.sort_values('Label')
 
 gdf_rl = gdf_rl.to_crs('EPSG:3857') # set non-geo crs to be able to compute distances in the sjoin later
@@ -112,37 +121,45 @@ gdf = (
 )
 
 ### 6. EXPORT
+run.stage('export')
 gdf.to_file(data_dir / 'seloger_quartiers_geoshapes.geojson')
-gdf.explore().save(figures_dir / 'seloger_quartiers.html')
-gdf_lq.set_geometry('geometry').explore().save(figures_dir / 'seloger_quartiers_low_quality.html')
-
-centre_paris = shapely.Point((2.348922, 48.853328)) # square in front of Notre Dame
-ax = gdf.boundary.plot(figsize = (16, 16), color = 'k')
-ctx.add_basemap(
-    ax, 
-    zoom = 13,
-    source = ctx.providers.CartoDB.Positron, 
-    crs = gdf.crs.to_string()
-)
-note = ''
-iterator = (
-    gdf
-    .assign(dtc = lambda gdf: gdf.loc[:, 'geometry'].apply(lambda sl: sl.distance(centre_paris)))
-    .sort_values(by = 'dtc')
-    .iterrows()
-)
-for i, row in enumerate(iterator):
-    sl_name = f"{row[1]['seloger_quartier']}, {row[1]['code_postal']}"
-    sl = row[1]['geometry']
-    
-    note += f'{i + 1}: {sl_name}\n'
-    
-    x, y = sl.representative_point().coords[0]    
-    ax.plot(x, y, 'wo', mec = 'k', ms = 11)
-    ax.text(x, y, str(i + 1), {'size': 5, 'verticalalignment': 'center', 'horizontalalignment': 'center'})
-    
-plt.figtext(0.1, -2.7, note, ha = 'left')
-plt.xlabel('Longitude')
-plt.ylabel('Latitude')
-plt.title('SeLoger Quartier Boundaries')
-plt.savefig(figures_dir / 'sl_map.pdf', bbox_inches = 'tight')
+if not args.no_figures: # with --no-figures, only the data files are written, and the plotting libraries are never imported
+    run.stage('figures')
+    import contextily as ctx
+    from matplotlib import pyplot as plt
+
+    gdf.explore().save(figures_dir / 'seloger_quartiers.html')
+    gdf_lq.set_geometry('geometry').explore().save(figures_dir / 'seloger_quartiers_low_quality.html')
+
+    centre_paris = shapely.Point((2.348922, 48.853328)) # square in front of Notre Dame
+    ax = gdf.boundary.plot(figsize = (16, 16), color = 'k')
+    ctx.add_basemap(
+        ax, 
+        zoom = 13,
+        source = ctx.providers.CartoDB.Positron, 
+        crs = gdf.crs.to_string()
+    )
+    note = ''
+    iterator = (
+        gdf
+        .assign(dtc = lambda gdf: gdf.loc[:, 'geometry'].apply(lambda sl: sl.distance(centre_paris)))
+        .sort_values(by = 'dtc')
+        .iterrows()
+    )
+    for i, row in enumerate(iterator):
+        sl_name = f"{row[1]['seloger_quartier']}, {row[1]['code_postal']}"
+        sl = row[1]['geometry']
+
+        note += f'{i + 1}: {sl_name}\n'
+
+        x, y = sl.representative_point().coords[0]    
+        ax.plot(x, y, 'wo', mec = 'k', ms = 11)
+        ax.text(x, y, str(i + 1), {'size': 5, 'verticalalignment': 'center', 'horizontalalignment': 'center'})
+
+    plt.figtext(0.1, -2.7, note, ha = 'left')
+    plt.xlabel('Longitude')
+    plt.ylabel('Latitude')
+    plt.title('SeLoger Quartier Boundaries')
+    plt.savefig(figures_dir / 'sl_map.pdf', bbox_inches = 'tight')
+
+run.finish()
@@ -1,9 +1,16 @@
 ### 1. IMPORTS
-import tqdm
+import sys
 import pandas as pd
 import geopandas as gpd
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import parse_args
+from common.instrumentation import RunReport
+from common.maps import export_maps
+from common.areal_interpolation import weighted_averages
+from common.projection import read_projected
+
 ### 2. PATH & OTHER DEFINITIONS
 code_dir = Path(__file__).parent
 data_dir = code_dir.parent / 'data'
@@ -44,7 +51,11 @@ def map_lcz_to_sensibilite(lcz: str) -> str:
     else: # letters except E
         return 'Sensibilité Faible à Nulle'
 
+args = parse_args() # e.g. --workers 32 to run the overlays on 32 processes
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory, unit_timings = args.unit_timings) # stage timings and memory, written to data/conseils_de_quartier_heat_sensitivity_run_report.json
+
 ### 3. DATA LOADING
+run.stage('load')
 gdf_lcz = gpd.read_file(data_dir / 'heat_sensitivity_geoshapes.zip') # lcz: local climatic zone
 gdf_lcz = pd.concat(
     [gdf_lcz, 100 * pd.get_dummies(gdf_lcz.loc[:, 'lcz'].map(map_lcz_to_sensibilite))],
@@ -52,44 +63,35 @@ gdf_lcz = pd.concat(
 ).set_index('identifier')
 
 gdf_cq = ( # cq: conseil de quartier
-    gpd
-    .read_file(geoshapes_dir / 'conseils_de_quartier_geoshapes.geojson')
+    read_projected(geoshapes_dir / 'conseils_de_quartier_geoshapes.geojson', gdf_lcz.crs) # reprojected once, then read from .cache/projected
     .set_index(['conseil_de_quartier'])
-    .to_crs(gdf_lcz.crs)
 )
 
 ### 5. COMPUTATION
+run.stage('overlay')
 print('Calculating averages...')
-series = []
-for cq in tqdm.tqdm(gdf_cq.index): # takes around 10 minutes
-    # take the polygon of the conseil_de Quartier
-    cq_polygon = gdf_cq.loc[cq, 'geometry'] 
-    
-    # then calculate the area of the intersection with every single LCZ,
-    # and normalize the series so that the sum equals one
-    gdf_lcz.loc[:, 'geo_weight'] = gdf_lcz.loc[:, 'geometry'].apply(lambda lcz_polygon: cq_polygon.intersection(lcz_polygon).area)
-    gdf_lcz.loc[:, 'geo_weight'] = gdf_lcz.loc[:, 'geo_weight'] / gdf_lcz.loc[:, 'geo_weight'].sum()
-    nonzero_weight_mask = gdf_lcz.loc[:, 'geo_weight'] > 0
-    
-    # now calculate the weighted average (normalized weights * variable),
-    # for all variables at once using matrix multiplication
-    s = gdf_lcz.loc[nonzero_weight_mask, numeric_cols].multiply(gdf_lcz.loc[nonzero_weight_mask, 'geo_weight'], axis = 0).sum() 
-    
-    # set the name of the series to the name of the Conseil de Quartier
-    s.name = cq
-    
-    # concatenate all series in a list, to later merge them in a df
-    series.append(s)
-    
-df_wa = pd.DataFrame(series) # wa: weighted average
-df_wa.index.names = gdf_cq.index.names
-
-### 6. FIGURES
-print('Exporting maps...')
-gdf_cq.explore().save(figures_dir / 'map_per_conseil_de_quartier.html')
-gdf_cq.join(df_wa).explore('Très Forte Sensibilité').save(figures_dir / 'tfs_map_per_conseil_de_quartier.html')
-gdf_cq.join(df_wa).explore('bur').save(figures_dir / 'bur_map_per_conseil_de_quartier.html')
+# the LCZ - Conseil de Quartier overlap weights are calculated once and stored on disk,
+# then all variables are averaged at once with a sparse matrix product
+df_wa = weighted_averages(gdf_cq, gdf_lcz, numeric_cols, workers = args.workers) # wa: weighted average
 
-### 7. DATA EXPORTS
+### 6. DATA EXPORTS
+run.stage('export')
 print('Exporting data...')
 df_wa.to_csv(data_dir / 'conseil_de_quartiers_heat_sensitivity.csv')
+
+### 7. FIGURES
+if not args.no_figures: # with --no-figures, only the data files are written
+    run.stage('figures')
+    print('Exporting maps...')
+    export_maps( # simplified geometries, written once to conseils_de_quartier_geometries.js and shared by all the maps
+        gdf_cq,
+        {
+            'map_per_conseil_de_quartier': None,
+            'tfs_map_per_conseil_de_quartier': df_wa.loc[:, 'Très Forte Sensibilité'],
+            'bur_map_per_conseil_de_quartier': df_wa.loc[:, 'bur']
+        },
+        figures_dir,
+        'conseils_de_quartier'
+    )
+
+run.finish()
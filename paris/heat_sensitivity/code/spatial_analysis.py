@@ -1,15 +1,25 @@
 ### 1. IMPORTS
-import tqdm
+import sys
 import pandas as pd
 import geopandas as gpd
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import parse_args
+from common.instrumentation import RunReport
+from common.overlap_weights import overlap_matrix
+from common.weighted_statistics import weighted_statistics
+from common.projection import read_projected
+
 ### 2. PATH & OTHER DEFINITIONS
 code_dir = Path(__file__).parent
 data_dir = code_dir.parent / 'data'
 figures_dir = code_dir.parent / 'figures'
 geoshapes_dir = code_dir.parent.parent / 'geographic_units' / 'data'
 
+args = parse_args() # e.g. --workers 32 to run the overlays on 32 processes
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory, unit_timings = args.unit_timings) # stage timings and memory, written to data/spatial_analysis_run_report.json
+
 def map_lcz_to_sensibilite(lcz: str) -> str:
     '''
     Translates from the LCZ type to the Sensitivity category.
@@ -46,6 +56,7 @@ def map_sensibilte_to_int(sns: str) -> int:
         return 0
         
 ### 3. DATA LOADING
+run.stage('load')
 gdf_lcz = ( # lcz: local climatic zone
     gpd
     .read_file(data_dir / 'heat_sensitivity_geoshapes.zip') 
@@ -57,58 +68,28 @@ gdf_lcz = ( # lcz: local climatic zone
 )
 
 gdf_cq = ( # cq: conseil de quartier
-    gpd
-    .read_file(geoshapes_dir / 'conseils_de_quartier_geoshapes.geojson')
+    read_projected(geoshapes_dir / 'conseils_de_quartier_geoshapes.geojson', gdf_lcz.crs) # reprojected once, then read from .cache/projected
     .set_index(['conseil_de_quartier'])
-    .to_crs(gdf_lcz.crs)
 )
 
 ### 5. COMPUTATION
-print('Calculating averages...')
-series = []
-for cq in tqdm.tqdm(gdf_cq.index): # takes around 10 minutes
-    # take the polygon of the conseil_de Quartier
-    cq_polygon = gdf_cq.loc[cq, 'geometry'] 
-    result_s = pd.Series()
-    
-    # then calculate the area of the intersection with every single LCZ,
-    # and normalize the series so that the sum equals one
-    gdf_lcz.loc[:, 'geo_weight'] = gdf_lcz.loc[:, 'geometry'].apply(lambda lcz_polygon: cq_polygon.intersection(lcz_polygon).area)
-    gdf_lcz.loc[:, 'geo_weight'] = gdf_lcz.loc[:, 'geo_weight'] / gdf_lcz.loc[:, 'geo_weight'].sum()
-    
-    nonzero_weight_mask = gdf_lcz.loc[:, 'geo_weight'] > 0
-    gdf_lcz_sub = (
-        gdf_lcz
-        .loc[nonzero_weight_mask]
-        .copy()
-    )    
-    result_s['mean'] = gdf_lcz_sub.loc[:, 'sns_int'].multiply(gdf_lcz_sub.loc[:, 'geo_weight'], axis = 0).sum() 
-    
-    # now the percentile differences
-    gdf_lcz_sub.sort_values('sns_int', inplace = True)
-    cumsum = gdf_lcz_sub.loc[:, 'geo_weight'].cumsum().round(5)
-    result_s['median'] = gdf_lcz_sub.loc[cumsum >= 0.5, 'sns_int'].iloc[0]
-    result_s['mode'] = gdf_lcz_sub.loc[:, ['sns_int', 'geo_weight']].groupby(by = 'sns_int').sum().idxmax().item()
-    
-    # now the weighted standard deviation, like here: https://www.itl.nist.gov/div898/software/dataplot/refman2/ch2/weightsd.pdf
-    N_positive = gdf_lcz_sub.shape[0]
-    numerator = ((gdf_lcz_sub.loc[:, 'sns_int'] - result_s['mean']) ** 2).multiply(gdf_lcz_sub.loc[:, 'geo_weight'], axis = 0).sum()
-    denominator = (N_positive - 1) * gdf_lcz_sub.loc[:, 'geo_weight'].sum() / N_positive
-    result_s['std'] = (numerator / denominator) ** 0.5
-    
-    gdf_lcz_sub.loc[:, 'delta'] = gdf_lcz_sub.loc[:, 'sns_int'] - result_s['mode']
-    result_s['mean_delta'] = gdf_lcz_sub.loc[:, 'delta'].multiply(gdf_lcz_sub.loc[:, 'geo_weight'], axis = 0).sum() 
-    result_s['median_delta'] = gdf_lcz_sub.loc[cumsum >= 0.5, 'delta'].iloc[0]
-    result_s['mode_delta'] = gdf_lcz_sub.loc[:, ['delta', 'geo_weight']].groupby(by = 'delta').sum().idxmax().item()
-    
-    for cutoff in (0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0):
-        result_s[f'{cutoff}_delta'] = gdf_lcz_sub.loc[cumsum >= cutoff, 'delta'].iloc[0]    
-        
-    # set the name of the series to the name of the Conseil de Quartier
-    result_s.name = cq
-    
-    # concatenate all series in a list, to later merge them in a df
-    series.append(result_s)
-    
-df_rs = pd.DataFrame(series) # rs: results
+run.stage('overlay')
+print('Calculating statistics...')
+# every intersection area between Conseil de Quartier and LCZ, as a sparse 
+# (#Conseils de Quartier x #LCZs) matrix, then as a long table of 
+# (conseil de quartier, sensitivity, area) rows, which is all the kernel needs
+ol_matrix = overlap_matrix(gdf_cq, gdf_lcz, workers = args.workers).tocoo() # ol: overlap
+run.stage('aggregate')
+df_rs = weighted_statistics( # rs: results
+    units = ol_matrix.row,
+    values = gdf_lcz.loc[:, 'sns_int'].to_numpy()[ol_matrix.col],
+    weights = ol_matrix.data,
+    n_units = gdf_cq.shape[0],
+    delta_reference = 'mode'
+)
+df_rs.index = gdf_cq.index
+
+run.stage('export')
 df_rs.to_csv(data_dir / 'sns_int_statistics.csv')
+
+run.finish()
@@ -0,0 +1,30 @@
+### 1. MODULE IMPORTS
+import sys
+import geopandas as gpd
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import parse_args
+from common.instrumentation import RunReport
+from common.geoparquet import write_geoparquet
+
+### 2. PATH DEFINITIONS
+code_dir = Path(__file__).parent
+data_dir = code_dir.parent / 'data'
+
+args = parse_args()
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory) # stage timings and memory, written to data/heat_stress_geoparquet_run_report.json
+
+### 3. CONVERSION
+# Parsing the whole shapefile of Île-de-France takes tens of seconds, so it is 
+# only done once: the aggregation scripts read the GeoParquet file, and only 
+# the columns they need.
+run.stage('load')
+print('Loading Heat Stress geotable...')
+gdf_hs = gpd.read_file(data_dir / 'heat_stress_geoshapes.zip') # hs: heat stress
+
+run.stage('export')
+print('Writing Heat Stress GeoParquet file...')
+write_geoparquet(gdf_hs, data_dir / 'heat_stress_geoshapes.parquet') # original crs, EPSG:2154, in which all the unit levels are overlaid
+
+run.finish()
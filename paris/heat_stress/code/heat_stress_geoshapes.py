@@ -1,7 +1,10 @@
 ### 1. MODULE IMPORTS
-import urllib.request
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.download_cache import download
+
 ### 2. PATH DEFINITIONS
 code_dir = Path(__file__).parent
 data_dir = code_dir.parent / 'data'
@@ -12,4 +15,4 @@ data_dir = code_dir.parent / 'data'
 heatstress_zip_url = 'https://hub.arcgis.com/api/v3/datasets/2846134ea6b94177af1366d11e517187_18/downloads/data?format=shp&spatialRefId=2154&where=1%3D1'
 heatstress_zip_destination = data_dir / 'heat_stress_geoshapes.zip'
 print('Retrieving the Heat Stress ZIP file...')
-urllib.request.urlretrieve(heatstress_zip_url, heatstress_zip_destination)
+download(heatstress_zip_url, heatstress_zip_destination) # nothing is downloaded if it did not change since the last run
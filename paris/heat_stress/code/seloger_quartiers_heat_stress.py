@@ -1,37 +1,25 @@
 ### 1. MODULE IMPORTS
-import tqdm
-import shapely
-import pandas as pd
-import geopandas as gpd
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import parse_args
+from common.instrumentation import RunReport
+from common.maps import export_maps
+from common.geoparquet import read_geoparquet
+from common.projection import read_projected
+from common.areal_interpolation import weighted_averages
+
 ### 2. PATH DEFINITIONS
 code_dir = Path(__file__).parent
 data_dir = code_dir.parent / 'data'
 figures_dir = code_dir.parent / 'figures'
 geoshapes_dir = code_dir.parent.parent / 'geographic_units' / 'data'
 
-### 3. DATA IMPORTS
-print('Loading Heat Stress geotable...')
-gdf_hs = gpd.read_file(data_dir / 'heat_stress_geoshapes.zip') # hs: heatstress
-gdf_hs = gdf_hs.to_crs('EPSG:4326') # set same coordinate system as the other gdf
-gdf_hs.loc[:, 'geometry'] = gdf_hs.force_2d() # flatten geometries to 2D
-
-print('Loading Seloger Quartiers geotable...')
-gdf_sl = gpd.read_file(geoshapes_dir / 'seloger_quartiers_geoshapes.geojson').set_index(['seloger_quartier', 'code_postal']) # sl: SeLoger
-
-assert gdf_hs.crs == gdf_sl.crs, 'The geotables have different coordinate systems!'
-
-### 4. MISC DEFINITION
-def geo_weight_relative(
-    p1: shapely.geometry.polygon.Polygon, 
-    p2: shapely.geometry.polygon.Polygon
-) -> float:
-    ''' 
-    Returns the area of the intersection between two polygons.
-    '''
-    return p1.intersection(p2).area
+args = parse_args() # e.g. --workers 32 to run the overlays on 32 processes
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory, unit_timings = args.unit_timings) # stage timings and memory, written to data/seloger_quartiers_heat_stress_run_report.json
 
+### 3. MISC DEFINITION
 numeric_cols = [ # num. variables in the heatstress table
     'svf',
     'aspecratio',
@@ -57,38 +45,46 @@ numeric_cols = [ # num. variables in the heatstress table
     'st_lengths'
  ]
 
+### 4. DATA IMPORTS
+run.stage('load')
+print('Loading Seloger Quartiers geotable...')
+gdf_sl = read_projected(geoshapes_dir / 'seloger_quartiers_geoshapes.geojson').set_index(['seloger_quartier', 'code_postal']) # sl: SeLoger
+
+print('Loading Heat Stress geotable...')
+# only the needed columns, and only the IMUs inside the area of the units, are 
+# read from the GeoParquet file written by heat_stress_geoparquet.py, which 
+# already has flat (2D) geometries in Lambert 93, the coordinate system the
+# units are read in (reprojected once, and cached, by read_projected)
+gdf_hs = read_geoparquet(data_dir / 'heat_stress_geoshapes.parquet', numeric_cols, bbox = tuple(gdf_sl.total_bounds)) # hs: heat stress
+
+assert gdf_hs.crs == gdf_sl.crs, 'The geotables have different coordinate systems!'
+
 ### 5. COMPUTATION
+run.stage('overlay')
 print('Calculating averages...')
-series = []
-for sl in tqdm.tqdm(gdf_sl.index): # takes around 10 minutes
-    # take the polygon of the SeLoger Quartier
-    sl_polygon = gdf_sl.loc[sl, 'geometry'] 
-    
-    # then calculate the area of the intersection with every single IMU,
-    # and normalize the series so that the sum equals one
-    gdf_hs.loc[:, 'geo_weight'] = gdf_hs.loc[:, 'geometry'].apply(lambda imu_polygon: geo_weight_relative(sl_polygon, imu_polygon))
-    gdf_hs.loc[:, 'geo_weight'] = gdf_hs.loc[:, 'geo_weight'] / gdf_hs.loc[:, 'geo_weight'].sum()
-    
-    # now calculate the weighted average (normalized weights * variable),
-    # for all variables at once using a matrix multiplication
-    s = gdf_hs.loc[:, numeric_cols].multiply(gdf_hs.loc[:, 'geo_weight'], axis = 0).sum() 
-    
-    # set the name of the series to the name of the SeLoger Quartier
-    s.name = sl
-    
-    # concatenate all series in a list, to later merge them in a df
-    series.append(s)
-    
-df_wa = pd.DataFrame(series) # wa: weighted average
-df_wa.index.names = gdf_sl.index.names
-
-### 6. FIGURES
-print('Exporting maps...')
-gdf_sl.explore().save(figures_dir / 'map_per_seloger_quartier.html')
-gdf_sl.join(df_wa).explore('fluchaleur').save(figures_dir / 'fluchaleur_map_per_seloger_quartier.html')
-gdf_sl.join(df_wa).explore('vulnj_note').save(figures_dir / 'vulnj_note_map_per_seloger_quartier.html')
-gdf_sl.join(df_wa).explore('vulnn_note').save(figures_dir / 'vulnn_note_map_per_seloger_quartier.html')
+# the IMU - SeLoger Quartier overlap weights are calculated once and stored on disk, then
+# all variables are averaged at once with a sparse matrix product
+df_wa = weighted_averages(gdf_sl, gdf_hs, numeric_cols, workers = args.workers) # wa: weighted average
 
-### 7. DATA EXPORTS
+### 6. DATA EXPORTS
+run.stage('export')
 print('Exporting data...')
 df_wa.to_csv(data_dir / 'seloger_quartiers_heat_stress.csv')
+
+### 7. FIGURES
+if not args.no_figures: # with --no-figures, only the data files are written
+    run.stage('figures')
+    print('Exporting maps...')
+    export_maps( # simplified geometries, written once to seloger_quartiers_geometries.js and shared by all the maps
+        gdf_sl,
+        {
+            'map_per_seloger_quartier': None,
+            'fluchaleur_map_per_seloger_quartier': df_wa.loc[:, 'fluchaleur'],
+            'vulnj_note_map_per_seloger_quartier': df_wa.loc[:, 'vulnj_note'],
+            'vulnn_note_map_per_seloger_quartier': df_wa.loc[:, 'vulnn_note']
+        },
+        figures_dir,
+        'seloger_quartiers'
+    )
+
+run.finish()
@@ -0,0 +1,43 @@
+### 1. MODULE IMPORTS
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import shared_parser
+from common.enrichment import enrich
+from common.lookup import load_layers
+from common.instrumentation import RunReport
+
+### 2. PATH DEFINITIONS
+code_dir = Path(__file__).parent
+data_dir = code_dir.parent / 'data'
+
+parser = shared_parser()
+parser.add_argument('input', type = Path, help = 'csv or Parquet file of listings, with a longitude and a latitude column')
+parser.add_argument('output', type = Path, help = 'enriched csv or Parquet file (by extension)')
+parser.add_argument('--lon-col', default = 'lon', help = 'name of the longitude column (default: lon)')
+parser.add_argument('--lat-col', default = 'lat', help = 'name of the latitude column (default: lat)')
+parser.add_argument('--chunk-size', type = int, default = 100_000, help = 'rows read at a time (default: 100000)')
+args = parser.parse_args() # e.g. listings.parquet listings_enriched.parquet --workers 8
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory) # stage timings and memory, written to data/enrich_listings_run_report.json
+
+### 3. ENRICHMENT
+# the Code Postal, Conseil de Quartier and SeLoger Quartier (name and postal
+# code) of every listing, with all their results, see lookup_tables.py
+run.stage('load')
+layers = load_layers({name: data_dir / f'{name}_lookup.parquet' for name in ('cp', 'cq', 'sl')})
+run.stage('enrich')
+start = time.perf_counter()
+n_rows = enrich(
+    args.input,
+    args.output,
+    layers,
+    lon_col = args.lon_col,
+    lat_col = args.lat_col,
+    chunk_size = args.chunk_size,
+    workers = args.workers
+)
+print(f'{n_rows} listings enriched in {time.perf_counter() - start:.1f}s ({n_rows / (time.perf_counter() - start):.0f} per second)')
+
+run.finish()
@@ -0,0 +1,20 @@
+### 1. MODULE IMPORTS
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import shared_parser
+from common.lookup import load_layers, serve
+
+### 2. PATH DEFINITIONS
+code_dir = Path(__file__).parent
+data_dir = code_dir.parent / 'data'
+
+parser = shared_parser()
+parser.add_argument('--port', type = int, default = 8080, help = 'port of the local lookup server (default: 8080)')
+args = parser.parse_args() # e.g. --port 8000
+
+### 3. SERVER
+# e.g. curl 'http://127.0.0.1:8080/lookup?lon=2.3522&lat=48.8566'
+layers = load_layers({name: data_dir / f'{name}_lookup.parquet' for name in ('cp', 'cq', 'sl')}) # written by lookup_tables.py
+serve(layers, port = args.port)
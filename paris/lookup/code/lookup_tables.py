@@ -0,0 +1,67 @@
+### 1. MODULE IMPORTS
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import parse_args
+from common.lookup import Metrics, write_lookup_table
+from common.instrumentation import RunReport
+
+### 2. PATH DEFINITIONS
+code_dir = Path(__file__).parent
+data_dir = code_dir.parent / 'data'
+paris_dir = code_dir.parents[1]
+geoshapes_dir = paris_dir / 'geographic_units' / 'data'
+hs_dir = paris_dir / 'heat_stress' / 'data' # hs: heat stress
+sns_dir = paris_dir / 'heat_sensitivity' / 'data' # sns: heat sensitivity
+rc_dir = paris_dir / 'rent_control' / 'data' # rc: rent control
+fr_dir = paris_dir / 'flood_risk' / 'data' # fr: flood risk
+
+args = parse_args()
+data_dir.mkdir(exist_ok = True)
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory) # stage timings and memory, written to data/lookup_tables_run_report.json
+
+### 3. PARAMETERS
+rc_combination = ['rooms', 'epoque', 'furnished', 'housingType'] # one column per combination, e.g. rc_ref_2_inf1946_meuble_appartement
+units = { # layer: (geoshapes, keys, result files)
+    'cp': ( # cp: code postal
+        'codes_postaux_geoshapes.geojson',
+        ['code_postal'],
+        [
+            Metrics(hs_dir / 'codes_postaux_heat_stress.csv', 'hs'),
+            Metrics(sns_dir / 'codes_postaux_heat_sensitivity.csv', 'sns'),
+            Metrics(rc_dir / 'codes_postaux_rent_control.csv', 'rc', rc_combination),
+            Metrics(fr_dir / 'codes_postaux_flood_risk.csv', 'fr')
+        ]
+    ),
+    'cq': ( # cq: conseil de quartier
+        'conseils_de_quartier_geoshapes.geojson',
+        ['conseil_de_quartier'],
+        [
+            Metrics(hs_dir / 'conseils_de_quartier_heat_stress.csv', 'hs'),
+            Metrics(sns_dir / 'conseil_de_quartiers_heat_sensitivity.csv', 'sns'),
+            Metrics(rc_dir / 'conseils_de_quartier_rent_control.csv', 'rc', rc_combination),
+            Metrics(fr_dir / 'conseils_de_quartier_flood_risk.csv', 'fr')
+        ]
+    ),
+    'sl': ( # sl: seloger
+        'seloger_quartiers_geoshapes.geojson',
+        ['seloger_quartier', 'code_postal'],
+        [
+            Metrics(hs_dir / 'seloger_quartiers_heat_stress.csv', 'hs'),
+            Metrics(sns_dir / 'seloger_quartiers_heat_sensitivity.csv', 'sns'),
+            Metrics(rc_dir / 'seloger_quartiers_rent_control.csv', 'rc', rc_combination),
+            Metrics(fr_dir / 'seloger_quartiers_flood_risk.csv', 'fr')
+        ]
+    )
+}
+
+### 4. EXPORT
+# the polygons of every layer with all their results, in a single file each,
+# loaded by lookup_server.py (or common.lookup.load_layers)
+for name, (geoshapes, keys, metrics) in units.items():
+    run.stage(f'export_{name}')
+    print(f'Writing the {name} lookup table...')
+    write_lookup_table(geoshapes_dir / geoshapes, keys, metrics, data_dir / f'{name}_lookup.parquet')
+
+run.finish()
@@ -0,0 +1,129 @@
+### 1. MODULE IMPORTS
+import sys
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import shared_parser
+from common.instrumentation import RunReport
+from common.heat import HS_COLS, SNS_COLS, map_lcz_to_sensibilite, map_sensibilte_to_int
+from common.geoparquet import read_geoparquet
+from common.projection import read_projected
+from common.areal_interpolation import interpolate
+from common.weighted_statistics import weighted_statistics
+from common.rasterize import cached_raster, pixel_overlap_matrix, raster_spec
+
+### 2. PATH DEFINITIONS
+code_dir = Path(__file__).parent
+data_dir = code_dir.parent / 'data'
+paris_dir = code_dir.parents[1]
+geoshapes_dir = paris_dir / 'geographic_units' / 'data'
+hs_dir = paris_dir / 'heat_stress' / 'data' # hs: heat stress
+sns_dir = paris_dir / 'heat_sensitivity' / 'data' # sns: heat sensitivity
+
+parser = shared_parser()
+parser.add_argument('--level', choices = ['codes_postaux', 'conseils_de_quartier', 'seloger_quartiers'], default = 'codes_postaux', help = 'geographic level (default: codes_postaux)')
+parser.add_argument('--resolution', type = float, default = 25, help = 'side of the pixels, in metres (default: 25)')
+args = parser.parse_args() # e.g. --level conseils_de_quartier --resolution 10
+data_dir.mkdir(exist_ok = True)
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory) # stage timings and memory, written to data/raster_statistics_run_report.json
+
+### 3. MISC DEFINITIONS
+crs = 'EPSG:2154' # Lambert 93, in metres
+levels = { # level: (keys, exact heat stress, exact heat sensitivity, exact sns_int statistics)
+    'codes_postaux': (['code_postal'], 'codes_postaux_heat_stress.csv', 'codes_postaux_heat_sensitivity.csv', None),
+    'conseils_de_quartier': (['conseil_de_quartier'], 'conseils_de_quartier_heat_stress.csv', 'conseil_de_quartiers_heat_sensitivity.csv', 'sns_int_statistics.csv'),
+    'seloger_quartiers': (['seloger_quartier', 'code_postal'], 'seloger_quartiers_heat_stress.csv', 'seloger_quartiers_heat_sensitivity.csv', None)
+}
+
+### 4. DATA LOADING
+run.stage('load')
+keys, hs_file, sns_file, stats_file = levels[args.level]
+gdf_un = read_projected(geoshapes_dir / f'{args.level}_geoshapes.geojson', crs).set_index(keys) # un: units
+
+# the pixels cover the Codes Postaux (the whole of Île-de-France) at every level,
+# so the rasters of the IMUs and LCZs are shared by all levels
+gdf_cp = read_projected(geoshapes_dir / 'codes_postaux_geoshapes.geojson', crs) # cp: code postal
+spec = raster_spec(tuple(gdf_cp.total_bounds), args.resolution)
+print(f'{spec.width} x {spec.height} pixels of {args.resolution:.0f} m')
+
+gdf_hs = read_geoparquet(hs_dir / 'heat_stress_geoshapes.parquet', HS_COLS, bbox = tuple(gdf_cp.total_bounds)).to_crs(crs) # hs: heat stress
+gdf_lcz = ( # lcz: local climatic zone
+    gpd
+    .read_file(sns_dir / 'heat_sensitivity_geoshapes.zip')
+    .assign(
+        sns_str = lambda gdf: gdf.loc[:, 'lcz'].map(map_lcz_to_sensibilite),
+        sns_int = lambda gdf: gdf.loc[:, 'sns_str'].map(map_sensibilte_to_int)
+    )
+    .to_crs(crs)
+)
+gdf_lcz = pd.concat([gdf_lcz, 100 * pd.get_dummies(gdf_lcz.loc[:, 'sns_str'])], axis = 1)
+
+### 5. RASTERS
+# every layer is rasterized once (per version of its polygons and resolution) into
+# a memory-mapped file in .cache/rasters: the pixel takes the polygon of its centre
+run.stage('rasterize')
+hs_raster = cached_raster(gdf_hs, spec)
+lcz_raster = cached_raster(gdf_lcz, spec)
+
+### 6. COMPUTATION
+# the pixels of every unit and IMU (LCZ) make a sparse (#units x #IMUs) matrix of
+# areas, like the exact overlap matrix, so the same kernels give the results; the
+# units are not rasterized, as they may overlap (e.g. the SeLoger Quartiers)
+run.stage('overlay')
+un_geoms = gdf_un.geometry.to_numpy()
+hs_matrix = pixel_overlap_matrix(un_geoms, hs_raster, len(gdf_hs), spec)
+lcz_matrix = pixel_overlap_matrix(un_geoms, lcz_raster, len(gdf_lcz), spec)
+
+run.stage('aggregate')
+df_hs = pd.DataFrame( # weighted averages, with missing values as zeros, like common.areal_interpolation.weighted_averages
+    data = interpolate(hs_matrix, np.nan_to_num(gdf_hs.loc[:, HS_COLS].to_numpy(dtype = np.float64))),
+    index = gdf_un.index,
+    columns = HS_COLS
+)
+df_sns = pd.DataFrame( # means of the LCZ variables and shares of every sensitivity category
+    data = interpolate(lcz_matrix, np.nan_to_num(gdf_lcz.loc[:, SNS_COLS].to_numpy(dtype = np.float64))),
+    index = gdf_un.index,
+    columns = SNS_COLS
+)
+lcz_matrix = lcz_matrix.tocoo()
+df_st = weighted_statistics( # st: statistics, weighted mean, median, mode... of sns_int
+    units = lcz_matrix.row,
+    values = gdf_lcz.loc[:, 'sns_int'].to_numpy()[lcz_matrix.col],
+    weights = lcz_matrix.data,
+    n_units = len(gdf_un),
+    delta_reference = 'mode'
+)
+df_st.index = gdf_un.index
+print(f'{len(gdf_un)} {args.level.replace("_", " ").title()} done')
+
+### 7. DEVIATION FROM THE EXACT RESULTS
+# absolute difference with the results of the vector overlays, for every variable
+results = {
+    'heat_stress': (df_hs, hs_dir / hs_file),
+    'heat_sensitivity': (df_sns, sns_dir / sns_file),
+    'sns_int_statistics': (df_st, sns_dir / stats_file if stats_file else None)
+}
+run.stage('deviation')
+rows = []
+for topic, (df_raster, exact_path) in results.items():
+    if exact_path is None or not exact_path.exists():
+        continue
+    df_exact = pd.read_csv(exact_path, dtype = {key: str for key in keys}).set_index(keys)
+    for col in df_raster.columns.intersection(df_exact.columns):
+        errors = (df_raster.loc[:, col] - df_exact.loc[:, col].reindex(df_raster.index)).abs().dropna()
+        rows.append((topic, col, len(errors), errors.mean(), errors.quantile(0.95), errors.max(), df_exact.loc[:, col].std()))
+
+df_dv = pd.DataFrame(data = rows, columns = ['topic', 'variable', 'n_units', 'mean_abs_error', 'p95_abs_error', 'max_abs_error', 'std_across_units']) # dv: deviation
+print(df_dv.to_string(index = False))
+
+### 8. EXPORTS
+run.stage('export')
+df_hs.to_csv(data_dir / f'{args.level}_heat_stress_raster.csv')
+df_sns.to_csv(data_dir / f'{args.level}_heat_sensitivity_raster.csv')
+df_st.to_csv(data_dir / f'{args.level}_sns_int_statistics_raster.csv')
+df_dv.to_csv(data_dir / f'{args.level}_raster_deviation.csv', index = False)
+
+run.finish()
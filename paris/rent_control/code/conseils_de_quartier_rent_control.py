@@ -1,10 +1,19 @@
 ### 1. PATH DEFINITIONS
-import colorcet
+import sys
+import shapely
 import numpy as np
 import pandas as pd
 import geopandas as gpd
 from pathlib import Path
-from matplotlib import pyplot as plt
+
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import parse_args
+from common.instrumentation import RunReport
+from common.maps import export_maps
+from common.overlap_weights import overlap_matrix
+from common.projection import read_projected
+from common.areal_interpolation import interpolate_tensor
+from common.rent_control import fill_periods, reference_tensor, tensor_to_frame
 
 ### 2. PATH DEFINITIONS
 code_dir = Path(__file__).parent
@@ -12,6 +21,9 @@ data_dir = code_dir.parent / 'data'
 figures_dir = code_dir.parent / 'figures'
 geoshapes_dir = code_dir.parent.parent / 'geographic_units' / 'data'
 
+args = parse_args() # e.g. --workers 32 to run the overlays on 32 processes
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory, unit_timings = args.unit_timings) # stage timings and memory, written to data/conseils_de_quartier_rent_control_run_report.json
+
 ### 3. CONSTANTS
 cols = [
     'city', 
@@ -45,6 +57,7 @@ EPOQUE = ['_inf1946', '_1946-1970', '_1971-1990', '_sup1990']
 FURNISHED = ['_meuble', '_non-meuble']
 
 ### 4. CONCATENATION OF ALL THE GDFs
+run.stage('load')
 gdfs = []
 for city in CITY:
     for period in PERIOD[city]:
@@ -90,41 +103,31 @@ gdf_rc = ( # rc: rent control
 )
 
 ### 5. JOIN WITH CONSEILS DE QUARTIER
-gdf_cq = gpd.read_file(geoshapes_dir / 'conseils_de_quartier_geoshapes.geojson').set_index('conseil_de_quartier') # cq: conseil de quartier
+gdf_cq = read_projected(geoshapes_dir / 'conseils_de_quartier_geoshapes.geojson').set_index('conseil_de_quartier') # cq: conseil de quartier
 
+# the units are read in Lambert 93, reprojected once and cached (see common.projection),
+# and the few zones are reprojected to it, so the areas of the overlaps are in m²
 gdf_zn = ( # zn: zone
     gdf_rc
     .dissolve(by = 'idZone')
     .loc[:, ['geometry']]
+    .to_crs(gdf_cq.crs)
 )
 
-## 5.1. SMALL EXERCISE TO SEE CORRESPONDANCE QUALITY
-zns = [] # zones (ID)
-frac_in_zns = [] # fraction of area of the Conseil de Quartier inside the zone
-for cq in gdf_cq.index:
-    cq_shape = gdf_cq.loc[cq, 'geometry']
+## 5.1. OVERLAP MATRIX
+run.stage('overlay')
+# area of the intersection of every Conseil de Quartier with every zone. It is stored on disk,
+# keyed by the content of both geotables, so new rent control values on the same
+# geometries do not trigger any geometry work
+ol_matrix = overlap_matrix(gdf_cq, gdf_zn, workers = args.workers) # ol: overlap. Is a sparse (#CdQ x #Zones) matrix
 
-    gdf_overlap = gdf_zn.assign(frac_in_zn = lambda df: df.loc[:, 'geometry'].apply(lambda zn_shape: zn_shape.intersection(cq_shape).area / cq_shape.area))
-    zn_max_frac_in_zn = gdf_overlap.loc[:, 'frac_in_zn'].idxmax() # zone with maximum overlap
-    max_frac_in_zn = gdf_overlap.loc[:, 'frac_in_zn'].max() # fraction of area in the zone with maximum overlap
-    
-    zns.append(zn_max_frac_in_zn)
-    frac_in_zns.append(max_frac_in_zn)
-
-## 5.2. TRANSLATION OF RENT CONTROL BY ZONE TO BY CONSEIL DE QUARTIER
-overlaps = [] # each column corresponds to a CdQ, each row corresponds to the % of CdQ in each rent control zone 
-for cq in gdf_cq.index:
-    cq_shape = gdf_cq.loc[cq, 'geometry']
-    overlap = gdf_zn.loc[:, 'geometry'].apply(lambda zn_shape: zn_shape.intersection(cq_shape).area / cq_shape.area).rename(cq)
-    overlaps.append(overlap)
-    
-df_ol = pd.concat(overlaps, axis = 1).sort_values(by = 'idZone')  # ol: overlap. Is a (#CdQ x #Zones) matrix (after being transposed in the next line)
-df_ol = (df_ol / df_ol.sum()).T # here I divide by the sum so that all weights add to 1
-
-# filter for last rent control values 
-most_recent_periods = set([l[-1] for k, l in PERIOD.items()])
-gdf_rc = gdf_rc.loc[(gdf_rc.loc[:, 'period'].isin(most_recent_periods))]
+## 5.2. SMALL EXERCISE TO SEE CORRESPONDANCE QUALITY
+run.stage('aggregate')
+frac_in_zn = ol_matrix.toarray() / shapely.area(gdf_cq.geometry.to_numpy())[:, np.newaxis] # fraction of area of the Conseil de Quartier inside each zone
+zns = gdf_zn.index[frac_in_zn.argmax(axis = 1)] # zone with maximum overlap
+frac_in_zns = frac_in_zn.max(axis = 1) # fraction of area in the zone with maximum overlap
 
+## 5.3. TRANSLATION OF RENT CONTROL BY ZONE TO BY CONSEIL DE QUARTIER
 # for Paris, app. and msn values are the same, but not for the others.
 # so duplicate the rows for Paris  and fill them with app. and msn.
 gdf_rc_non_paris = gdf_rc.query('city != "paris"')
@@ -147,31 +150,31 @@ gdf_rc = pd.concat(
     ]
 )
 
-dfs_rc = []
-for rooms in ROOMS:
-    for epoque in EPOQUE:
-        for furnished in FURNISHED: 
-            for housing_type in {housing_type for housing_type in HOUSING_TYPE.values() for housing_type in housing_type if housing_type}:
-                # for each combination of rooms, epoque and furnished, calculate the weighted average of the rent control values, for each CdQ.
-                # this is done by matrix multiplication: the rent control values of all zones are weighted by the % they contain of a given CdQ.
-                df_tmp = (
-                    gdf_rc
-                    .query(f'rooms == {rooms[1:]} and epoque == "{epoque[1:]}" and furnished == "{furnished[1:]}" and housingType == "{housing_type[1:]}"')
-                    .loc[:, ['idZone'] + float_cols]
-                    .drop_duplicates()
-                    .sort_values(by = 'idZone')
-                    .set_index('idZone')
-                )
-                df_rc = df_ol @ df_tmp
-                df_rc.loc[:, 'rooms'] = rooms[1:]
-                df_rc.loc[:, 'epoque'] = epoque[1:]
-                df_rc.loc[:, 'furnished'] = furnished[1:]
-                df_rc.loc[:, 'housingType'] = housing_type[1:]
-                df_rc = df_rc.rename_axis(gdf_cq.index.names)
-                
-                dfs_rc.append(df_rc)
+# hold the rent control values of all zones as a dense tensor, indexed by (period, rooms, epoque,
+# furnished, housingType, idZone). The weighted averages of every CdQ, for every combination
+# and period, then come out of a single sparse matrix product
+coords = {
+    'period': pd.Index(sorted({period for periods in PERIOD.values() for period in periods})),
+    'rooms': pd.Index([int(rooms[1:]) for rooms in ROOMS]),
+    'epoque': pd.Index([epoque[1:] for epoque in EPOQUE]),
+    'furnished': pd.Index([furnished[1:] for furnished in FURNISHED]),
+    'housingType': pd.Index(['appartement', 'maison'])
+}
+rc_tensor = reference_tensor( # every city keeps its values until it publishes new ones, so fill in the periods of the other cities
+    df = fill_periods(gdf_rc.drop(columns = 'geometry'), PERIOD),
+    coords = coords | {'idZone': gdf_zn.index},
+    value_cols = float_cols
+)
+df_rc_ts = tensor_to_frame( # ts: time series
+    tensor = interpolate_tensor(ol_matrix, rc_tensor),
+    coords = coords | {'conseil_de_quartier': gdf_cq.index},
+    value_cols = float_cols
+).set_index(gdf_cq.index.names)
+
+df_rc = df_rc_ts.loc[df_rc_ts.loc[:, 'period'] == coords['period'].max()] # most recent values of every city
 
 ### 6. EXPORTS
+run.stage('export')
 (
     pd
     .DataFrame(data = {'conseil_de_quartier': gdf_cq.index, 'zn': zns, 'frac_in_zn': frac_in_zns})
@@ -181,34 +184,46 @@ for rooms in ROOMS:
 )
 
 (
-    pd
-    .concat(dfs_rc) # concatenate all room, epoque, furnished, housing type combinations
+    df_rc
     .loc[:, ['rooms', 'epoque', 'furnished', 'housingType'] + float_cols]
     .to_csv(data_dir / 'conseils_de_quartier_rent_control.csv')
 )
 
-### 7. MAPS
-gdf_map = gdf_cq.reset_index().merge(dfs_rc[0], how = 'inner', on = 'conseil_de_quartier')
-gdf_map['ref'] = gdf_map['ref'].astype(float)
-gdf_map.explore('ref', cmap = 'cool').save(figures_dir / 'rent_control_map_per_conseil_de_quartier.html')
-
-cmap = plt.get_cmap('cet_glasbey_hv')
-fig, ax = plt.subplots()
-gdf_zn.plot(
-    ax = ax, 
-    cmap = cmap, 
-    column = np.array(gdf_zn.index), 
-    legend = True, 
-    legend_kwds = {
-        'title': 'Rent Control Zones',     
-        'bbox_to_anchor': (1, 1), 
-        'loc': 'upper left'},
-    categorical = True,
-    )
-gdf_cq.boundary.plot(ax = ax, color = 'k')
+(
+    df_rc_ts
+    .loc[:, ['period', 'rooms', 'epoque', 'furnished', 'housingType'] + float_cols]
+    .dropna() # before their first publication, cities have no values
+    .to_csv(data_dir / 'conseils_de_quartier_rent_control_timeseries.csv')
+)
 
-plt.title('Conseil de Quartier - Rent Control Zone Overlap')
-plt.xlabel('Longitude')
-plt.ylabel('Latitude')
-plt.figtext(0.05, -0.1, 'Colours denote Rent Control Zones.\nBlack lines denote Conseils de Quartier.\n', ha = 'left')
-plt.savefig(figures_dir / 'cq_rcz_overlap_map.pdf', bbox_inches = 'tight')
+### 7. MAPS
+if not args.no_figures: # with --no-figures, only the data files are written, and the plotting libraries are never imported
+    run.stage('figures')
+    import colorcet # registers the cet_ colormaps of matplotlib
+    from matplotlib import pyplot as plt
+
+    df_map = df_rc.query(f'rooms == {ROOMS[0][1:]} and epoque == "{EPOQUE[0][1:]}" and furnished == "{FURNISHED[0][1:]}" and housingType == "appartement"').loc[:, 'ref'].astype(float) # units outside the rent control zones are left without data
+    export_maps(gdf_cq, {'rent_control_map_per_conseil_de_quartier': df_map}, figures_dir, 'conseils_de_quartier', cmap = 'cool')
+
+    cmap = plt.get_cmap('cet_glasbey_hv')
+    fig, ax = plt.subplots()
+    gdf_zn.plot(
+        ax = ax, 
+        cmap = cmap, 
+        column = np.array(gdf_zn.index), 
+        legend = True, 
+        legend_kwds = {
+            'title': 'Rent Control Zones',     
+            'bbox_to_anchor': (1, 1), 
+            'loc': 'upper left'},
+        categorical = True,
+        )
+    gdf_cq.boundary.plot(ax = ax, color = 'k')
+
+    plt.title('Conseil de Quartier - Rent Control Zone Overlap')
+    plt.xlabel('Longitude')
+    plt.ylabel('Latitude')
+    plt.figtext(0.05, -0.1, 'Colours denote Rent Control Zones.\nBlack lines denote Conseils de Quartier.\n', ha = 'left')
+    plt.savefig(figures_dir / 'cq_rcz_overlap_map.pdf', bbox_inches = 'tight')
+
+run.finish()
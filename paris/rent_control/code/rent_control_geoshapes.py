@@ -1,11 +1,23 @@
 ### 1. MODULE IMPORTS
+import sys
 import shutil
 import geopandas as gpd
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import shared_parser
+from common.fetch import fetch_all
+from common.instrumentation import RunReport
+
 ### 2. PATH DEFINITIONS
 code_dir = Path(__file__).parent
 data_dir = code_dir.parent / 'data'
+kml_dir = data_dir / 'rent_control_kml'
+
+parser = shared_parser()
+parser.add_argument('--base-url', default = None, help = 'download from this mirror (or local server) instead of the official website')
+args = parser.parse_args() # e.g. --base-url http://localhost:8000 to download from a local copy of the website
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory) # stage timings and memory, written to data/rent_control_geoshapes_run_report.json
 
 ### 3. CONSTANTS
 CITY = ['paris', 'plaine-commune', 'est-ensemble']
@@ -24,18 +36,35 @@ EPOQUE = ['_inf1946', '_1946-1970', '_1971-1990', '_sup1990']
 FURNISHED = ['_meuble', '_non-meuble']
 
 ### 4. DATA DOWNLOADS
+run.stage('download')
 ## Rent control data and geoshapes
 ## URL can be found by scanning the API requests (inspect page -> network) launched when using http://www.referenceloyer.drihl.ile-de-france.developpement-durable.gouv.fr/paris/
+base_url = args.base_url or 'http://www.referenceloyer.drihl.ile-de-france.developpement-durable.gouv.fr'
+
+jobs = []
 for city in CITY:
     for period in PERIOD[city]:
         for housing_type in HOUSING_TYPE[city]:
             for rooms in ROOMS:
                 for epoque in EPOQUE:
                     for furnished in FURNISHED:   
-                        url = f'http://www.referenceloyer.drihl.ile-de-france.developpement-durable.gouv.fr/{city}/kml/{period}/drihl_medianes{housing_type}{rooms}{epoque}{furnished}.kml'
-                        destination = data_dir / 'rent_control_geoshapes' / city / period / f'{housing_type}{rooms}{epoque}{furnished}.geojson'[1:] # ignore leading underscore
-                        
-                        print('Fetching', url)
-                        
-                        destination.parent.mkdir(parents = True, exist_ok = True) # create directory
-                        gpd.read_file(url).to_file(destination, driver = 'GeoJSON')
+                        name = f'{housing_type}{rooms}{epoque}{furnished}'[1:] # ignore leading underscore
+                        url = f'{base_url}/{city}/kml/{period}/drihl_medianes{housing_type}{rooms}{epoque}{furnished}.kml'
+                        jobs.append((url, kml_dir / city / period / f'{name}.kml'))
+
+# several hundred small files: download them concurrently, over kept-alive connections,
+# at most 8 at a time against the website. Files already downloaded are skipped, so an
+# interrupted run can simply be restarted
+print(f'Fetching {len(jobs)} KML files from', base_url)
+fetch_all(jobs, workers = 16, per_host = 8)
+
+## Conversion to GeoJSON
+run.stage('export')
+for url, kml_path in jobs:
+    destination = data_dir / 'rent_control_geoshapes' / kml_path.relative_to(kml_dir).with_suffix('.geojson')
+    destination.parent.mkdir(parents = True, exist_ok = True) # create directory
+    gpd.read_file(kml_path).to_file(destination, driver = 'GeoJSON')
+
+shutil.rmtree(kml_dir) # delete the KML files, once they are all converted
+
+run.finish()
@@ -1,11 +1,16 @@
 ### 1. PATH DEFINITIONS
-import colorcet
+import sys
 import numpy as np
 import pandas as pd
-from tqdm import tqdm
 import geopandas as gpd
 from pathlib import Path
-from matplotlib import pyplot as plt
+
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import parse_args
+from common.instrumentation import RunReport
+from common.overlap_weights import overlap_matrix
+from common.projection import read_projected
+from common.weighted_statistics import weighted_statistics
 
 pd.set_option('future.no_silent_downcasting', True)
 
@@ -15,6 +20,9 @@ data_dir = code_dir.parent / 'data'
 figures_dir = code_dir.parent / 'figures'
 geoshapes_dir = code_dir.parent.parent / 'geographic_units' / 'data'
 
+args = parse_args() # e.g. --workers 32 to run the overlays on 32 processes
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory, unit_timings = args.unit_timings) # stage timings and memory, written to data/spatial_analysis_run_report.json
+
 ### 3. CONSTANTS
 cols = [
     'city', 
@@ -48,6 +56,7 @@ EPOQUE = ['_inf1946', '_1946-1970', '_1971-1990', '_sup1990']
 FURNISHED = ['_meuble', '_non-meuble']
 
 ### 4. CONCATENATION OF ALL THE GDFs
+run.stage('load')
 gdfs = []
 for city in CITY:
     for period in PERIOD[city]:
@@ -93,24 +102,22 @@ gdf_rc = ( # rc: rent control
 )
 
 ### 5. JOIN WITH SELOGER QUARTIERS
-gdf_sl = gpd.read_file(geoshapes_dir / 'seloger_quartiers_geoshapes.geojson').set_index(['seloger_quartier', 'code_postal']) # sl: SeLoger
+gdf_sl = read_projected(geoshapes_dir / 'seloger_quartiers_geoshapes.geojson').set_index(['seloger_quartier', 'code_postal']) # sl: SeLoger
 
+# the units are read in Lambert 93, reprojected once and cached (see common.projection),
+# and the few zones are reprojected to it, so the areas of the overlaps are in m²
 gdf_zn = ( # zn: zone
     gdf_rc
     .dissolve(by = 'idZone')
     .loc[:, ['geometry']]
+    .to_crs(gdf_sl.crs)
 )
    
 ## 5.2. TRANSLATION OF RENT CONTROL BY ZONE TO BY CODE POSTAL
-overlaps = [] # each column corresponds to a SeLoger Quartier, each row corresponds to the % of SeLoger Quartier in each rent control zone 
-for sl in gdf_sl.index:
-    sl_shape = gdf_sl.loc[sl, 'geometry']
-    overlap = gdf_zn.loc[:, 'geometry'].apply(lambda zn_shape: zn_shape.intersection(sl_shape).area / sl_shape.area).rename(sl)
-    overlaps.append(overlap)
-    
-df_ol = pd.concat(overlaps, axis = 1).sort_values(by = 'idZone') # ol: overlap. Is a (#SeLoger Quartier x #Zones) matrix (after being transposed in the next line)
-df_ol = (df_ol / df_ol.sum()).T # here I divide by the sum so that all weights add to 1
+run.stage('overlay')
+ol_matrix = overlap_matrix(gdf_sl, gdf_zn, workers = args.workers).tocoo() # ol: overlap. Is a sparse (#SeLoger Quartier x #Zones) matrix, stored on disk
 
+run.stage('aggregate')
 # filter for last rent control values 
 most_recent_periods = set([l[-1] for k, l in PERIOD.items()])
 gdf_rc = gdf_rc.loc[(gdf_rc.loc[:, 'period'].isin(most_recent_periods))]
@@ -143,7 +150,7 @@ for rooms in ROOMS:
         for furnished in FURNISHED: 
             for housing_type in {housing_type for housing_type in HOUSING_TYPE.values() for housing_type in housing_type if housing_type}:
                 # for each combination of rooms, epoque and furnished, calculate the weighted average of the rent control values, for each SLQ.
-                # this is done by matrix multiplication: the rent control values of all zones are weighted by the % they contain of a given SLQ.
+                # the rent control values of all zones are weighted by the % they contain of a given SLQ.
                 df_tmp = (
                     gdf_rc
                     .query(f'rooms == {rooms[1:]} and epoque == "{epoque[1:]}" and furnished == "{furnished[1:]}" and housingType == "{housing_type[1:]}"')
@@ -152,40 +159,17 @@ for rooms in ROOMS:
                     .sort_values(by = 'idZone')
                     .set_index('idZone')
                 )
-                df_rc = (df_ol @ df_tmp).rename(columns = {'ref': 'mean'})
-
-                
-                for sl in tqdm(df_ol.index, desc = f'{rooms}{epoque}{furnished}{housing_type}'):
-                    df_sl = (
-                        pd
-                        .concat([df_ol.loc[sl], df_tmp], axis = 1)
-                        .loc[df_ol.loc[sl] > 0]
-                        .rename(columns = {sl: 'weight'})
-                        .sort_values('ref')
-                        .assign(cumsum = lambda df: df.loc[:, 'weight'].cumsum().round(5))
-                    )
-                    
-                    df_rc.loc[sl, 'median'] = df_sl.loc[df_sl.loc[:, 'cumsum'] >= 0.5, 'ref'].iloc[0]
-                    df_rc.loc[sl, 'mode'] = df_sl.groupby(by = 'ref')['weight'].sum().idxmax().item()     
-                    
-                    # now the weighted standard deviation, like here: https://www.itl.nist.gov/div898/software/dataplot/refman2/ch2/weightsd.pdf
-                    N_positive = df_sl.shape[0]
-                    numerator = ((df_sl.loc[:, 'ref'] - df_rc.loc[sl, 'mean']) ** 2).multiply(df_sl.loc[:, 'weight'], axis = 0).sum()
-                    denominator = (N_positive - 1) * df_sl.loc[:, 'weight'].sum() / N_positive
-                    if denominator < 10 ** -8:
-                        df_rc.loc[sl, 'std'] = 0.0
-                    else:
-                        df_rc.loc[sl, 'std'] = (numerator / denominator) ** 0.5
-                    
-                    df_sl.loc[:, 'delta'] = df_sl.loc[:, 'ref'] - df_rc.loc[sl, 'mean']
-                    
-                    df_rc.loc[sl, 'mean_delta'] = df_sl.loc[:, 'delta'].multiply(df_sl.loc[:, 'weight'], axis = 0).sum() 
-                    df_rc.loc[sl, 'median_delta'] = df_sl.loc[df_sl.loc[:, 'cumsum'] >= 0.5, 'delta'].iloc[0]
-                    df_rc.loc[sl, 'mode_delta'] = df_sl.groupby(by = 'delta')['weight'].sum().idxmax().item() 
-    
-                    for cutoff in (0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0):
-                        df_rc.loc[sl, f'{cutoff}_delta'] = df_sl.loc[df_sl.loc[:, 'cumsum'] >= cutoff, 'delta'].iloc[0]  
-                
+                # the statistics of the rent control values of the zones, weighted by the area
+                # they share with each SLQ, for all SLQs at once
+                df_rc = weighted_statistics(
+                    units = ol_matrix.row,
+                    values = df_tmp.loc[:, 'ref'].reindex(gdf_zn.index).to_numpy()[ol_matrix.col],
+                    weights = ol_matrix.data,
+                    n_units = gdf_sl.shape[0],
+                    delta_reference = 'mean'
+                )
+                df_rc.index = gdf_sl.index
+                df_rc.loc[:, 'std'] = df_rc.loc[:, 'std'].fillna(0.0) # SLQs within a single zone have no deviation
                 
                 df_rc.loc[:, 'rooms'] = rooms[1:]
                 df_rc.loc[:, 'epoque'] = epoque[1:]
@@ -196,8 +180,11 @@ for rooms in ROOMS:
                 dfs_rc.append(df_rc)
 
 ### 6. EXPORTS
+run.stage('export')
 (
     pd
     .concat(dfs_rc) # concatenate all room, epoque, furnished, housing type combinations
     .to_csv(data_dir / 'ref_statistics.csv')
 )
+
+run.finish()
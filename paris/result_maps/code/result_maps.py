@@ -0,0 +1,82 @@
+### 1. MODULE IMPORTS
+import sys
+import pandas as pd
+import geopandas as gpd
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import parse_args
+from common.maps import export_levels
+from common.instrumentation import RunReport
+
+### 2. PATH DEFINITIONS
+code_dir = Path(__file__).parent
+data_dir = code_dir.parent / 'data'
+paris_dir = code_dir.parents[1]
+geoshapes_dir = paris_dir / 'geographic_units' / 'data'
+
+args = parse_args() # e.g. --workers 4 to write the maps of several levels at the same time
+data_dir.mkdir(exist_ok = True)
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory) # stage timings and memory, written to data/result_maps_run_report.json
+
+### 3. PARAMETERS
+# the interactive maps of the aggregation scripts, rebuilt from their saved results,
+# with the same names and in the same figures folders: the scripts can run with
+# --no-figures, and the maps are made once all the results are there
+levels = { # level: (geoshapes, keys, name of a unit in the map files, max zoom of the maps)
+    'codes_postaux': ('codes_postaux_geoshapes.geojson', ['code_postal'], 'code_postal', 14),
+    'conseils_de_quartier': ('conseils_de_quartier_geoshapes.geojson', ['conseil_de_quartier'], 'conseil_de_quartier', 15),
+    'seloger_quartiers': ('seloger_quartiers_geoshapes.geojson', ['seloger_quartier', 'code_postal'], 'seloger_quartier', 15)
+}
+rc_first_combination = 'rooms == 1 and epoque == "inf1946" and furnished == "meuble" and housingType == "appartement"'
+results = [ # (topic, level, result file, rows to map, {map: column, None for the outline only}, colormap)
+    *[
+        ('heat_stress', level, f'{level}_heat_stress.csv', None, {'map_per_{unit}': None, 'fluchaleur_map_per_{unit}': 'fluchaleur', 'vulnj_note_map_per_{unit}': 'vulnj_note', 'vulnn_note_map_per_{unit}': 'vulnn_note'}, 'viridis')
+        for level in levels
+    ],
+    *[
+        ('heat_sensitivity', level, file, None, {'map_per_{unit}': None, 'tfs_map_per_{unit}': 'Très Forte Sensibilité', 'bur_map_per_{unit}': 'bur'}, 'viridis')
+        for level, file in zip(levels, ['codes_postaux_heat_sensitivity.csv', 'conseil_de_quartiers_heat_sensitivity.csv', 'seloger_quartiers_heat_sensitivity.csv'])
+    ],
+    *[
+        ('rent_control', level, f'{level}_rent_control.csv', rc_first_combination, {'rent_control_map_per_{unit}': 'ref'}, 'cool')
+        for level in levels
+    ],
+    *[
+        ('flood_risk', level, f'{level}_flood_risk.csv', None, {f'{level}_flood_risk': 'prop_at_flood_risk'}, 'viridis')
+        for level in levels
+    ]
+]
+
+### 4. DATA LOADING
+run.stage('load')
+gdfs, jobs = {}, [] # geotables of the levels, read once
+for topic, level, file, rows, maps, cmap in results:
+    geoshapes, keys, unit, max_zoom = levels[level]
+    path = paris_dir / topic / 'data' / file
+    if not (path.exists() and (geoshapes_dir / geoshapes).exists()):
+        print(f'No {file} yet, skipping its maps')
+        continue
+    if level not in gdfs:
+        gdfs[level] = gpd.read_file(geoshapes_dir / geoshapes).set_index(keys)
+
+    df = pd.read_csv(path, dtype = {key: str for key in keys})
+    assert set(keys) <= set(df.columns), f'{path.name} has no {", ".join(keys)} column, it was written by an older version of its script: rerun the script of {topic}/code that writes it first!'
+    if rows is not None:
+        df = df.query(rows)
+    df = df.set_index(keys)
+    jobs.append({
+        'gdf_units': gdfs[level],
+        'maps': {name.format(unit = unit): None if col is None else df.loc[:, col] for name, col in maps.items()},
+        'figures_dir': paris_dir / topic / 'figures',
+        'name': level,
+        'max_zoom': max_zoom,
+        'cmap': cmap
+    })
+
+### 5. MAPS
+run.stage('figures')
+print(f'Exporting the maps of {len(jobs)} results...')
+export_levels(jobs, workers = args.workers)
+
+run.finish()
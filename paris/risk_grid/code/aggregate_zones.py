@@ -0,0 +1,41 @@
+### 1. MODULE IMPORTS
+import sys
+import geopandas as gpd
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import shared_parser
+from common.instrumentation import RunReport
+from common.risk_grid import aggregate, averages, coarsen, read_grid
+
+### 2. PATH DEFINITIONS
+code_dir = Path(__file__).parent
+data_dir = code_dir.parent / 'data'
+
+parser = shared_parser()
+parser.add_argument('zones', type = Path, help = 'geotable of the zones (IRIS, arrondissements, sales territories...), in any format and crs')
+parser.add_argument('output', type = Path, help = 'csv of the averages of every zone')
+parser.add_argument('--key', nargs = '+', required = True, help = 'column(s) that identify the zones, e.g. --key code_iris')
+parser.add_argument('--factor', type = int, default = 1, help = 'aggregate from cells factor times larger than those of the grid, faster but less accurate (default: 1)')
+args = parser.parse_args() # e.g. iris.geojson iris_risks.csv --key code_iris
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory) # stage timings and memory, written to data/aggregate_zones_run_report.json
+
+### 3. AGGREGATION
+# no overlay: every cell of the grid goes to the zone that contains its centre,
+# see risk_grid_accuracy.csv for the error at every cell size
+run.stage('load')
+df_grid = read_grid(data_dir / 'risk_grid.parquet')
+if args.factor > 1:
+    df_grid = coarsen(df_grid, args.factor)
+
+gdf_zn = gpd.read_file(args.zones).set_index(args.key) # zn: zone
+
+run.stage('aggregate')
+df_av = averages(aggregate(df_grid, gdf_zn)) # av: averages
+print(f'{len(gdf_zn)} zones aggregated from cells of {df_grid.attrs["cell_size"]:.0f} m')
+
+### 4. EXPORT
+run.stage('export')
+df_av.to_csv(args.output)
+
+run.finish()
@@ -0,0 +1,140 @@
+### 1. MODULE IMPORTS
+import sys
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[3])) # repository root, home of the common package
+from common.cli import shared_parser
+from common.instrumentation import RunReport
+from common.heat import HS_COLS, SNS_COLS, map_lcz_to_sensibilite
+from common.geoparquet import read_geoparquet
+from common.flood_exposure import flood_areas, read_parts
+from common.projection import read_projected
+from common.risk_grid import aggregate, averages, cell_frame, coarsen, grid_cells, layer_sums, merge_layers, write_grid
+
+### 2. PATH DEFINITIONS
+code_dir = Path(__file__).parent
+data_dir = code_dir.parent / 'data'
+paris_dir = code_dir.parents[1]
+geoshapes_dir = paris_dir / 'geographic_units' / 'data'
+hs_dir = paris_dir / 'heat_stress' / 'data' # hs: heat stress
+sns_dir = paris_dir / 'heat_sensitivity' / 'data' # sns: heat sensitivity
+rc_dir = paris_dir / 'rent_control' / 'data' # rc: rent control
+fr_dir = paris_dir / 'flood_risk' / 'data' # fr: flood risk
+
+parser = shared_parser()
+parser.add_argument('--cell-size', type = float, default = 100, help = 'side of the grid cells, in metres (default: 100)')
+args = parser.parse_args() # e.g. --workers 32 to run the overlays on 32 processes
+data_dir.mkdir(exist_ok = True)
+run = RunReport(__file__, data_dir, trace_memory = args.trace_memory, unit_timings = args.unit_timings) # stage timings and memory, written to data/risk_grid_run_report.json
+
+### 3. MISC DEFINITIONS
+crs = 'EPSG:2154' # Lambert 93, in metres
+
+### 4. GRID
+run.stage('grid')
+# the grid covers the bounding box of the Codes Postaux (the whole of Île-de-France),
+# the cells covered by no layer are dropped once the layers are overlaid
+gdf_cp = read_projected(geoshapes_dir / 'codes_postaux_geoshapes.geojson', crs).set_index('code_postal') # cp: code postal
+gdf_cells = grid_cells(tuple(gdf_cp.total_bounds), args.cell_size, crs)
+print(f'{len(gdf_cells)} cells of {args.cell_size:.0f} m')
+
+### 5. OVERLAYS
+# every source layer is overlaid onto the cells once; the overlap matrices are
+# cached like those of the geographic units
+dfs = []
+
+run.stage('overlay_heat_stress')
+print('Overlaying the Heat Stress geotable...')
+gdf_hs = read_geoparquet(hs_dir / 'heat_stress_geoshapes.parquet', HS_COLS, bbox = tuple(gdf_cp.total_bounds)).to_crs(crs)
+dfs.append(layer_sums(gdf_cells, gdf_hs, 'hs', HS_COLS, workers = args.workers))
+del gdf_hs
+
+run.stage('overlay_heat_sensitivity')
+print('Overlaying the Heat Sensitivity geotable...')
+gdf_lcz = gpd.read_file(sns_dir / 'heat_sensitivity_geoshapes.zip') # lcz: local climatic zone
+gdf_lcz = pd.concat(
+    [gdf_lcz, 100 * pd.get_dummies(gdf_lcz.loc[:, 'lcz'].map(map_lcz_to_sensibilite))],
+    axis = 1
+).to_crs(crs)
+dfs.append(layer_sums(gdf_cells, gdf_lcz, 'sns', SNS_COLS, workers = args.workers))
+del gdf_lcz
+
+run.stage('overlay_rent_control')
+print('Overlaying the Rent Control zones...')
+# the zones do not change between periods and combinations, so the zones of the
+# first combination of the last period of every city are enough. Every cell gets
+# the share of its area in each zone, from which the rent control values of any
+# combination follow (see common.areal_interpolation.interpolate_tensor)
+gdf_zn = ( # zn: zone
+    pd
+    .concat([
+        gpd.read_file(sorted(sorted((rc_dir / 'rent_control_geoshapes' / city).iterdir())[-1].glob('*.geojson'))[0])
+        for city in ('paris', 'plaine-commune', 'est-ensemble')
+    ])
+    .pipe(lambda gdf: gdf.set_geometry(gdf.force_2d().buffer(0))) # buffer(0), like in the *_rent_control.py scripts
+    .dissolve(by = 'idZone')
+    .loc[:, ['geometry']]
+    .to_crs(crs)
+)
+zone_cols = [f'zone_{zone}' for zone in gdf_zn.index]
+gdf_zn.loc[:, zone_cols] = np.eye(len(gdf_zn))
+dfs.append(layer_sums(gdf_cells, gdf_zn, 'rc', zone_cols, workers = args.workers))
+
+run.stage('overlay_flood_risk')
+print('Overlaying the Flood Risk geotable...')
+# flooded area and area not always underwater of every cell; outside the flood
+# map (Paris), cells are not at risk, like in geographic_units_flood_risk.py
+fr_parts = read_parts(fr_dir / 'flood_risk_geoshapes.geojson', crs) # fr: flood risk
+au_parts = read_parts(fr_dir / 'always_underwater_geoshapes' / 'all_layers.geojson', crs) # au: always underwater
+flooded_area, dry_area = flood_areas(gdf_cells.geometry.to_numpy(), fr_parts, au_parts)
+dfs.append(cell_frame(gdf_cells, 'fr', ['prop_at_flood_risk'], flooded_area[:, np.newaxis], dry_area[:, np.newaxis]))
+
+### 6. EXPORT
+run.stage('export')
+df_grid = merge_layers(dfs, args.cell_size, crs)
+print(f'Writing the {len(df_grid)} cells covered by any layer...')
+write_grid(df_grid, data_dir / 'risk_grid.parquet')
+
+### 7. ACCURACY
+# the exact results of the Codes Postaux and Conseils de Quartier, against those
+# aggregated from the grid at its resolution and at coarser ones (in grid units,
+# the zones are not intersected with anything)
+checks = { # metric in the grid: (result file, column)
+    'hs_fluchaleur': ('heat_stress', 'fluchaleur'),
+    'hs_vulnj_note': ('heat_stress', 'vulnj_note'),
+    'sns_Très Forte Sensibilité': ('heat_sensitivity', 'Très Forte Sensibilité'),
+    'fr_prop_at_flood_risk': ('flood_risk', 'prop_at_flood_risk')
+}
+units = { # name: (geoshapes, key, result file of every topic)
+    'codes_postaux': ('codes_postaux_geoshapes.geojson', 'code_postal', {
+        'heat_stress': hs_dir / 'codes_postaux_heat_stress.csv',
+        'heat_sensitivity': sns_dir / 'codes_postaux_heat_sensitivity.csv',
+        'flood_risk': fr_dir / 'codes_postaux_flood_risk.csv'
+    }),
+    'conseils_de_quartier': ('conseils_de_quartier_geoshapes.geojson', 'conseil_de_quartier', {
+        'heat_stress': hs_dir / 'conseils_de_quartier_heat_stress.csv',
+        'heat_sensitivity': sns_dir / 'conseil_de_quartiers_heat_sensitivity.csv',
+        'flood_risk': fr_dir / 'conseils_de_quartier_flood_risk.csv'
+    })
+}
+
+run.stage('accuracy')
+rows = []
+for factor in (1, 2, 4, 8):
+    df_level = coarsen(df_grid, factor)
+    for name, (geoshapes, key, paths) in units.items():
+        gdf_units = read_projected(geoshapes_dir / geoshapes, crs).set_index(key) # cached, in the crs of the grid
+        df_av = averages(aggregate(df_level, gdf_units)) # av: averages
+        for metric, (topic, col) in checks.items():
+            exact = pd.read_csv(paths[topic], dtype = {key: str}).set_index(key).loc[:, col]
+            errors = (df_av.loc[:, metric] - exact.reindex(df_av.index)).abs().dropna()
+            rows.append((df_level.attrs['cell_size'], name, metric, len(errors), errors.mean(), errors.quantile(0.95), exact.std()))
+
+df_ac = pd.DataFrame(data = rows, columns = ['cell_size', 'units', 'metric', 'n_units', 'mean_abs_error', 'p95_abs_error', 'std_across_units']) # ac: accuracy
+print(df_ac.to_string(index = False))
+df_ac.to_csv(data_dir / 'risk_grid_accuracy.csv', index = False)
+
+run.finish()
@@ -0,0 +1,357 @@
+### 1. MODULE IMPORTS
+import os
+import sys
+import argparse
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent)) # repository root, home of the common package
+from common.pipeline import Stage, run
+
+### 2. STAGE DEFINITIONS
+# every script, with the files it reads and writes (the figures are left out). A stage
+# depends on the stages that write its inputs, so e.g. all the codes_postaux_* scripts
+# wait for codes_postaux_geoshapes.py, and the heat stress, heat sensitivity, rent
+# control and flood risk branches of both cities run side by side. The scripts run
+# with --no-figures: the interactive maps of the results are made from the saved
+# results by the result_maps stages, once they are all there.
+# iris_geoshapes.zip and response_list.txt are saved by hand (see the README).
+france_units = 'france/geographic_units/data/'
+paris_units = 'paris/geographic_units/data/'
+grenoble_units = 'grenoble/geographic_units/data/'
+
+STAGES = [
+    ## France - geographic units
+    Stage(
+        name = 'france/crosswalks',
+        script = 'france/geographic_units/code/crosswalks.py',
+        outputs = [france_units + 'iris_commune_crosswalk.parquet', france_units + 'commune_code_postal_crosswalk.parquet', france_units + 'iris_commune_crosswalk.xlsx', france_units + 'commune_code_postal_crosswalk.csv']
+    ),
+    Stage(
+        name = 'france/codes_postaux_geoshapes',
+        script = 'france/geographic_units/code/codes_postaux_geoshapes.py',
+        inputs = [france_units + 'iris_geoshapes.zip', france_units + 'iris_commune_crosswalk.parquet', france_units + 'commune_code_postal_crosswalk.parquet'],
+        outputs = [france_units + 'codes_postaux_geoshapes', france_units + 'communes_geoshapes'],
+        exclusive = True # builds the departments on a pool of --jobs processes
+    ),
+
+    ## Paris - geographic units
+    Stage(
+        name = 'paris/codes_postaux_geoshapes',
+        script = 'paris/geographic_units/code/codes_postaux_geoshapes.py',
+        inputs = [france_units + 'codes_postaux_geoshapes'],
+        outputs = [paris_units + 'codes_postaux_geoshapes.geojson']
+    ),
+    Stage(
+        name = 'paris/conseils_de_quartier_geoshapes',
+        script = 'paris/geographic_units/code/conseils_de_quartier_geoshapes.py',
+        outputs = [paris_units + 'conseils_de_quartier_geoshapes.geojson'],
+        args = ['--no-figures']
+    ),
+    Stage(
+        name = 'paris/seloger_quartiers_low_quality_geoshapes',
+        script = 'paris/geographic_units/code/seloger_quartiers_low_quality_geoshapes.py',
+        outputs = [paris_units + 'seloger_quartiers_low_quality.geojson']
+    ),
+    Stage(
+        name = 'paris/seloger_quartiers_geoshapes',
+        script = 'paris/geographic_units/code/seloger_quartiers_geoshapes.py',
+        inputs = [paris_units + 'response_list.txt', paris_units + 'seloger_quartiers_low_quality.geojson'],
+        outputs = [paris_units + 'seloger_quartiers_geoshapes.geojson'],
+        args = ['--no-figures']
+    ),
+
+    ## Paris - heat stress
+    Stage(
+        name = 'paris/heat_stress_geoshapes',
+        script = 'paris/heat_stress/code/heat_stress_geoshapes.py',
+        outputs = ['paris/heat_stress/data/heat_stress_geoshapes.zip']
+    ),
+    Stage(
+        name = 'paris/heat_stress_geoparquet',
+        script = 'paris/heat_stress/code/heat_stress_geoparquet.py',
+        inputs = ['paris/heat_stress/data/heat_stress_geoshapes.zip'],
+        outputs = ['paris/heat_stress/data/heat_stress_geoshapes.parquet']
+    ),
+    Stage(
+        name = 'paris/codes_postaux_heat_stress',
+        script = 'paris/heat_stress/code/codes_postaux_heat_stress.py',
+        inputs = [paris_units + 'codes_postaux_geoshapes.geojson', 'paris/heat_stress/data/heat_stress_geoshapes.parquet'],
+        outputs = ['paris/heat_stress/data/codes_postaux_heat_stress.csv'],
+        args = ['--no-figures']
+    ),
+    Stage(
+        name = 'paris/conseils_de_quartier_heat_stress',
+        script = 'paris/heat_stress/code/conseils_de_quartier_heat_stress.py',
+        inputs = [paris_units + 'conseils_de_quartier_geoshapes.geojson', 'paris/heat_stress/data/heat_stress_geoshapes.parquet'],
+        outputs = ['paris/heat_stress/data/conseils_de_quartier_heat_stress.csv'],
+        args = ['--no-figures']
+    ),
+    Stage(
+        name = 'paris/seloger_quartiers_heat_stress',
+        script = 'paris/heat_stress/code/seloger_quartiers_heat_stress.py',
+        inputs = [paris_units + 'seloger_quartiers_geoshapes.geojson', 'paris/heat_stress/data/heat_stress_geoshapes.parquet'],
+        outputs = ['paris/heat_stress/data/seloger_quartiers_heat_stress.csv'],
+        args = ['--no-figures']
+    ),
+
+    ## Paris - rent control
+    Stage(
+        name = 'paris/rent_control_geoshapes',
+        script = 'paris/rent_control/code/rent_control_geoshapes.py',
+        outputs = ['paris/rent_control/data/rent_control_geoshapes']
+    ),
+    Stage(
+        name = 'paris/codes_postaux_rent_control',
+        script = 'paris/rent_control/code/codes_postaux_rent_control.py',
+        inputs = [paris_units + 'codes_postaux_geoshapes.geojson', 'paris/rent_control/data/rent_control_geoshapes'],
+        outputs = ['paris/rent_control/data/codes_postaux_rent_control.csv', 'paris/rent_control/data/codes_postaux_rent_control_timeseries.csv', 'paris/rent_control/data/codes_postaux_zone_overlap.csv'],
+        args = ['--no-figures']
+    ),
+    Stage(
+        name = 'paris/conseils_de_quartier_rent_control',
+        script = 'paris/rent_control/code/conseils_de_quartier_rent_control.py',
+        inputs = [paris_units + 'conseils_de_quartier_geoshapes.geojson', 'paris/rent_control/data/rent_control_geoshapes'],
+        outputs = ['paris/rent_control/data/conseils_de_quartier_rent_control.csv', 'paris/rent_control/data/conseils_de_quartier_rent_control_timeseries.csv', 'paris/rent_control/data/conseils_de_quartier_zone_overlap.csv'],
+        args = ['--no-figures']
+    ),
+    Stage(
+        name = 'paris/seloger_quartiers_rent_control',
+        script = 'paris/rent_control/code/seloger_quartiers_rent_control.py',
+        inputs = [paris_units + 'seloger_quartiers_geoshapes.geojson', 'paris/rent_control/data/rent_control_geoshapes'],
+        outputs = ['paris/rent_control/data/seloger_quartiers_rent_control.csv', 'paris/rent_control/data/seloger_quartiers_rent_control_timeseries.csv', 'paris/rent_control/data/seloger_quartiers_zone_overlap.csv'],
+        args = ['--no-figures']
+    ),
+    Stage(
+        name = 'paris/rent_control_spatial_analysis',
+        script = 'paris/rent_control/code/spatial_analysis.py',
+        inputs = [paris_units + 'seloger_quartiers_geoshapes.geojson', 'paris/rent_control/data/rent_control_geoshapes'],
+        outputs = ['paris/rent_control/data/ref_statistics.csv']
+    ),
+
+    ## Paris - flood risk
+    Stage(
+        name = 'paris/flood_risk_geoshapes',
+        script = 'paris/flood_risk/code/flood_risk_geoshapes.py',
+        outputs = ['paris/flood_risk/data/flood_risk_geoshapes.geojson'],
+        args = ['--no-figures']
+    ),
+    Stage(
+        name = 'paris/always_underwater_geoshapes',
+        script = 'paris/flood_risk/code/always_underwater_geoshapes.py',
+        outputs = ['paris/flood_risk/data/always_underwater_geoshapes'],
+        args = ['--no-figures']
+    ),
+    Stage(
+        name = 'paris/geographic_units_flood_risk',
+        script = 'paris/flood_risk/code/geographic_units_flood_risk.py',
+        inputs = [
+            paris_units + 'codes_postaux_geoshapes.geojson',
+            paris_units + 'conseils_de_quartier_geoshapes.geojson',
+            paris_units + 'seloger_quartiers_geoshapes.geojson',
+            'paris/flood_risk/data/flood_risk_geoshapes.geojson',
+            'paris/flood_risk/data/always_underwater_geoshapes'
+        ],
+        outputs = [
+            'paris/flood_risk/data/codes_postaux_flood_risk.csv',
+            'paris/flood_risk/data/conseils_de_quartier_flood_risk.csv',
+            'paris/flood_risk/data/seloger_quartiers_flood_risk.csv'
+        ],
+        args = ['--no-figures']
+    ),
+    Stage(
+        name = 'paris/flood_risk_spatial_analysis',
+        script = 'paris/flood_risk/code/spatial_analysis.py',
+        inputs = [paris_units + 'conseils_de_quartier_geoshapes.geojson', 'paris/flood_risk/data/conseils_de_quartier_flood_risk.csv'],
+        outputs = ['paris/flood_risk/data/flood_risk_statistics.csv']
+    ),
+
+    ## Paris - heat sensitivity
+    Stage(
+        name = 'paris/heat_sensitivity_geoshapes',
+        script = 'paris/heat_sensitivity/code/heat_sensitivity_geoshapes.py',
+        outputs = ['paris/heat_sensitivity/data/heat_sensitivity_geoshapes.zip']
+    ),
+    Stage(
+        name = 'paris/codes_postaux_heat_sensitivity',
+        script = 'paris/heat_sensitivity/code/codes_postaux_heat_sensitivity.py',
+        inputs = [paris_units + 'codes_postaux_geoshapes.geojson', 'paris/heat_sensitivity/data/heat_sensitivity_geoshapes.zip'],
+        outputs = ['paris/heat_sensitivity/data/codes_postaux_heat_sensitivity.csv'],
+        args = ['--no-figures']
+    ),
+    Stage(
+        name = 'paris/conseils_de_quartier_heat_sensitivity',
+        script = 'paris/heat_sensitivity/code/conseils_de_quartier_heat_sensitivity.py',
+        inputs = [paris_units + 'conseils_de_quartier_geoshapes.geojson', 'paris/heat_sensitivity/data/heat_sensitivity_geoshapes.zip'],
+        outputs = ['paris/heat_sensitivity/data/conseil_de_quartiers_heat_sensitivity.csv'],
+        args = ['--no-figures']
+    ),
+    Stage(
+        name = 'paris/seloger_quartiers_heat_sensitivity',
+        script = 'paris/heat_sensitivity/code/seloger_quartiers_heat_sensitivity.py',
+        inputs = [paris_units + 'seloger_quartiers_geoshapes.geojson', 'paris/heat_sensitivity/data/heat_sensitivity_geoshapes.zip'],
+        outputs = ['paris/heat_sensitivity/data/seloger_quartiers_heat_sensitivity.csv'],
+        args = ['--no-figures']
+    ),
+    Stage(
+        name = 'paris/heat_sensitivity_spatial_analysis',
+        script = 'paris/heat_sensitivity/code/spatial_analysis.py',
+        inputs = [paris_units + 'conseils_de_quartier_geoshapes.geojson', 'paris/heat_sensitivity/data/heat_sensitivity_geoshapes.zip'],
+        outputs = ['paris/heat_sensitivity/data/sns_int_statistics.csv']
+    ),
+
+    ## Paris - lookup
+    Stage(
+        name = 'paris/lookup_tables',
+        script = 'paris/lookup/code/lookup_tables.py',
+        inputs = [paris_units + f'{level}_geoshapes.geojson' for level in ('codes_postaux', 'conseils_de_quartier', 'seloger_quartiers')] + [
+            f'paris/{topic}/data/{level}_{topic}.csv'
+            for topic in ('heat_stress', 'rent_control', 'flood_risk')
+            for level in ('codes_postaux', 'conseils_de_quartier', 'seloger_quartiers')
+        ] + [
+            'paris/heat_sensitivity/data/codes_postaux_heat_sensitivity.csv',
+            'paris/heat_sensitivity/data/conseil_de_quartiers_heat_sensitivity.csv',
+            'paris/heat_sensitivity/data/seloger_quartiers_heat_sensitivity.csv'
+        ],
+        outputs = ['paris/lookup/data/cp_lookup.parquet', 'paris/lookup/data/cq_lookup.parquet', 'paris/lookup/data/sl_lookup.parquet']
+    ),
+
+    ## Paris - risk grid
+    Stage(
+        name = 'paris/risk_grid',
+        script = 'paris/risk_grid/code/risk_grid.py',
+        inputs = [
+            paris_units + 'codes_postaux_geoshapes.geojson',
+            paris_units + 'conseils_de_quartier_geoshapes.geojson',
+            'paris/heat_stress/data/heat_stress_geoshapes.parquet',
+            'paris/heat_sensitivity/data/heat_sensitivity_geoshapes.zip',
+            'paris/rent_control/data/rent_control_geoshapes',
+            'paris/flood_risk/data/flood_risk_geoshapes.geojson',
+            'paris/flood_risk/data/always_underwater_geoshapes'
+        ] + [ # exact results, for the accuracy report
+            f'paris/{topic}/data/{level}_{topic}.csv'
+            for topic in ('heat_stress', 'flood_risk')
+            for level in ('codes_postaux', 'conseils_de_quartier')
+        ] + [
+            'paris/heat_sensitivity/data/codes_postaux_heat_sensitivity.csv',
+            'paris/heat_sensitivity/data/conseil_de_quartiers_heat_sensitivity.csv'
+        ],
+        outputs = ['paris/risk_grid/data/risk_grid.parquet', 'paris/risk_grid/data/risk_grid_accuracy.csv']
+    ),
+
+    ## Paris - result maps
+    Stage(
+        name = 'paris/result_maps',
+        script = 'paris/result_maps/code/result_maps.py',
+        inputs = [paris_units + f'{level}_geoshapes.geojson' for level in ('codes_postaux', 'conseils_de_quartier', 'seloger_quartiers')] + [
+            f'paris/{topic}/data/{level}_{topic}.csv'
+            for topic in ('heat_stress', 'rent_control', 'flood_risk')
+            for level in ('codes_postaux', 'conseils_de_quartier', 'seloger_quartiers')
+        ] + [
+            'paris/heat_sensitivity/data/codes_postaux_heat_sensitivity.csv',
+            'paris/heat_sensitivity/data/conseil_de_quartiers_heat_sensitivity.csv',
+            'paris/heat_sensitivity/data/seloger_quartiers_heat_sensitivity.csv'
+        ],
+        outputs = [
+            f'paris/{topic}/figures/{level}_geometries.js'
+            for topic in ('heat_stress', 'heat_sensitivity', 'rent_control', 'flood_risk')
+            for level in ('codes_postaux', 'conseils_de_quartier', 'seloger_quartiers')
+        ]
+    ),
+
+    ## Grenoble - geographic units
+    Stage(
+        name = 'grenoble/codes_postaux_geoshapes',
+        script = 'grenoble/geographic_units/code/codes_postaux_geoshapes.py',
+        inputs = [france_units + 'codes_postaux_geoshapes'],
+        outputs = [grenoble_units + 'codes_postaux_geoshapes.geojson'],
+        args = ['--no-figures']
+    ),
+    Stage(
+        name = 'grenoble/seloger_quartiers_low_quality_geoshapes',
+        script = 'grenoble/geographic_units/code/seloger_quartiers_low_quality_geoshapes.py',
+        outputs = [grenoble_units + 'seloger_quartiers_low_quality_geoshapes.geojson']
+    ),
+    Stage(
+        name = 'grenoble/seloger_quartiers_geoshapes',
+        script = 'grenoble/geographic_units/code/seloger_quartiers_geoshapes.py',
+        inputs = [grenoble_units + 'response_list.txt', grenoble_units + 'seloger_quartiers_low_quality_geoshapes.geojson'],
+        outputs = [grenoble_units + 'seloger_quartiers_geoshapes.geojson'],
+        args = ['--no-figures']
+    ),
+
+    ## Grenoble - rent control
+    Stage(
+        name = 'grenoble/rent_control_geoshapes',
+        script = 'grenoble/rent_control/code/rent_control_geoshapes.py',
+        outputs = ['grenoble/rent_control/data/rent_control_geoshapes.geojson']
+    ),
+    Stage(
+        name = 'grenoble/codes_postaux_rent_control',
+        script = 'grenoble/rent_control/code/codes_postaux_rent_control.py',
+        inputs = [grenoble_units + 'codes_postaux_geoshapes.geojson', 'grenoble/rent_control/data/rent_control_geoshapes.geojson'],
+        outputs = ['grenoble/rent_control/data/codes_postaux_rent_control.csv'],
+        args = ['--no-figures']
+    ),
+    Stage(
+        name = 'grenoble/seloger_quartiers_rent_control',
+        script = 'grenoble/rent_control/code/seloger_quartiers_rent_control.py',
+        inputs = [grenoble_units + 'seloger_quartiers_geoshapes.geojson', 'grenoble/rent_control/data/rent_control_geoshapes.geojson'],
+        outputs = ['grenoble/rent_control/data/seloger_quartiers_rent_control.csv'],
+        args = ['--no-figures']
+    ),
+
+    ## Grenoble - heat sensitivity
+    Stage(
+        name = 'grenoble/heat_sensitivity_geoshapes',
+        script = 'grenoble/heat_sensitivity/code/heat_sensitivity_geoshapes.py',
+        outputs = ['grenoble/heat_sensitivity/data/heat_sensitivity_geoshapes.zip']
+    ),
+    Stage(
+        name = 'grenoble/codes_postaux_heat_sensitivity',
+        script = 'grenoble/heat_sensitivity/code/codes_postaux_heat_sensitivity.py',
+        inputs = [grenoble_units + 'codes_postaux_geoshapes.geojson', 'grenoble/heat_sensitivity/data/heat_sensitivity_geoshapes.zip'],
+        outputs = ['grenoble/heat_sensitivity/data/codes_postaux_heat_sensitivity.csv'],
+        args = ['--no-figures']
+    ),
+    Stage(
+        name = 'grenoble/seloger_quartiers_heat_sensitivity',
+        script = 'grenoble/heat_sensitivity/code/seloger_quartiers_heat_sensitivity.py',
+        inputs = [grenoble_units + 'seloger_quartiers_geoshapes.geojson', 'grenoble/heat_sensitivity/data/heat_sensitivity_geoshapes.zip'],
+        outputs = ['grenoble/heat_sensitivity/data/seloger_quartiers_heat_sensitivity.csv'],
+        args = ['--no-figures']
+    ),
+
+    ## Grenoble - result maps
+    Stage(
+        name = 'grenoble/result_maps',
+        script = 'grenoble/result_maps/code/result_maps.py',
+        inputs = [grenoble_units + f'{level}_geoshapes.geojson' for level in ('codes_postaux', 'seloger_quartiers')] + [
+            f'grenoble/{topic}/data/{level}_{topic}.csv'
+            for topic in ('heat_sensitivity', 'rent_control')
+            for level in ('codes_postaux', 'seloger_quartiers')
+        ],
+        outputs = [
+            f'grenoble/{topic}/figures/{level}_geometries.js'
+            for topic in ('heat_sensitivity', 'rent_control')
+            for level in ('codes_postaux', 'seloger_quartiers')
+        ]
+    ),
+]
+
+### 3. COMMAND LINE
+parser = argparse.ArgumentParser(description = 'Runs the scripts whose inputs changed since their last run, in dependency order.')
+parser.add_argument('targets', nargs = '*', help = 'stages to bring up to date, with everything they depend on (default: all)')
+parser.add_argument('--jobs', type = int, default = os.cpu_count(), help = 'number of stages running at the same time (default: number of cores)')
+parser.add_argument('--force', action = 'append', default = [], help = 'run this stage even if it is up to date (can be repeated)')
+parser.add_argument('--dry-run', action = 'store_true', help = 'only print the stages that would run')
+parser.add_argument('--list', action = 'store_true', help = 'print the stages and exit')
+args = parser.parse_args()
+
+if args.list:
+    for stage in STAGES:
+        print(f'{stage.name:<50} {stage.script}')
+    sys.exit(0)
+
+### 4. RUN
+success = run(STAGES, targets = args.targets, force = args.force, jobs = args.jobs, dry_run = args.dry_run)
+sys.exit(0 if success else 1)
@@ -0,0 +1,28 @@
+### 1. MODULE IMPORTS
+import sys
+import numpy as np
+from scipy import sparse
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[1])) # repository root, home of the common package
+from common.areal_interpolation import interpolate, interpolate_tensor
+
+### 2. TESTS
+def test_tensor_matches_interpolate_slice_by_slice():
+    matrix = sparse.csr_matrix([[3.0, 1.0, 0.0], [0.0, 2.0, 2.0], [0.0, 0.0, 0.0]]) # the last unit overlaps no zone
+    tensor = np.arange(2 * 3 * 2, dtype = np.float64).reshape(2, 3, 2) # 2 periods, 3 zones, 2 variables
+
+    averages = interpolate_tensor(matrix, tensor)
+
+    assert averages.shape == (2, 3, 2)
+    for period in range(2):
+        assert np.allclose(averages[period], interpolate(matrix, tensor[period]), equal_nan = True)
+
+def test_units_over_zones_without_values_are_missing():
+    matrix = sparse.csr_matrix([[3.0, 1.0, 0.0], [0.0, 0.0, 2.0]]) # the first unit straddles zones 0 and 1
+    tensor = np.array([[[10.0], [np.nan], [30.0]]]) # zone 1 has not published yet
+
+    averages = interpolate_tensor(matrix, tensor)
+
+    assert np.isnan(averages[0, 0, 0]) # not the average of zone 0 alone
+    assert averages[0, 1, 0] == 30.0
@@ -0,0 +1,23 @@
+### 1. MODULE IMPORTS
+import sys
+import shapely
+import geopandas as gpd
+import pyarrow.parquet as pq
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[1])) # repository root, home of the common package
+from common.codes_postaux import partition_iris
+
+### 2. TESTS
+def test_iris_are_partitioned_like_the_departments_of_the_crosswalks(tmp_path):
+    codes = ['751010101', '2A0040000', '972090101', '974110103', '974110104']
+    gpd.GeoDataFrame(
+        data = {'CODE_IRIS': codes},
+        geometry = [shapely.box(i, 0, i + 1, 1) for i in range(len(codes))],
+        crs = 'EPSG:2154'
+    ).to_file(tmp_path / 'iris.gpkg')
+
+    departments, crs = partition_iris(tmp_path / 'iris.gpkg', tmp_path / 'partitions', batch_size = 2)
+
+    assert departments == ['2A', '75', '972', '974'] # overseas departments have three characters
+    assert pq.read_table(tmp_path / 'partitions' / '974.parquet').column('CODE_IRIS').to_pylist() == ['974110103', '974110104']
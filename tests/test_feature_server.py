@@ -0,0 +1,180 @@
+### 1. MODULE IMPORTS
+import sys
+import json
+import pytest
+import requests
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.append(str(Path(__file__).parents[1])) # repository root, home of the common package
+import common.feature_server as feature_server
+from common.feature_server import fetch_features
+
+### 2. FIXTURES
+# a local stand-in for an ArcGIS FeatureServer layer (see
+# paris/flood_risk/code/always_underwater_geoshapes.py), with 11 x 11 squares of
+# side 10 that touch each other, so many of them cross the edges of the tiles
+BBOX = (0, 0, 120, 120)
+SQUARES = [(oid, (10 * i + 5, 10 * j + 5, 10 * i + 15, 10 * j + 15)) for oid, (i, j) in enumerate(((i, j) for i in range(11) for j in range(11)), start = 1)]
+LAYER = '/FeatureServer/0'
+
+class StandIn:
+    '''
+    Serves the squares as a FeatureServer layer on localhost, announcing
+    max_records as maxRecordCount and cutting every response at limit
+    features (exceededTransferLimit), which is max_records unless given.
+    Records the query parameters of every request, and the number of
+    features returned. Every query whose parameters contain one of fail
+    answers 404 as many times as given first.
+    '''
+    def __init__(self, paginate: bool = False, max_records: int = 20, limit: int = None, oid_field: str = 'objectid', fail: dict = {}):
+        self.requests, self.returned = [], []
+        self.fail = dict(fail)
+        self.lock = threading.Lock()
+        limit = limit or max_records
+        stand_in = self
+
+        def features(params: dict) -> list:
+            squares = SQUARES
+            if 'geometry' in params:
+                envelope = json.loads(params['geometry'])
+                squares = [
+                    (oid, (xmin, ymin, xmax, ymax)) for oid, (xmin, ymin, xmax, ymax) in squares
+                    if xmin <= envelope['xmax'] and xmax >= envelope['xmin'] and ymin <= envelope['ymax'] and ymax >= envelope['ymin']
+                ]
+            return squares
+
+        def esri_json(squares: list, exceeded: bool) -> dict:
+            return {
+                'objectIdFieldName': oid_field,
+                'geometryType': 'esriGeometryPolygon',
+                'spatialReference': {'wkid': 2154},
+                'fields': [{'name': oid_field, 'type': 'esriFieldTypeOID', 'alias': oid_field}, {'name': 'niv', 'type': 'esriFieldTypeInteger', 'alias': 'niv'}],
+                'features': [
+                    {
+                        'attributes': {oid_field: oid, 'niv': 99},
+                        'geometry': {'rings': [[[xmin, ymin], [xmin, ymax], [xmax, ymax], [xmax, ymin], [xmin, ymin]]]} # clockwise, the exterior ring in esri json
+                    }
+                    for oid, (xmin, ymin, xmax, ymax) in squares
+                ],
+                'exceededTransferLimit': exceeded
+            }
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                with stand_in.lock:
+                    stand_in.requests.append(params)
+                    failing = next((key for key in stand_in.fail if key in url.query and stand_in.fail[key] > 0), None)
+                    if failing is not None:
+                        stand_in.fail[failing] -= 1
+
+                if failing is not None:
+                    status, response = 404, None
+                elif url.path == LAYER:
+                    status, response = 200, {
+                        'objectIdField': oid_field,
+                        'maxRecordCount': max_records,
+                        'advancedQueryCapabilities': {'supportsPagination': paginate}
+                    }
+                elif url.path == LAYER + '/query':
+                    squares = features(params)
+                    if params.get('returnCountOnly') == 'true':
+                        status, response = 200, {'count': len(squares)}
+                    else:
+                        offset = int(params.get('resultOffset', 0))
+                        count = min(int(params.get('resultRecordCount', limit)), limit)
+                        status, response = 200, esri_json(squares[offset:offset + count], offset + count < len(squares))
+                        with stand_in.lock:
+                            stand_in.returned.append(len(response['features']))
+                else:
+                    status, response = 404, None
+
+                body = json.dumps(response).encode() if response is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}{LAYER}'
+        threading.Thread(target = self.server.serve_forever, daemon = True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def stand_in(request):
+    server = StandIn(**getattr(request, 'param', {}))
+    yield server
+    server.close()
+
+@pytest.fixture(autouse = True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(feature_server, 'cache_dir', tmp_path / 'feature_server')
+    return tmp_path / 'feature_server'
+
+def queries(stand_in: StandIn) -> list:
+    return [params for params in stand_in.requests if 'returnCountOnly' not in params and 'where' in params]
+
+### 3. TESTS
+@pytest.mark.parametrize('stand_in', [{'paginate': True}], indirect = True)
+def test_pages(stand_in, cache_dir):
+    gdf = fetch_features(stand_in.url, BBOX, wkid = 2154, workers = 4)
+
+    assert sorted(gdf.loc[:, 'objectid']) == [oid for oid, _ in SQUARES]
+    assert sorted(int(params['resultOffset']) for params in queries(stand_in)) == list(range(0, len(SQUARES), 20))
+    assert not cache_dir.exists() or not any(cache_dir.iterdir()) # removed once complete
+
+def test_tiles_are_counted_when_pages_are_not_supported(stand_in):
+    gdf = fetch_features(stand_in.url, BBOX, wkid = 2154, workers = 4)
+
+    assert any(params.get('returnCountOnly') == 'true' for params in stand_in.requests)
+    assert all('resultOffset' not in params for params in stand_in.requests)
+    assert len(queries(stand_in)) > 1
+    assert sorted(gdf.loc[:, 'objectid']) == [oid for oid, _ in SQUARES]
+
+@pytest.mark.parametrize('stand_in', [{'paginate': True}, {'paginate': False}], indirect = True)
+def test_responses_stay_within_max_record_count(stand_in):
+    fetch_features(stand_in.url, BBOX, wkid = 2154, workers = 4)
+
+    assert stand_in.returned and max(stand_in.returned) <= 20
+
+@pytest.mark.parametrize('stand_in', [{'limit': 10}], indirect = True)
+def test_lower_limit_than_announced_is_raised(stand_in):
+    with pytest.raises(RuntimeError, match = 'lower than announced'):
+        fetch_features(stand_in.url, BBOX, wkid = 2154, workers = 4)
+
+def test_features_crossing_tiles_are_kept_once(stand_in):
+    gdf = fetch_features(stand_in.url, BBOX, wkid = 2154, workers = 4)
+
+    assert sum(stand_in.returned) > len(SQUARES) # some squares come in several tiles
+    assert len(gdf) == len(SQUARES) and gdf.loc[:, 'objectid'].is_unique
+
+@pytest.mark.parametrize('stand_in', [{'paginate': True, 'fail': {'resultOffset=40': 1}}], indirect = True)
+def test_interrupted_crawl_resumes_from_cache(stand_in, cache_dir):
+    with pytest.raises(requests.HTTPError):
+        fetch_features(stand_in.url, BBOX, wkid = 2154, workers = 4)
+    assert any(cache_dir.iterdir()) # the responses so far are kept
+    n_requests = len(stand_in.requests)
+
+    gdf = fetch_features(stand_in.url, BBOX, wkid = 2154, workers = 4)
+
+    assert [params.get('resultOffset') for params in stand_in.requests[n_requests:]] == ['40'] # only the missing page
+    assert sorted(gdf.loc[:, 'objectid']) == [oid for oid, _ in SQUARES]
+
+@pytest.mark.parametrize('stand_in', [{'oid_field': 'OBJECTID'}], indirect = True)
+def test_object_id_is_returned_as_objectid(stand_in):
+    gdf = fetch_features(stand_in.url, BBOX, wkid = 2154, workers = 4)
+
+    assert 'OBJECTID' not in gdf.columns
+    assert len(gdf) == len(SQUARES) and gdf.loc[:, 'objectid'].is_unique
@@ -0,0 +1,112 @@
+### 1. MODULE IMPORTS
+import sys
+import time
+import pytest
+import requests
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.append(str(Path(__file__).parents[1])) # repository root, home of the common package
+from common.fetch import fetch, fetch_all
+
+### 2. FIXTURES
+# a local stand-in for the rent control website, serving small KML files under the
+# same paths (see paris/rent_control/code/rent_control_geoshapes.py)
+KML = '''<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2"><Document><Placemark>
+<ExtendedData><Data name="ref"><value>{ref}</value></Data></ExtendedData>
+<Polygon><outerBoundaryIs><LinearRing><coordinates>2.33,48.85 2.35,48.85 2.35,48.87 2.33,48.85</coordinates></LinearRing></outerBoundaryIs></Polygon>
+</Placemark></Document></kml>
+'''
+PATHS = [f'/paris/kml/2024-07-01/drihl_medianes_appartement_{rooms}_inf1946_meuble.kml' for rooms in range(1, 9)]
+
+class StandIn:
+    '''
+    Serves the fixture KMLs on localhost, with a delay per request, and
+    records the requests per path and the largest number in flight at once.
+    Every path of fail[status] answers status as many times as given first.
+    '''
+    def __init__(self, fail: dict = {}, delay: float = 0.05):
+        self.requests, self.in_flight, self.max_in_flight = {}, 0, 0
+        self.fail = {status: dict(paths) for status, paths in fail.items()}
+        self.lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # kept-alive connections, like the real website
+
+            def do_GET(self):
+                with stand_in.lock:
+                    stand_in.requests[self.path] = stand_in.requests.get(self.path, 0) + 1
+                    stand_in.in_flight += 1
+                    stand_in.max_in_flight = max(stand_in.max_in_flight, stand_in.in_flight)
+                    status = next((status for status, paths in stand_in.fail.items() if paths.get(self.path, 0) > 0), 200)
+                    if status != 200:
+                        stand_in.fail[status][self.path] -= 1
+                time.sleep(delay)
+                if status == 200 and self.path not in PATHS:
+                    status = 404
+                body = KML.format(ref = PATHS.index(self.path)).encode() if status == 200 else b''
+                with stand_in.lock:
+                    stand_in.in_flight -= 1
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler) # a new port, and so a new host, for every test
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target = self.server.serve_forever, daemon = True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def stand_in(request):
+    server = StandIn(**getattr(request, 'param', {}))
+    yield server
+    server.close()
+
+def jobs(url: str, directory: Path) -> list:
+    return [(url + path, directory / Path(path).name) for path in PATHS]
+
+### 3. TESTS
+@pytest.mark.parametrize('stand_in', [{'fail': {429: {PATHS[0]: 2}, 503: {PATHS[1]: 1}}}], indirect = True)
+def test_rate_limits_and_server_errors_are_retried(stand_in, tmp_path):
+    destinations = fetch_all(jobs(stand_in.url, tmp_path), workers = 4, per_host = 4, backoff = 0.01)
+
+    assert all(destination.read_text() == KML.format(ref = i) for i, destination in enumerate(destinations))
+    assert stand_in.requests[PATHS[0]] == 3 and stand_in.requests[PATHS[1]] == 2 and stand_in.requests[PATHS[2]] == 1
+
+def test_requests_per_host_are_limited(stand_in, tmp_path):
+    fetch_all(jobs(stand_in.url, tmp_path), workers = 8, per_host = 2)
+
+    assert stand_in.max_in_flight == 2
+    assert len(list(tmp_path.iterdir())) == len(PATHS)
+
+def test_existing_files_are_skipped(stand_in, tmp_path):
+    (tmp_path / Path(PATHS[0]).name).write_text('already downloaded')
+    destinations = fetch_all(jobs(stand_in.url, tmp_path), workers = 4, per_host = 4)
+
+    assert destinations[0].read_text() == 'already downloaded'
+    assert PATHS[0] not in stand_in.requests and all(stand_in.requests[path] == 1 for path in PATHS[1:])
+
+@pytest.mark.parametrize('stand_in', [{'fail': {503: {PATHS[0]: 10}}}], indirect = True)
+def test_failed_download_leaves_no_file(stand_in, tmp_path):
+    with pytest.raises(requests.HTTPError):
+        fetch_all(jobs(stand_in.url, tmp_path), workers = 4, per_host = 4, retries = 2, backoff = 0.01)
+
+    assert stand_in.requests[PATHS[0]] == 3 # the first attempt and two retries
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(Path(path).name for path in PATHS[1:]) # no partial or temporary file
+
+def test_client_errors_are_not_retried(stand_in, tmp_path):
+    with pytest.raises(requests.HTTPError):
+        fetch(stand_in.url + '/paris/kml/2024-07-01/missing.kml', tmp_path / 'missing.kml', backoff = 0.01)
+
+    assert stand_in.requests['/paris/kml/2024-07-01/missing.kml'] == 1
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,29 @@
+### 1. MODULE IMPORTS
+import sys
+import shapely
+import numpy as np
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parents[1])) # repository root, home of the common package
+from common.rasterize import raster_spec, rasterize, pixel_overlap_matrix
+
+### 2. TESTS
+def test_overlapping_units_keep_all_their_pixels(tmp_path):
+    units = np.array([shapely.box(0, 0, 100, 100), shapely.box(50, 0, 150, 100)]) # overlapping by half
+    sources = np.array([shapely.box(0, 0, 150, 100)])
+    spec = raster_spec((0, 0, 150, 100), 10)
+    rasterize(sources, spec, tmp_path / 'sources.npy')
+
+    matrix = pixel_overlap_matrix(units, np.load(tmp_path / 'sources.npy', mmap_mode = 'r'), len(sources), spec)
+
+    assert np.allclose(matrix.toarray().ravel(), shapely.area(units)) # [10000, 10000]
+
+def test_pixels_go_to_the_source_of_their_centre(tmp_path):
+    units = np.array([shapely.box(0, 0, 100, 100)])
+    sources = np.array([shapely.box(0, 0, 30, 100), shapely.box(30, 0, 100, 100)])
+    spec = raster_spec((0, 0, 100, 100), 10)
+    rasterize(sources, spec, tmp_path / 'sources.npy')
+
+    matrix = pixel_overlap_matrix(units, np.load(tmp_path / 'sources.npy', mmap_mode = 'r'), len(sources), spec)
+
+    assert np.allclose(matrix.toarray(), [[3000, 7000]])